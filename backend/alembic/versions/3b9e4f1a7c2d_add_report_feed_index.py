@@ -0,0 +1,31 @@
+"""Add report feed index
+
+Revision ID: 3b9e4f1a7c2d
+Revises: fa03c1346a7c
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9e4f1a7c2d'
+down_revision: Union[str, None] = 'fa03c1346a7c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'idx_report_feed', 'reports', ['created_at', 'id'], unique=False,
+        postgresql_where=sa.text("status != 'PRIVATE'")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_report_feed', table_name='reports', postgresql_where=sa.text("status != 'PRIVATE'"))
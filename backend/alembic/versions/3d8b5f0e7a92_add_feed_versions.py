@@ -0,0 +1,33 @@
+"""Add shared feed versions
+
+Revision ID: 3d8b5f0e7a92
+Revises: 7f3c1a9e5d24
+Create Date: 2026-10-18 23:02:11.407316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d8b5f0e7a92'
+down_revision: Union[str, None] = '7f3c1a9e5d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'feed_versions',
+        sa.Column('feed', sa.String(length=100), nullable=False),
+        sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('feed'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('feed_versions')
@@ -0,0 +1,86 @@
+"""Add geohash to travel map points
+
+Revision ID: 3e6a1f5c8d92
+Revises: 7d2c90a4e5b1
+Create Date: 2026-10-18 18:54:41.087326
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e6a1f5c8d92'
+down_revision: Union[str, None] = '7d2c90a4e5b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Кодировка совпадает с app.geo.encode_geohash
+    op.execute("""
+        CREATE OR REPLACE FUNCTION geohash_encode(lat double precision, lon double precision, len integer)
+        RETURNS text
+        LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE
+        AS $$
+        DECLARE
+            alphabet constant text := '0123456789bcdefghjkmnpqrstuvwxyz';
+            lat_low double precision := -90;
+            lat_high double precision := 90;
+            lon_low double precision := -180;
+            lon_high double precision := 180;
+            mid double precision;
+            is_lon boolean := true;
+            bits integer := 0;
+            code integer := 0;
+            result text := '';
+        BEGIN
+            WHILE length(result) < len LOOP
+                IF is_lon THEN
+                    mid := (lon_low + lon_high) / 2;
+                    IF lon >= mid THEN
+                        code := code * 2 + 1;
+                        lon_low := mid;
+                    ELSE
+                        code := code * 2;
+                        lon_high := mid;
+                    END IF;
+                ELSE
+                    mid := (lat_low + lat_high) / 2;
+                    IF lat >= mid THEN
+                        code := code * 2 + 1;
+                        lat_low := mid;
+                    ELSE
+                        code := code * 2;
+                        lat_high := mid;
+                    END IF;
+                END IF;
+                is_lon := NOT is_lon;
+                bits := bits + 1;
+                IF bits = 5 THEN
+                    result := result || substr(alphabet, code + 1, 1);
+                    bits := 0;
+                    code := 0;
+                END IF;
+            END LOOP;
+            RETURN result;
+        END;
+        $$
+    """)
+    op.add_column('travel_map', sa.Column(
+        'geohash',
+        sa.String(length=12, collation='C'),
+        sa.Computed('geohash_encode(latitude, longitude, 12)', persisted=True),
+        nullable=True,
+    ))
+    op.create_index('idx_travel_map_user_geohash', 'travel_map', ['user_id', 'geohash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_travel_map_user_geohash', table_name='travel_map')
+    op.drop_column('travel_map', 'geohash')
+    op.execute("DROP FUNCTION geohash_encode(double precision, double precision, integer)")
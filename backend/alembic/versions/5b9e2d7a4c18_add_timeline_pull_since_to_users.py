@@ -0,0 +1,37 @@
+"""Add timeline fan-out mode to users
+
+Revision ID: 5b9e2d7a4c18
+Revises: c41f8b6d2e57
+Create Date: 2026-10-18 21:04:37.291584
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b9e2d7a4c18'
+down_revision: Union[str, None] = 'c41f8b6d2e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('timeline_pull_since', sa.DateTime(timezone=True), nullable=True))
+    # Когда автор перешел порог, неизвестно: при возврате к раскладке дозаписываются все его отчеты
+    op.execute("""
+        UPDATE users u
+        SET timeline_pull_since = coalesce(
+            (SELECT min(r.created_at) FROM reports r WHERE r.user_id = u.user_id),
+            now()
+        )
+        WHERE u.followers_count >= 5000
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'timeline_pull_since')
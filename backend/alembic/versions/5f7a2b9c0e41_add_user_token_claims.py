@@ -0,0 +1,32 @@
+"""Add user token claims
+
+Revision ID: 5f7a2b9c0e41
+Revises: d27a6c94e1f0
+Create Date: 2026-10-18 15:12:08.413207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f7a2b9c0e41'
+down_revision: Union[str, None] = 'd27a6c94e1f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('claims_updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('idx_user_claims_updated_at', 'users', ['claims_updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_user_claims_updated_at', table_name='users')
+    op.drop_column('users', 'claims_updated_at')
+    op.drop_column('users', 'token_version')
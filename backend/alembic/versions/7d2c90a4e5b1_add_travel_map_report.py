@@ -0,0 +1,40 @@
+"""Add report to travel map points
+
+Revision ID: 7d2c90a4e5b1
+Revises: b58e3f0c7a14
+Create Date: 2026-10-18 18:21:07.593118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2c90a4e5b1'
+down_revision: Union[str, None] = 'b58e3f0c7a14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('travel_map', sa.Column('report_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('travel_map_report_id_fkey', 'travel_map', 'reports', ['report_id'], ['id'], ondelete='CASCADE')
+    op.create_index(op.f('ix_travel_map_report_id'), 'travel_map', ['report_id'], unique=False)
+    op.create_index(
+        'uq_travel_map_report_point',
+        'travel_map',
+        ['user_id', 'report_id', sa.text('round(latitude::numeric, 3)'), sa.text('round(longitude::numeric, 3)')],
+        unique=True,
+        postgresql_where=sa.text('report_id IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_travel_map_report_point', table_name='travel_map', postgresql_where=sa.text('report_id IS NOT NULL'))
+    op.drop_index(op.f('ix_travel_map_report_id'), table_name='travel_map')
+    op.drop_constraint('travel_map_report_id_fkey', 'travel_map', type_='foreignkey')
+    op.drop_column('travel_map', 'report_id')
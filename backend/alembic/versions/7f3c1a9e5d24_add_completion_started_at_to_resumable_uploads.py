@@ -0,0 +1,28 @@
+"""Add completion start time to resumable uploads
+
+Revision ID: 7f3c1a9e5d24
+Revises: e2a7c4f91b36
+Create Date: 2026-10-18 22:15:46.830172
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f3c1a9e5d24'
+down_revision: Union[str, None] = 'e2a7c4f91b36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('resumable_uploads', sa.Column('completion_started_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('resumable_uploads', 'completion_started_at')
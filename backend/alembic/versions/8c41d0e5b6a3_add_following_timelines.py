@@ -0,0 +1,71 @@
+"""Add following timelines
+
+Revision ID: 8c41d0e5b6a3
+Revises: 3b9e4f1a7c2d
+Create Date: 2026-10-18 11:04:27.552931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41d0e5b6a3'
+down_revision: Union[str, None] = '3b9e4f1a7c2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FANOUT_FOLLOWER_LIMIT = 5000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('followers_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE users u
+        SET followers_count = s.total
+        FROM (
+            SELECT following_id, count(*) AS total
+            FROM subscriptions
+            GROUP BY following_id
+        ) s
+        WHERE s.following_id = u.user_id
+    """)
+
+    op.create_index('idx_report_user_feed', 'reports', ['user_id', 'created_at', 'id'], unique=False)
+
+    op.create_table('timelines',
+    sa.Column('follower_id', sa.UUID(), nullable=False),
+    sa.Column('report_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['author_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['follower_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['report_id'], ['reports.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('follower_id', 'report_id')
+    )
+    op.create_index('idx_timelines_feed', 'timelines', ['follower_id', 'created_at', 'report_id'], unique=False)
+    op.create_index('idx_timelines_author', 'timelines', ['follower_id', 'author_id'], unique=False)
+
+    # Существующие подписки получают ленту сразу после миграции
+    op.execute(f"""
+        INSERT INTO timelines (follower_id, report_id, author_id, created_at)
+        SELECT s.follower_id, r.id, r.user_id, r.created_at
+        FROM subscriptions s
+        JOIN users a ON a.user_id = s.following_id
+        JOIN reports r ON r.user_id = s.following_id
+        WHERE r.status != 'PRIVATE'
+          AND r.created_at IS NOT NULL
+          AND a.followers_count < {FANOUT_FOLLOWER_LIMIT}
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_timelines_author', table_name='timelines')
+    op.drop_index('idx_timelines_feed', table_name='timelines')
+    op.drop_table('timelines')
+    op.drop_index('idx_report_user_feed', table_name='reports')
+    op.drop_column('users', 'followers_count')
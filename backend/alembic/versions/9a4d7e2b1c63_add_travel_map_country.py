@@ -0,0 +1,33 @@
+"""Add country and chronological index to travel map points
+
+Revision ID: 9a4d7e2b1c63
+Revises: 3e6a1f5c8d92
+Create Date: 2026-10-18 19:32:18.406275
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4d7e2b1c63'
+down_revision: Union[str, None] = '3e6a1f5c8d92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('travel_map', sa.Column('country_code', sa.String(length=2), nullable=True))
+    op.execute("UPDATE travel_map SET visited_at = now() WHERE visited_at IS NULL")
+    op.alter_column('travel_map', 'visited_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+    op.create_index('idx_travel_map_user_visited', 'travel_map', ['user_id', 'visited_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_travel_map_user_visited', table_name='travel_map')
+    op.alter_column('travel_map', 'visited_at', existing_type=sa.DateTime(timezone=True), nullable=True)
+    op.drop_column('travel_map', 'country_code')
@@ -0,0 +1,38 @@
+"""Add media blobs
+
+Revision ID: a93e1c7d4b28
+Revises: 5f7a2b9c0e41
+Create Date: 2026-10-18 15:47:31.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93e1c7d4b28'
+down_revision: Union[str, None] = '5f7a2b9c0e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('media_blobs',
+    sa.Column('file_hash', sa.String(length=64), nullable=False),
+    sa.Column('storage_key', sa.Text(), nullable=False),
+    sa.Column('content_type', sa.String(length=100), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('file_hash')
+    )
+    op.create_index(op.f('ix_media_files_file_hash'), 'media_files', ['file_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_media_files_file_hash'), table_name='media_files')
+    op.drop_table('media_blobs')
@@ -0,0 +1,45 @@
+"""Add resumable uploads
+
+Revision ID: b58e3f0c7a14
+Revises: e4b7d2a9f310
+Create Date: 2026-10-18 17:48:36.215904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b58e3f0c7a14'
+down_revision: Union[str, None] = 'e4b7d2a9f310'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('resumable_uploads',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('report_id', sa.Integer(), nullable=False),
+    sa.Column('content_type', sa.String(length=100), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=True),
+    sa.Column('upload_length', sa.BigInteger(), nullable=False),
+    sa.Column('upload_offset', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('chunk_keys', postgresql.ARRAY(sa.Text()), server_default='{}', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['report_id'], ['reports.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_resumable_uploads_expires_at'), 'resumable_uploads', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_resumable_uploads_expires_at'), table_name='resumable_uploads')
+    op.drop_table('resumable_uploads')
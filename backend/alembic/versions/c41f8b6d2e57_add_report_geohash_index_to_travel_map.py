@@ -0,0 +1,31 @@
+"""Add geohash index for report points on travel map
+
+Revision ID: c41f8b6d2e57
+Revises: 9a4d7e2b1c63
+Create Date: 2026-10-18 20:11:52.613840
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f8b6d2e57'
+down_revision: Union[str, None] = '9a4d7e2b1c63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'idx_travel_map_report_geohash', 'travel_map', ['geohash'],
+        unique=False, postgresql_where=sa.text('report_id IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_travel_map_report_geohash', table_name='travel_map')
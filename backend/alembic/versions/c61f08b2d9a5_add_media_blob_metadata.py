@@ -0,0 +1,29 @@
+"""Add media blob metadata
+
+Revision ID: c61f08b2d9a5
+Revises: a93e1c7d4b28
+Create Date: 2026-10-18 16:21:55.174630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c61f08b2d9a5'
+down_revision: Union[str, None] = 'a93e1c7d4b28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('media_blobs', sa.Column('file_metadata', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('media_blobs', 'file_metadata')
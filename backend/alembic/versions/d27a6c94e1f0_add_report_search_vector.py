@@ -0,0 +1,79 @@
+"""Add report search vector
+
+Revision ID: d27a6c94e1f0
+Revises: 8c41d0e5b6a3
+Create Date: 2026-10-18 12:21:05.874410
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd27a6c94e1f0'
+down_revision: Union[str, None] = '8c41d0e5b6a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+# Язык определяется так же, как app.search.detect_language
+BACKFILL_BATCH = sa.text("""
+    UPDATE reports r
+    SET search_language = b.language,
+        search_vector =
+            setweight(to_tsvector(b.language::regconfig, coalesce(r.title, '')), 'A') ||
+            setweight(to_tsvector(b.language::regconfig, coalesce(r.description, '')), 'B') ||
+            setweight(to_tsvector(b.language::regconfig, coalesce(r.text_content, '')), 'C')
+    FROM (
+        SELECT
+            id,
+            CASE
+                WHEN concat_ws(' ', title, description, text_content) ~ '[А-Яа-яЁё]' THEN 'russian'
+                WHEN concat_ws(' ', title, description, text_content) ~ '[A-Za-z]' THEN 'english'
+                ELSE 'simple'
+            END AS language
+        FROM reports
+        WHERE search_vector IS NULL
+        ORDER BY id
+        LIMIT :batch_size
+    ) b
+    WHERE r.id = b.id
+""")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('reports', sa.Column('search_language', sa.String(length=32), nullable=True))
+    op.add_column('reports', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+    # Каждая пачка фиксируется отдельно, чтобы не держать блокировку на всей таблице
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        while bind.execute(BACKFILL_BATCH, {"batch_size": BACKFILL_BATCH_SIZE}).rowcount:
+            pass
+
+        op.create_index(
+            'ix_report_search_vector', 'reports', ['search_vector'], unique=False,
+            postgresql_using='gin', postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_report_text_content', table_name='reports',
+            postgresql_using='gin', postgresql_concurrently=True
+        )
+
+    op.alter_column('reports', 'search_language', nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(
+        'ix_report_text_content', 'reports', [sa.literal_column("to_tsvector('english', text_content)")],
+        unique=False, postgresql_using='gin'
+    )
+    op.drop_index('ix_report_search_vector', table_name='reports', postgresql_using='gin')
+    op.drop_column('reports', 'search_vector')
+    op.drop_column('reports', 'search_language')
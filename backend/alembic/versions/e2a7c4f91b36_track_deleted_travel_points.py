@@ -0,0 +1,56 @@
+"""Track users whose travel map points were deleted
+
+Revision ID: e2a7c4f91b36
+Revises: 5b9e2d7a4c18
+Create Date: 2026-10-18 21:37:09.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7c4f91b36'
+down_revision: Union[str, None] = '5b9e2d7a4c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'travel_stats_dirty',
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    # При удалении пользователя его строка уже не видна, и отмечать нечего
+    op.execute("""
+        CREATE FUNCTION travel_map_mark_deleted() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            INSERT INTO travel_stats_dirty (user_id)
+            SELECT DISTINCT o.user_id
+            FROM deleted_points o
+            JOIN users u ON u.user_id = o.user_id
+            ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END;
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER travel_map_deleted
+        AFTER DELETE ON travel_map
+        REFERENCING OLD TABLE AS deleted_points
+        FOR EACH STATEMENT EXECUTE FUNCTION travel_map_mark_deleted()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER travel_map_deleted ON travel_map")
+    op.execute("DROP FUNCTION travel_map_mark_deleted()")
+    op.drop_table('travel_stats_dirty')
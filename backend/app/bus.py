@@ -0,0 +1,108 @@
+"""
+Шина сообщений между воркерами поверх Postgres LISTEN/NOTIFY.
+
+Каждый воркер держит одно соединение из пула engine, подписанное на
+канал, и получает сообщения, опубликованные другими воркерами.
+Собственные сообщения воркер отбрасывает по идентификатору источника:
+локально они уже применены до публикации.
+"""
+
+import asyncio
+import json
+import uuid
+from typing import Callable
+
+from sqlalchemy import text
+
+from app.database import engine
+
+# Лимит Postgres на payload NOTIFY — 8000 байт, оставляем запас на обертку
+MAX_PAYLOAD_SIZE = 7500
+RECONNECT_DELAY = 5
+
+WORKER_ID = uuid.uuid4().hex
+
+
+class NotifyBus:
+    """Канал LISTEN/NOTIFY с автоматическим переподключением слушателя."""
+
+    def __init__(
+            self,
+            channel: str,
+            on_message: Callable[[dict], None],
+            on_reset: Callable[[], None] | None = None,
+    ):
+        """
+        Параметры:
+            channel: Имя канала Postgres
+            on_message: Обработчик сообщения от другого воркера
+            on_reset: Вызывается после потери соединения, когда часть
+                сообщений могла быть пропущена (опционально)
+        """
+        self.channel = channel
+        self._on_message = on_message
+        self._on_reset = on_reset
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def publish(self, message: dict) -> None:
+        payload = json.dumps({"origin": WORKER_ID, "message": message}, ensure_ascii=False)
+        if len(payload.encode()) > MAX_PAYLOAD_SIZE:
+            raise ValueError(f"Сообщение для канала {self.channel} превышает лимит NOTIFY")
+
+        async with engine.begin() as connection:
+            await connection.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": self.channel, "payload": payload},
+            )
+
+    async def _run(self) -> None:
+        first_connect = True
+        while True:
+            try:
+                await self._listen(first_connect)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Ошибка слушателя канала {self.channel}: {e}")
+            first_connect = False
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _listen(self, first_connect: bool) -> None:
+        terminated = asyncio.Event()
+
+        async with engine.connect() as connection:
+            raw_connection = await connection.get_raw_connection()
+            driver_connection = raw_connection.driver_connection
+            driver_connection.add_termination_listener(lambda _: terminated.set())
+            await driver_connection.add_listener(self.channel, self._handle_notification)
+
+            # Пока соединения не было, сообщения могли быть пропущены
+            if not first_connect and self._on_reset:
+                self._on_reset()
+
+            try:
+                await terminated.wait()
+            finally:
+                if not driver_connection.is_closed():
+                    await driver_connection.remove_listener(self.channel, self._handle_notification)
+
+    def _handle_notification(self, connection, pid, channel, payload) -> None:
+        try:
+            envelope = json.loads(payload)
+        except ValueError:
+            return
+        if envelope.get("origin") == WORKER_ID:
+            return
+        self._on_message(envelope["message"])
@@ -0,0 +1,299 @@
+"""
+Кэширование ответов эндпоинтов чтения.
+
+Записи хранятся в ограниченном LRU-кэше с временем жизни и помечаются
+тегами (user:<id>, reports:<id>, followers:<id>, feed:public).
+Обработчики записи объявляют, какие теги они затрагивают, и при успешном
+завершении инвалидируются все записи с этими тегами, а также версии лент,
+по которым строятся ETag. Теги рассылаются остальным воркерам через
+шину LISTEN/NOTIFY, и каждый из них сбрасывает свои локальные записи.
+
+Чтение, начавшееся до инвалидации, не должно сохранить устаревший
+результат после нее: кэш запоминает поколение, в котором инвалидирован
+каждый тег, и загрузчик не записывает значение, если хотя бы один из его
+тегов инвалидирован после начала загрузки.
+"""
+
+import functools
+import inspect
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable
+
+from app.bus import NotifyBus
+from app.etag import feed_versions, is_feed
+
+MISSING = object()
+
+RESPONSE_CACHE_SIZE = 10_000
+RESPONSE_CACHE_TTL = 60
+
+INVALIDATION_CHANNEL = "cache_invalidation"
+# Теги публикуются вместе с версиями лент, пачка должна уложиться в лимит NOTIFY
+INVALIDATION_BATCH_SIZE = 50
+
+
+class TTLCache:
+    """LRU-кэш с ограничением размера, временем жизни записей и счетчиками."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Возвращает значение или MISSING, если записи нет или она устарела."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self.pop(key)
+            self.misses += 1
+            return MISSING
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        if key in self._data:
+            self._data.move_to_end(key)
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+
+        while len(self._data) > self.maxsize:
+            oldest = next(iter(self._data))
+            self.pop(oldest)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class ResponseCache(TTLCache):
+    """TTL/LRU-кэш, записи которого инвалидируются по тегам."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize, ttl)
+        self._keys_by_tag: dict[str, set[Hashable]] = {}
+        self._tags_by_key: dict[Hashable, tuple[str, ...]] = {}
+        self._generation = 0
+        # Поколения инвалидации тегов; хранятся, только пока идут загрузки
+        self._invalidated_at: dict[str, int] = {}
+        self._cleared_at = 0
+        self._loading = 0
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None, tags: Iterable[str] = ()) -> None:
+        self._unlink(key)
+        tags = tuple(tags)
+        self._tags_by_key[key] = tags
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        super().set(key, value, ttl)
+
+    def pop(self, key: Hashable) -> None:
+        self._unlink(key)
+        super().pop(key)
+
+    def clear(self) -> None:
+        self._keys_by_tag.clear()
+        self._tags_by_key.clear()
+        self._generation += 1
+        self._cleared_at = self._generation
+        super().clear()
+
+    def invalidate(self, *tags: str) -> None:
+        self._generation += 1
+        for tag in tags:
+            if self._loading:
+                self._invalidated_at[tag] = self._generation
+            for key in self._keys_by_tag.pop(tag, set()):
+                self.pop(key)
+
+    def _is_stale(self, generation: int, tags: Iterable[str]) -> bool:
+        """Инвалидирован ли кэш или один из тегов после поколения generation."""
+        return self._cleared_at > generation or any(
+            self._invalidated_at.get(tag, 0) > generation for tag in tags
+        )
+
+    def _unlink(self, key: Hashable) -> None:
+        for tag in self._tags_by_key.pop(key, ()):
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def cached(
+            self,
+            *tags: str | Callable[[Any], Iterable[str]],
+            key_params: tuple[str, ...] = (),
+            ttl: float | None = None,
+    ):
+        """
+        Кэширует результат асинхронной функции.
+
+        Параметры:
+            tags: Шаблоны тегов, подставляемые из аргументов функции
+                ("user:{user_id}"), или функции, получающие результат
+                и возвращающие дополнительные теги
+            key_params: Имена аргументов, из которых строится ключ
+            ttl: Время жизни записи в секундах (по умолчанию ttl кэша)
+        """
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                arguments = _bind_arguments(signature, args, kwargs)
+                key = (func.__module__, func.__qualname__, *(arguments[name] for name in key_params))
+
+                value = self.get(key)
+                if value is not MISSING:
+                    return value
+
+                generation = self._generation
+                self._loading += 1
+                try:
+                    value = await func(*args, **kwargs)
+                    entry_tags = []
+                    for tag in tags:
+                        if callable(tag):
+                            entry_tags.extend(tag(value))
+                        else:
+                            entry_tags.append(tag.format(**arguments))
+                    # Запись могла измениться, пока шла загрузка
+                    if not self._is_stale(generation, entry_tags):
+                        self.set(key, value, ttl, entry_tags)
+                finally:
+                    self._loading -= 1
+                    if not self._loading:
+                        self._invalidated_at.clear()
+                return value
+
+            return wrapper
+
+        return decorator
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+
+# Другие локальные кэши (например, кэш Principal) подписываются на инвалидацию
+_invalidate_listeners: list[Callable[[tuple[str, ...]], None]] = []
+_reset_listeners: list[Callable[[], None]] = []
+
+
+def on_invalidate(listener: Callable[[tuple[str, ...]], None]):
+    """Регистрирует обработчик, получающий инвалидируемые теги."""
+    _invalidate_listeners.append(listener)
+    return listener
+
+
+def on_reset(listener: Callable[[], None]):
+    """Регистрирует обработчик полного сброса локальных кэшей."""
+    _reset_listeners.append(listener)
+    return listener
+
+
+def invalidate_local(*tags: str, versions: dict[str, int] | None = None) -> None:
+    """
+    Сбрасывает записи кэша с указанными тегами в текущем воркере.
+
+    Новые версии лент принимаются из versions; версии лент, для которых
+    значение неизвестно, будут перечитаны из базы при следующем запросе.
+    """
+    versions = versions or {}
+    response_cache.invalidate(*tags)
+    feed_versions.forget(*(tag for tag in tags if is_feed(tag) and tag not in versions))
+    feed_versions.apply(versions)
+    for listener in _invalidate_listeners:
+        listener(tags)
+
+
+def reset_local() -> None:
+    """Сбрасывает все локальные кэши, если сообщения шины могли быть потеряны."""
+    response_cache.clear()
+    feed_versions.reset()
+    for listener in _reset_listeners:
+        listener()
+
+
+invalidation_bus = NotifyBus(
+    INVALIDATION_CHANNEL,
+    on_message=lambda message: invalidate_local(*message["tags"], versions=message.get("versions")),
+    on_reset=reset_local,
+)
+
+
+async def invalidate_tags(*tags: str) -> None:
+    """Инвалидирует теги в текущем воркере и рассылает их остальным."""
+    versions = await _bump_feed_versions(tags)
+    invalidate_local(*tags, versions=versions)
+    for start in range(0, len(tags), INVALIDATION_BATCH_SIZE):
+        batch = list(tags[start:start + INVALIDATION_BATCH_SIZE])
+        message = {
+            "tags": batch,
+            "versions": {tag: versions[tag] for tag in batch if tag in versions},
+        }
+        try:
+            await invalidation_bus.publish(message)
+        except Exception as e:
+            # Запись уже зафиксирована; другие воркеры догонят по TTL
+            print(f"Ошибка публикации инвалидации: {e}")
+
+
+async def _bump_feed_versions(tags: tuple[str, ...]) -> dict[str, int]:
+    feeds = [tag for tag in tags if is_feed(tag)]
+    if not feeds:
+        return {}
+    try:
+        return await feed_versions.bump(*feeds)
+    except Exception as e:
+        print(f"Ошибка обновления версий лент: {e}")
+        return {}
+
+
+def invalidates(*tags: str):
+    """
+    Объявляет теги, которые обработчик записи инвалидирует при успехе.
+
+    Шаблоны подставляются из аргументов обработчика, например
+    "user:{current_user.user_id}" или "followers:{following_id}".
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            result = await func(*args, **kwargs)
+            arguments = _bind_arguments(signature, args, kwargs)
+            await invalidate_tags(*(tag.format(**arguments) for tag in tags))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _bind_arguments(signature: inspect.Signature, args: tuple, kwargs: dict) -> dict:
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    return bound.arguments
@@ -0,0 +1,104 @@
+"""
+Кластеризация точек карты путешествий по уровням масштаба.
+
+Точки проецируются в Web Mercator и на каждом масштабе группируются
+по сетке с ячейкой в CLUSTER_RADIUS пикселей тайла, как в supercluster.
+Уровень z строится из центроидов уровня z + 1, а ячейки соседних уровней
+вложены друг в друга, поэтому кластеры образуют иерархию. Все шаги
+векторизованы NumPy: индекс для десятков тысяч точек строится за
+десятки миллисекунд и кэшируется на пользователя до добавления новых точек.
+
+В любой области просмотра на уровне z помещается не больше
+(ширина / радиус) × (высота / радиус) кластеров, поэтому ответ остается
+ограниченным независимо от числа точек.
+"""
+
+import math
+from uuid import UUID
+
+import numpy as np
+
+TILE_SIZE = 256
+# Делитель TILE_SIZE: тогда ячейки соседних масштабов вкладываются ровно
+CLUSTER_RADIUS = 64
+CLUSTER_MAX_ZOOM = 16
+MAX_CLUSTER_FEATURES = 500
+
+
+def travel_map_tag(user_id: UUID) -> str:
+    return f"travel_map:{user_id}"
+
+
+def _project(latitudes: np.ndarray, longitudes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Переводит градусы в координаты Web Mercator в диапазоне [0, 1]."""
+    x = longitudes / 360 + 0.5
+    sin = np.sin(np.radians(latitudes))
+    with np.errstate(divide="ignore"):
+        y = 0.5 - 0.25 * np.log((1 + sin) / (1 - sin)) / math.pi
+    return x, np.clip(y, 0, 1)
+
+
+def _unproject(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    latitudes = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * y))))
+    return latitudes, (x - 0.5) * 360
+
+
+class ClusterIndex:
+    """Кластеры точек пользователя для масштабов 0..CLUSTER_MAX_ZOOM."""
+
+    def __init__(self, latitudes: np.ndarray, longitudes: np.ndarray):
+        x, y = _project(np.asarray(latitudes, dtype=np.float64), np.asarray(longitudes, dtype=np.float64))
+        counts = np.ones(len(x), dtype=np.float64)
+        self.levels: dict[int, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+        for zoom in range(CLUSTER_MAX_ZOOM, -1, -1):
+            if len(x):
+                cells = (TILE_SIZE // CLUSTER_RADIUS) << zoom
+                column = np.minimum((x * cells).astype(np.int64), cells - 1)
+                row = np.minimum((y * cells).astype(np.int64), cells - 1)
+                _, inverse = np.unique(column * cells + row, return_inverse=True)
+                weights = np.bincount(inverse, weights=counts)
+                x = np.bincount(inverse, weights=x * counts) / weights
+                y = np.bincount(inverse, weights=y * counts) / weights
+                counts = weights
+            self.levels[zoom] = (x, y, counts.astype(np.int64))
+
+    def query(
+            self,
+            south: float,
+            west: float,
+            north: float,
+            east: float,
+            zoom: int,
+            limit: int = MAX_CLUSTER_FEATURES,
+    ) -> tuple[list[float], list[float], list[int], bool]:
+        """
+        Возвращает кластеры уровня zoom внутри прямоугольника.
+
+        Возвращает:
+            tuple: Широты и долготы центроидов, числа точек и признак
+                того, что мелкие кластеры отброшены из-за limit
+        """
+        x, y, counts = self.levels[min(zoom, CLUSTER_MAX_ZOOM)]
+        x_west, x_east = west / 360 + 0.5, east / 360 + 0.5
+        _, (y_north, y_south) = _project(np.array([north, south]), np.zeros(2))
+
+        inside = (y >= y_north) & (y <= y_south)
+        if west <= east:
+            inside &= (x >= x_west) & (x <= x_east)
+        else:
+            inside &= (x >= x_west) | (x <= x_east)
+        selected = np.flatnonzero(inside)
+
+        truncated = len(selected) > limit
+        if truncated:
+            # Крупные кластеры важнее одиночных точек
+            selected = selected[np.argpartition(-counts[selected], limit - 1)[:limit]]
+
+        latitudes, longitudes = _unproject(x[selected], y[selected])
+        return (
+            np.round(latitudes, 6).tolist(),
+            np.round(longitudes, 6).tolist(),
+            counts[selected].tolist(),
+            truncated,
+        )
@@ -0,0 +1,120 @@
+"""
+Версии лент отчетов и условные GET-запросы.
+
+Каждая лента (общая публичная лента, отчеты конкретного пользователя)
+имеет счетчик версии в таблице feed_versions. Счетчик увеличивается при
+любой записи, влияющей на ленту, а ETag строится только из версии и
+параметров запроса, поэтому все воркеры выдают одинаковые ETag.
+
+Воркер держит копию счетчиков в памяти: новые значения приходят вместе
+с сообщениями об инвалидации, а отсутствующие читаются из базы один раз.
+Ответ 304 отдается без обращения к таблице отчетов.
+"""
+
+import hashlib
+
+from fastapi import Request, Response, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import engine
+
+FEED_PUBLIC = "feed:public"
+FEED_CACHE_CONTROL = "private, no-cache"
+USER_REPORTS_FEED_PREFIX = "reports:"
+
+
+def user_reports_feed(user_id) -> str:
+    """Ключ ленты отчетов пользователя."""
+    return f"{USER_REPORTS_FEED_PREFIX}{user_id}"
+
+
+def is_feed(tag: str) -> bool:
+    """Проверяет, является ли тег кэша лентой с версией."""
+    return tag == FEED_PUBLIC or tag.startswith(USER_REPORTS_FEED_PREFIX)
+
+
+class FeedVersions:
+    """Локальная копия общих счетчиков версий лент."""
+
+    def __init__(self):
+        self._versions: dict[str, int] = {}
+
+    def reset(self) -> None:
+        # Сообщения могли быть пропущены: версии перечитываются из базы
+        self._versions.clear()
+
+    def forget(self, *feeds: str) -> None:
+        for feed in feeds:
+            self._versions.pop(feed, None)
+
+    def apply(self, versions: dict[str, int]) -> None:
+        """Принимает версии, полученные от воркера, выполнившего запись."""
+        for feed, version in versions.items():
+            self._remember(feed, version)
+
+    async def get(self, db: AsyncSession, feed: str) -> int:
+        version = self._versions.get(feed)
+        if version is None:
+            result = await db.execute(
+                text("SELECT version FROM feed_versions WHERE feed = :feed"),
+                {"feed": feed},
+            )
+            version = self._remember(feed, result.scalar() or 0)
+        return version
+
+    async def bump(self, *feeds: str) -> dict[str, int]:
+        """Увеличивает счетчики лент в базе и возвращает их новые значения."""
+        async with engine.begin() as connection:
+            result = await connection.execute(
+                text("""
+                    INSERT INTO feed_versions (feed, version)
+                    SELECT unnest(CAST(:feeds AS text[])), 1
+                    ON CONFLICT (feed) DO UPDATE SET version = feed_versions.version + 1
+                    RETURNING feed, version
+                """),
+                {"feeds": sorted(set(feeds))},
+            )
+            versions = dict(result.all())
+        self.apply(versions)
+        return versions
+
+    def _remember(self, feed: str, version: int) -> int:
+        # Значение, прочитанное из базы, может оказаться старше пришедшего по шине
+        version = max(version, self._versions.get(feed, 0))
+        self._versions[feed] = version
+        return version
+
+
+feed_versions = FeedVersions()
+
+
+def build_etag(*parts) -> str:
+    """Строит сильный ETag из версий лент и параметров запроса."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Проверяет заголовок If-None-Match на совпадение с текущим ETag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Для If-None-Match допускается слабое сравнение
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def not_modified_response(etag: str) -> Response:
+    """Ответ 304 с теми же заголовками кэширования, что и у полного ответа."""
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": FEED_CACHE_CONTROL},
+    )
+
+
+def set_cache_headers(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = FEED_CACHE_CONTROL
@@ -0,0 +1,142 @@
+"""
+Брокер событий для push-канала клиентов.
+
+Обработчики записи публикуют события (новый отчет, изменение отчета,
+новый подписчик), а открытые SSE-соединения получают их через
+подписку. InProcessBroker рассылает события внутри процесса,
+NotifyBroker дополнительно передает их остальным воркерам через
+Postgres LISTEN/NOTIFY.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi.encoders import jsonable_encoder
+
+from app.bus import NotifyBus
+from app.models import ReportStatusEnum
+
+REPORT_CREATED = "report_created"
+NEW_FOLLOWER = "new_follower"
+FOLLOWER_REMOVED = "follower_removed"
+
+REPORT_EVENTS = (REPORT_CREATED,)
+FOLLOW_EVENTS = (NEW_FOLLOWER, FOLLOWER_REMOVED)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+EVENTS_CHANNEL = "report_events"
+
+
+class EventBroker:
+    """Интерфейс брокера: публикация события и подписка на поток событий."""
+
+    async def publish(self, event: dict) -> None:
+        raise NotImplementedError
+
+    def subscribe(self):
+        raise NotImplementedError
+
+
+class InProcessBroker(EventBroker):
+    """Рассылает события подписчикам текущего процесса через очереди asyncio."""
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self._queue_size = queue_size
+        self._subscribers: set[asyncio.Queue] = set()
+
+    async def publish(self, event: dict) -> None:
+        self._deliver(jsonable_encoder(event))
+
+    def _deliver(self, event: dict) -> None:
+        for queue in list(self._subscribers):
+            if queue.full():
+                # Медленный клиент не должен тормозить остальных: теряем самое старое событие
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    @asynccontextmanager
+    async def subscribe(self):
+        queue = asyncio.Queue(maxsize=self._queue_size)
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+
+class NotifyBroker(InProcessBroker):
+    """Рассылает события локальным подписчикам и подписчикам других воркеров."""
+
+    def __init__(self, channel: str, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        super().__init__(queue_size)
+        self.bus = NotifyBus(channel, on_message=self._deliver)
+
+    async def publish(self, event: dict) -> None:
+        event = jsonable_encoder(event)
+        self._deliver(event)
+        try:
+            await self.bus.publish(event)
+        except Exception as e:
+            print(f"Ошибка публикации события: {e}")
+
+
+broker: EventBroker = NotifyBroker(EVENTS_CHANNEL)
+
+
+def report_event(event_type: str, report, author_username: str) -> dict:
+    """Формирует событие об отчете с полями карточки."""
+    return {
+        "type": event_type,
+        "author_id": report.user_id,
+        # Как в SQL-лентах: статус передается именем значения перечисления
+        "status": report.status.name,
+        "report": {
+            "id": report.id,
+            "user_id": report.user_id,
+            "title": report.title,
+            "description": report.description,
+            "main_image": report.main_image,
+            "side_image": report.side_image,
+            "start_date": report.start_date,
+            "end_date": report.end_date,
+            "duration": report.duration,
+            "likes": report.likes,
+            "comments_count": report.comments_count,
+            "status": report.status.name,
+            "created_at": report.created_at,
+            "updated_at": report.updated_at,
+            "author_username": author_username,
+        },
+    }
+
+
+def follow_event(event_type: str, follower_id, following_id, follower_username: str | None = None) -> dict:
+    """Формирует событие о подписке или отписке."""
+    return {
+        "type": event_type,
+        "follower_id": follower_id,
+        "following_id": following_id,
+        "follower_username": follower_username,
+    }
+
+
+def is_visible(event: dict, viewer_id: str, following: set[str]) -> bool:
+    """
+    Проверяет, должен ли зритель получить событие.
+
+    Правила для отчетов совпадают с get_user_public_reports: автор видит
+    всё, остальные — PUBLIC и FRIENDS_ONLY при наличии подписки.
+    События подписки получает только тот, на кого подписались.
+    """
+    if event["type"] in REPORT_EVENTS:
+        author_id = event["author_id"]
+        if author_id == viewer_id:
+            return True
+        if event["status"] == ReportStatusEnum.PUBLIC.name:
+            return True
+        return event["status"] == ReportStatusEnum.FRIENDS_ONLY.name and author_id in following
+
+    if event["type"] in FOLLOW_EVENTS:
+        return event["following_id"] == viewer_id
+
+    return False
@@ -0,0 +1,98 @@
+"""
+Извлечение EXIF из загруженных фотографий.
+
+EXIF хранится в заголовке файла (в JPEG — сегмент APP1 не больше 64 КБ),
+поэтому из хранилища читаются только первые EXIF_HEADER_BYTES байт,
+а пиксели не декодируются. Из тегов берутся время съемки, координаты
+GPS и камера; координаты потом становятся точками карты путешествий автора.
+"""
+
+import asyncio
+import io
+from datetime import datetime
+
+from PIL import ExifTags, Image
+
+from app.storage import storage
+
+EXIF_HEADER_BYTES = 128 * 1024
+EXIF_DATETIME_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+
+def _to_degrees(value, ref) -> float | None:
+    """Переводит градусы, минуты и секунды GPS в десятичные градусы."""
+    try:
+        degrees, minutes, seconds = (float(part) for part in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    result = degrees + minutes / 60 + seconds / 3600
+    return -result if ref in ("S", "W") else result
+
+
+def _parse_taken_at(value, offset) -> str | None:
+    if not isinstance(value, str):
+        return None
+    try:
+        taken_at = datetime.strptime(value.strip("\x00 "), EXIF_DATETIME_FORMAT)
+    except ValueError:
+        return None
+    # Смещение часового пояса записывают не все камеры
+    if isinstance(offset, str):
+        try:
+            return datetime.fromisoformat(taken_at.isoformat() + offset.strip("\x00 ")).isoformat()
+        except ValueError:
+            pass
+    return taken_at.isoformat()
+
+
+def parse_exif(header: bytes) -> dict | None:
+    """
+    Разбирает EXIF из начальных байтов изображения.
+
+    Возвращает:
+        dict | None: taken_at, latitude, longitude и camera, если они
+            есть в файле, или None, если EXIF нет или он не читается
+    """
+    try:
+        with Image.open(io.BytesIO(header)) as image:
+            exif = image.getexif()
+            exif_ifd = exif.get_ifd(ExifTags.IFD.Exif)
+            gps_ifd = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    except Exception:
+        return None
+
+    result = {}
+
+    taken_at = _parse_taken_at(
+        exif_ifd.get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime),
+        exif_ifd.get(ExifTags.Base.OffsetTimeOriginal),
+    )
+    if taken_at:
+        result["taken_at"] = taken_at
+
+    latitude = _to_degrees(gps_ifd.get(ExifTags.GPS.GPSLatitude), gps_ifd.get(ExifTags.GPS.GPSLatitudeRef))
+    longitude = _to_degrees(gps_ifd.get(ExifTags.GPS.GPSLongitude), gps_ifd.get(ExifTags.GPS.GPSLongitudeRef))
+    # Нулевые координаты пишут телефоны без фиксации GPS
+    if (
+        latitude is not None and longitude is not None
+        and -90 <= latitude <= 90 and -180 <= longitude <= 180
+        and (latitude, longitude) != (0, 0)
+    ):
+        result["latitude"] = round(latitude, 6)
+        result["longitude"] = round(longitude, 6)
+
+    make = str(exif.get(ExifTags.Base.Make) or "").strip("\x00 ")
+    model = str(exif.get(ExifTags.Base.Model) or "").strip("\x00 ")
+    camera = model if model.startswith(make) else f"{make} {model}".strip()
+    if camera:
+        result["camera"] = camera
+
+    return result or None
+
+
+async def read_exif(storage_key: str) -> dict | None:
+    """Читает из хранилища только заголовок файла и разбирает его EXIF."""
+    header = bytearray()
+    async for chunk in storage.get_stream(storage_key, 0, EXIF_HEADER_BYTES - 1):
+        header.extend(chunk)
+    return await asyncio.to_thread(parse_exif, bytes(header))
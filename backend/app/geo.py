@@ -0,0 +1,140 @@
+"""
+Геохеш и покрытие прямоугольника ячейками.
+
+Геохеш чередует биты долготы и широты (Z-кривая), поэтому точки внутри
+одной ячейки имеют общий префикс и лежат рядом в B-дереве. Столбец
+travel_map.geohash вычисляет сама база функцией geohash_encode;
+здесь — та же кодировка на Python и разбиение области просмотра на
+небольшое число непрерывных диапазонов ключей для индексного поиска
+и прямоугольник вокруг круга заданного радиуса для поиска ближайших.
+"""
+
+import math
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+# Верхняя граница диапазона для префикса: символ после 'z' в порядке C
+GEOHASH_RANGE_END = "{"
+MAX_COVER_CELLS = 32
+# Длина дуги в один градус на сфере радиусом 6371.0088 км
+KM_PER_DEGREE = 111.195
+
+
+def _bit_counts(precision: int) -> tuple[int, int]:
+    """Число бит долготы и широты в геохеше заданной длины."""
+    bits = precision * 5
+    return (bits + 1) // 2, bits // 2
+
+
+def _cell_index(value: float, low: float, high: float, bits: int) -> int:
+    cells = 1 << bits
+    return min(cells - 1, max(0, math.floor((value - low) / (high - low) * cells)))
+
+
+def _interleave(lon_index: int, lat_index: int, precision: int) -> int:
+    lon_bits, lat_bits = _bit_counts(precision)
+    value = 0
+    for position in range(precision * 5):
+        if position % 2 == 0:
+            lon_bits -= 1
+            value = (value << 1) | ((lon_index >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            value = (value << 1) | ((lat_index >> lat_bits) & 1)
+    return value
+
+
+def _to_string(value: int, precision: int) -> str:
+    return "".join(
+        GEOHASH_ALPHABET[(value >> (5 * (precision - 1 - i))) & 31]
+        for i in range(precision)
+    )
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lon_bits, lat_bits = _bit_counts(precision)
+    return _to_string(
+        _interleave(
+            _cell_index(longitude, -180, 180, lon_bits),
+            _cell_index(latitude, -90, 90, lat_bits),
+            precision,
+        ),
+        precision,
+    )
+
+
+def _cover_precision(south: float, west: float, north: float, east: float, max_cells: int) -> int:
+    """Наибольшая длина геохеша, ячейки которой покрывают область не более чем max_cells штуками."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lon_bits, lat_bits = _bit_counts(precision)
+        columns = _cell_index(east, -180, 180, lon_bits) - _cell_index(west, -180, 180, lon_bits) + 1
+        rows = _cell_index(north, -90, 90, lat_bits) - _cell_index(south, -90, 90, lat_bits) + 1
+        if columns * rows <= max_cells:
+            return precision
+    return 1
+
+
+def geohash_ranges(
+        south: float,
+        west: float,
+        north: float,
+        east: float,
+        max_cells: int = MAX_COVER_CELLS,
+) -> list[tuple[str, str]]:
+    """
+    Покрывает прямоугольник диапазонами геохешей [start, end).
+
+    Соседние по Z-кривой ячейки склеиваются в один диапазон, так что
+    каждый диапазон — один проход по индексу. Покрытие может выходить за
+    прямоугольник: точное условие по координатам проверяет запрос.
+    Прямоугольник через антимеридиан (west > east) делится на два.
+    """
+    if west > east:
+        return (
+            geohash_ranges(south, west, north, 180, max_cells)
+            + geohash_ranges(south, -180, north, east, max_cells)
+        )
+
+    precision = _cover_precision(south, west, north, east, max_cells)
+    lon_bits, lat_bits = _bit_counts(precision)
+    cells = sorted(
+        _interleave(lon_index, lat_index, precision)
+        for lon_index in range(_cell_index(west, -180, 180, lon_bits), _cell_index(east, -180, 180, lon_bits) + 1)
+        for lat_index in range(_cell_index(south, -90, 90, lat_bits), _cell_index(north, -90, 90, lat_bits) + 1)
+    )
+
+    ranges = []
+    start = previous = cells[0]
+    for cell in cells[1:] + [None]:
+        if cell == previous + 1:
+            previous = cell
+            continue
+        end = previous + 1
+        ranges.append((
+            _to_string(start, precision),
+            _to_string(end, precision) if end < 1 << (precision * 5) else GEOHASH_RANGE_END,
+        ))
+        if cell is not None:
+            start = previous = cell
+    return ranges
+
+
+def radius_box(latitude: float, longitude: float, radius_km: float) -> tuple[float, float, float, float]:
+    """
+    Наименьший прямоугольник (south, west, north, east), содержащий круг
+    радиуса radius_km вокруг точки. Через антимеридиан west > east.
+    """
+    delta = radius_km / KM_PER_DEGREE
+    south, north = max(-90.0, latitude - delta), min(90.0, latitude + delta)
+    # Круг, накрывающий полюс, охватывает все долготы
+    ratio = math.sin(math.radians(delta)) / math.cos(math.radians(latitude)) if delta < 90 else 1
+    if south == -90 or north == 90 or ratio >= 1:
+        return south, -180.0, north, 180.0
+
+    lon_delta = math.degrees(math.asin(ratio))
+    west, east = longitude - lon_delta, longitude + lon_delta
+    if west < -180:
+        west += 360
+    if east > 180:
+        east -= 360
+    return south, west, north, east
@@ -0,0 +1,345 @@
+"""
+Офлайн-геокодер: страна и регион по координатам без внешних API.
+
+Полигоны стран или административных регионов (например, Natural Earth
+admin 1) один раз переводятся командой
+
+    python -m app.geocoder build ne_10m_admin_1_states_provinces.geojson
+
+в каталог GEOCODER_DATA_DIR из файлов .npy: ребра полигонов, границы
+полигонов и узлы R-дерева, упакованного методом STR (Sort-Tile-Recursive).
+При запуске файлы открываются через mmap, поэтому все воркеры на машине
+делят одни и те же страницы памяти, а загрузка не зависит от размера данных.
+
+Поиск спускается по R-дереву к полигонам, чьи рамки содержат точку, и
+проверяет попадание лучом по ребрам (правило чет-нечет, дыры учитываются
+автоматически). Результаты кэшируются в LRU по округленным координатам.
+Если набор данных не собран, геокодер выключен и возвращает None.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+GEOCODER_DATA_DIR = Path(os.getenv(
+    "GEOCODER_DATA_DIR",
+    Path(__file__).resolve().parent.parent / "data" / "geocoder",
+))
+GEOCODER_CACHE_SIZE = 65_536
+# ~11 м: соседние снимки попадают в одну запись кэша
+GEOCODER_CACHE_PRECISION = 4
+RTREE_NODE_CAPACITY = 16
+
+
+@dataclass(frozen=True)
+class Place:
+    country_code: str | None
+    country: str | None
+    name: str | None
+
+    @property
+    def location(self) -> str:
+        return ", ".join(part for part in (self.name, self.country) if part)
+
+
+def _str_order(boxes: np.ndarray, capacity: int) -> np.ndarray:
+    """Порядок прямоугольников по STR: полосы по x, внутри полосы — по y."""
+    count = len(boxes)
+    slices = math.ceil(math.sqrt(math.ceil(count / capacity)))
+    slice_size = slices * capacity
+    centers_x = (boxes[:, 0] + boxes[:, 2]) / 2
+    centers_y = (boxes[:, 1] + boxes[:, 3]) / 2
+    by_x = np.argsort(centers_x, kind="stable")
+    return np.concatenate([
+        strip[np.argsort(centers_y[strip], kind="stable")]
+        for strip in (by_x[start:start + slice_size] for start in range(0, count, slice_size))
+    ])
+
+
+def _pack_level(boxes: np.ndarray, capacity: int) -> tuple[np.ndarray, np.ndarray]:
+    """Группирует подряд идущие прямоугольники в узлы родительского уровня."""
+    starts = np.arange(0, len(boxes), capacity)
+    parents = np.column_stack([
+        np.minimum.reduceat(boxes[:, 0], starts),
+        np.minimum.reduceat(boxes[:, 1], starts),
+        np.maximum.reduceat(boxes[:, 2], starts),
+        np.maximum.reduceat(boxes[:, 3], starts),
+    ])
+    return parents, starts
+
+
+def _polygon_parts(geometry: dict) -> list[list]:
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+def build_dataset(
+        source: Path,
+        output_dir: Path,
+        code_field: str,
+        country_field: str,
+        name_field: str | None,
+) -> int:
+    """
+    Собирает индекс из GeoJSON FeatureCollection с полигонами.
+
+    Возвращает:
+        int: Число полигонов в индексе
+    """
+    with open(source, encoding="utf-8") as file:
+        features = json.load(file)["features"]
+
+    regions, polygon_regions, polygon_edges, polygon_boxes = [], [], [], []
+    for feature in features:
+        properties = feature.get("properties") or {}
+        code = properties.get(code_field)
+        region = len(regions)
+        regions.append({
+            # Natural Earth помечает спорные территории кодом -99
+            "country_code": code if isinstance(code, str) and len(code) == 2 else None,
+            "country": properties.get(country_field),
+            "name": properties.get(name_field) if name_field else None,
+        })
+        for rings in _polygon_parts(feature.get("geometry") or {}):
+            edges = []
+            for ring in rings:
+                points = np.asarray(ring, dtype=np.float64)[:, :2]
+                if not np.array_equal(points[0], points[-1]):
+                    points = np.vstack([points, points[:1]])
+                edges.append(np.hstack([points[:-1], points[1:]]))
+            if not edges:
+                continue
+            edges = np.vstack(edges)
+            polygon_edges.append(edges)
+            polygon_boxes.append([
+                min(edges[:, 0].min(), edges[:, 2].min()),
+                min(edges[:, 1].min(), edges[:, 3].min()),
+                max(edges[:, 0].max(), edges[:, 2].max()),
+                max(edges[:, 1].max(), edges[:, 3].max()),
+            ])
+            polygon_regions.append(region)
+
+    if not polygon_edges:
+        raise ValueError("В источнике нет полигонов")
+
+    # Полигоны записываются в порядке STR: листья дерева ссылаются на них диапазонами
+    boxes = np.asarray(polygon_boxes)
+    order = _str_order(boxes, RTREE_NODE_CAPACITY)
+    boxes = boxes[order]
+    edges = [polygon_edges[i] for i in order]
+    edge_offsets = np.concatenate([[0], np.cumsum([len(e) for e in edges])])
+
+    node_boxes, node_starts, node_counts, level_offsets = [], [], [], [0]
+    level_boxes, child_count = boxes, len(boxes)
+    while True:
+        parents, starts = _pack_level(level_boxes, RTREE_NODE_CAPACITY)
+        counts = np.diff(np.append(starts, child_count))
+        if len(parents) > 1:
+            # Узлы уровня тоже упорядочиваются по STR вместе с диапазонами детей
+            parent_order = _str_order(parents, RTREE_NODE_CAPACITY)
+            parents, starts, counts = parents[parent_order], starts[parent_order], counts[parent_order]
+        node_boxes.append(parents)
+        node_starts.append(starts)
+        node_counts.append(counts)
+        level_offsets.append(level_offsets[-1] + len(parents))
+        if len(parents) == 1:
+            break
+        level_boxes, child_count = parents, len(parents)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    np.save(output_dir / "edges.npy", np.vstack(edges))
+    np.save(output_dir / "edge_offsets.npy", edge_offsets.astype(np.int64))
+    np.save(output_dir / "polygon_boxes.npy", boxes)
+    np.save(output_dir / "polygon_regions.npy", np.asarray(polygon_regions, dtype=np.int32)[order])
+    np.save(output_dir / "node_boxes.npy", np.vstack(node_boxes))
+    np.save(output_dir / "node_starts.npy", np.concatenate(node_starts).astype(np.int64))
+    np.save(output_dir / "node_counts.npy", np.concatenate(node_counts).astype(np.int64))
+    np.save(output_dir / "level_offsets.npy", np.asarray(level_offsets, dtype=np.int64))
+    with open(output_dir / "regions.json", "w", encoding="utf-8") as file:
+        json.dump(regions, file, ensure_ascii=False)
+    return len(boxes)
+
+
+class ReverseGeocoder:
+    """Поиск региона по точке в индексе, открытом через mmap."""
+
+    def __init__(self, data_dir: Path, cache_size: int = GEOCODER_CACHE_SIZE):
+        self.data_dir = data_dir
+        self.enabled = False
+        self._lookup_rounded = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def load(self) -> None:
+        if not (self.data_dir / "regions.json").exists():
+            print(f"Геокодер выключен: нет данных в {self.data_dir}")
+            return
+
+        def array(name: str) -> np.ndarray:
+            return np.load(self.data_dir / f"{name}.npy", mmap_mode="r")
+
+        self._edges = array("edges")
+        self._edge_offsets = array("edge_offsets")
+        self._polygon_boxes = array("polygon_boxes")
+        self._polygon_regions = array("polygon_regions")
+        self._node_boxes = array("node_boxes")
+        self._node_starts = array("node_starts")
+        self._node_counts = array("node_counts")
+        # Уровни небольшие и читаются при каждом поиске
+        self._level_offsets = np.load(self.data_dir / "level_offsets.npy")
+        with open(self.data_dir / "regions.json", encoding="utf-8") as file:
+            self._regions = [Place(**region) for region in json.load(file)]
+        self._lookup_rounded.cache_clear()
+        self.enabled = True
+
+    def lookup(self, latitude: float, longitude: float) -> Place | None:
+        """Регион, содержащий точку, или None вне полигонов и при выключенном геокодере."""
+        if not self.enabled:
+            return None
+        return self._lookup_rounded(
+            round(latitude, GEOCODER_CACHE_PRECISION),
+            round(longitude, GEOCODER_CACHE_PRECISION),
+        )
+
+    def lookup_many(self, latitudes, longitudes) -> list[Place | None]:
+        """Пакетный поиск для заполнения: одинаковые точки ищутся один раз."""
+        if not self.enabled:
+            return [None] * len(latitudes)
+        points = np.round(
+            np.column_stack([np.asarray(latitudes, dtype=np.float64), np.asarray(longitudes, dtype=np.float64)]),
+            GEOCODER_CACHE_PRECISION,
+        )
+        unique, inverse = np.unique(points, axis=0, return_inverse=True)
+        places = [self._lookup_rounded(float(lat), float(lon)) for lat, lon in unique]
+        return [places[i] for i in inverse.ravel()]
+
+    def _candidates(self, latitude: float, longitude: float) -> np.ndarray:
+        """Полигоны, чьи рамки содержат точку, через спуск по R-дереву."""
+        offsets = self._level_offsets
+        nodes = np.arange(offsets[-2], offsets[-1])
+        for level in range(len(offsets) - 2, -1, -1):
+            boxes = self._node_boxes[nodes]
+            nodes = nodes[
+                (boxes[:, 0] <= longitude) & (longitude <= boxes[:, 2])
+                & (boxes[:, 1] <= latitude) & (latitude <= boxes[:, 3])
+            ]
+            if not len(nodes):
+                return nodes
+            # Дети узлов уровня level лежат на уровне ниже (для нулевого — полигоны)
+            base = offsets[level - 1] if level > 0 else 0
+            nodes = np.concatenate([
+                np.arange(base + start, base + start + count)
+                for start, count in zip(self._node_starts[nodes], self._node_counts[nodes])
+            ])
+        boxes = self._polygon_boxes[nodes]
+        return nodes[
+            (boxes[:, 0] <= longitude) & (longitude <= boxes[:, 2])
+            & (boxes[:, 1] <= latitude) & (latitude <= boxes[:, 3])
+        ]
+
+    def _contains(self, polygon: int, latitude: float, longitude: float) -> bool:
+        edges = self._edges[self._edge_offsets[polygon]:self._edge_offsets[polygon + 1]]
+        x1, y1, x2, y2 = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+        crossing = (y1 > latitude) != (y2 > latitude)
+        x = x1[crossing] + (latitude - y1[crossing]) * (x2[crossing] - x1[crossing]) / (y2[crossing] - y1[crossing])
+        return bool(np.count_nonzero(longitude < x) % 2)
+
+    def _lookup(self, latitude: float, longitude: float) -> Place | None:
+        candidates = self._candidates(latitude, longitude)
+        if len(candidates) > 1:
+            # При вложенных полигонах выигрывает самый мелкий
+            boxes = self._polygon_boxes[candidates]
+            candidates = candidates[np.argsort((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]))]
+        for polygon in candidates:
+            if self._contains(int(polygon), latitude, longitude):
+                return self._regions[int(self._polygon_regions[polygon])]
+        return None
+
+
+geocoder = ReverseGeocoder(GEOCODER_DATA_DIR)
+
+
+async def backfill_places(batch_size: int = 10_000) -> int:
+    """
+    Заполняет страну и название места у точек карты без страны
+    и пересчитывает статистику затронутых пользователей.
+
+    Возвращает:
+        int: Число точек, для которых найден регион
+    """
+    from sqlalchemy import text
+
+    from app.database import AsyncSessionLocal
+    from app.travel_stats import recompute_travel_stats
+
+    geocoder.load()
+    if not geocoder.enabled:
+        return 0
+
+    updated, users, last_id = 0, set(), 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            result = await db.execute(
+                text("""
+                    SELECT id, user_id, latitude, longitude, report_id
+                    FROM travel_map
+                    WHERE country_code IS NULL AND id > :last_id
+                    ORDER BY id
+                    LIMIT :batch_size
+                """),
+                {"last_id": last_id, "batch_size": batch_size},
+            )
+            rows = result.mappings().all()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+
+            places = geocoder.lookup_many([r["latitude"] for r in rows], [r["longitude"] for r in rows])
+            found = [(row, place) for row, place in zip(rows, places) if place and place.country_code]
+            if found:
+                await db.execute(
+                    text("""
+                        UPDATE travel_map
+                        SET country_code = :country_code,
+                            location = CASE WHEN report_id IS NOT NULL THEN :location ELSE location END
+                        WHERE id = :id
+                    """),
+                    [
+                        {"id": row["id"], "country_code": place.country_code, "location": place.location}
+                        for row, place in found
+                    ],
+                )
+                await db.commit()
+                updated += len(found)
+                users.update(row["user_id"] for row, _ in found)
+
+    if users:
+        await recompute_travel_stats(list(users))
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Офлайн-геокодер")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Собрать индекс из GeoJSON")
+    build.add_argument("source", type=Path)
+    build.add_argument("--output", type=Path, default=GEOCODER_DATA_DIR)
+    build.add_argument("--code-field", default="iso_a2")
+    build.add_argument("--country-field", default="admin")
+    build.add_argument("--name-field", default="name")
+    commands.add_parser("backfill", help="Заполнить страны у существующих точек карты")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_dataset(args.source, args.output, args.code_field, args.country_field, args.name_field)
+        print(f"Полигонов в индексе: {count}")
+    else:
+        print(f"Точек с найденным регионом: {asyncio.run(backfill_places())}")
@@ -0,0 +1,305 @@
+"""
+Фоновая генерация производных изображений.
+
+После загрузки блоба изображение уменьшается до фиксированных ширин и
+перекодируется в WebP. Декодирование и сжатие нагружают CPU, поэтому
+выполняются в пуле процессов, а не в цикле событий. Варианты хранятся
+рядом с оригиналом (ab/cd/<hash>-320.webp). Их описание записывается в
+media_blobs.file_metadata и копируется в file_metadata строк media_files
+с тем же хешем. Содержимое адресуется хешем, поэтому каждый блоб
+обрабатывается один раз, сколько бы отчетов на него ни ссылалось.
+
+Там же вычисляется крошечное размытое превью (LQIP) в виде data URI,
+которое отдается вместе с карточками, чтобы клиент мог сразу
+нарисовать заглушку без дополнительных запросов.
+
+Из заголовка файла извлекается EXIF (время съемки, GPS, камера).
+Координаты снимков становятся точками карты путешествий авторов
+отчетов (точки одного отчета в пределах ~100 м считаются одной) и сразу
+учитываются в их статистике путешествий. Страну и название места
+определяет офлайн-геокодер.
+"""
+
+import asyncio
+import base64
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from PIL import Image, ImageOps
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import invalidate_tags
+from app.clusters import travel_map_tag
+from app.database import AsyncSessionLocal
+from app.etag import FEED_PUBLIC, user_reports_feed
+from app.exif import read_exif
+from app.geocoder import geocoder
+from app.media import blob_url
+from app.storage import MEDIA_URL_PREFIX, storage
+from app.travel_stats import add_points as add_travel_points
+from app.utils import UPLOAD_TMP_DIR
+
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_WEBP_QUALITY = 80
+# Превью-заглушка: около 200 байт base64, отдается прямо в ответах API
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 30
+IMAGE_POOL_SIZE = int(os.getenv("IMAGE_POOL_SIZE", max(1, (os.cpu_count() or 2) // 2)))
+
+# SVG не растрируется, остальные форматы Pillow читает сам
+RESIZABLE_TYPES = {"image/jpeg", "image/png", "image/webp"}
+
+
+def variant_storage_key(file_hash: str, width: int) -> str:
+    return f"{file_hash[:2]}/{file_hash[2:4]}/{file_hash}-{width}.webp"
+
+
+def _open_image(source: str) -> Image.Image:
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        image.load()
+    return image
+
+
+def _placeholder(image: Image.Image) -> str:
+    preview = image.copy()
+    preview.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    buffer = io.BytesIO()
+    preview.save(buffer, "WEBP", quality=PLACEHOLDER_QUALITY)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def render_placeholder(source: str) -> str:
+    """Строит LQIP-превью для уже обработанного блоба. Выполняется в дочернем процессе."""
+    return _placeholder(_open_image(source))
+
+
+def render_variants(source: str, output_dir: str, file_hash: str) -> dict:
+    """
+    Строит WebP-варианты изображения фиксированных ширин.
+
+    Выполняется в дочернем процессе и пишет варианты в output_dir;
+    в хранилище их переносит вызывающий. Ширины больше исходной
+    пропускаются, но хотя бы один WebP-вариант создается всегда.
+
+    Возвращает:
+        dict: Размеры оригинала, список вариантов с шириной, высотой и URL
+            и LQIP-превью
+    """
+    image = _open_image(source)
+    width, height = image.size
+
+    variants = []
+    for target_width in IMAGE_VARIANT_WIDTHS:
+        variant_width = min(target_width, width)
+        variant_height = max(1, round(height * variant_width / width))
+        resized = image if variant_width == width else image.resize(
+            (variant_width, variant_height), Image.Resampling.LANCZOS
+        )
+
+        storage_key = variant_storage_key(file_hash, variant_width)
+        resized.save(Path(output_dir) / Path(storage_key).name, "WEBP", quality=IMAGE_WEBP_QUALITY, method=4)
+
+        variants.append({"width": variant_width, "height": variant_height, "url": blob_url(storage_key)})
+        if variant_width == width:
+            break
+
+    return {"width": width, "height": height, "variants": variants, "placeholder": _placeholder(image)}
+
+
+class ImagePipeline:
+    """Очередь обработки блобов, выполняемой в пуле процессов."""
+
+    def __init__(self, workers: int):
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._tasks: dict[str, asyncio.Task] = {}
+        # Блобы, поставленные в обработку повторно, пока их задача еще выполнялась
+        self._rerun: set[str] = set()
+
+    def schedule(self, *file_hashes: str | None) -> None:
+        """Ставит блобы в обработку; вызывать после фиксации транзакции."""
+        for file_hash in set(filter(None, file_hashes)):
+            if file_hash in self._tasks:
+                # Строки media_files, добавленные после UPDATE текущей задачи,
+                # обработает повторный запуск
+                self._rerun.add(file_hash)
+                continue
+            task = asyncio.create_task(self._process(file_hash))
+            self._tasks[file_hash] = task
+            task.add_done_callback(lambda task, file_hash=file_hash: self._finished(file_hash, task))
+
+    def _finished(self, file_hash: str, task: asyncio.Task) -> None:
+        self._tasks.pop(file_hash, None)
+        if file_hash in self._rerun:
+            self._rerun.discard(file_hash)
+            if not task.cancelled():
+                self.schedule(file_hash)
+
+    async def resume(self) -> None:
+        """
+        Ставит в обработку блобы, оставшиеся необработанными после перезапуска,
+        и блобы, описание которых не скопировано в строки media_files.
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                text("""
+                    SELECT b.file_hash
+                    FROM media_blobs b
+                    WHERE b.ref_count > 0
+                      AND b.content_type = ANY(:content_types)
+                      AND (
+                          (b.file_metadata -> 'placeholder') IS NULL
+                          OR (b.file_metadata -> 'exif') IS NULL
+                          -- Блоб обработан, но строка отчета добавлена после копирования описания
+                          OR EXISTS (
+                              SELECT 1
+                              FROM media_files mf
+                              WHERE mf.file_hash = b.file_hash
+                                AND mf.report_id IS NOT NULL
+                                AND ((mf.file_metadata -> 'placeholder') IS NULL OR (mf.file_metadata -> 'exif') IS NULL)
+                          )
+                      )
+                """),
+                {"content_types": list(RESIZABLE_TYPES)},
+            )
+            self.schedule(*result.scalars().all())
+
+    def shutdown(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _process(self, file_hash: str) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    text("SELECT storage_key, content_type, file_metadata FROM media_blobs WHERE file_hash = :file_hash"),
+                    {"file_hash": file_hash},
+                )
+                blob = result.mappings().first()
+            if not blob or blob["content_type"] not in RESIZABLE_TYPES:
+                return
+
+            metadata = blob["file_metadata"]
+            if metadata is None or "placeholder" not in metadata:
+                async with storage.local_copy(blob["storage_key"]) as source:
+                    if metadata is None:
+                        metadata = await self._render_variants(file_hash, source)
+                        # Поврежденный файл помечается обработанным, чтобы не повторять работу
+                        metadata = metadata or {"variants": [], "placeholder": None}
+                    else:
+                        # Блоб обработан до появления превью
+                        placeholder = await self._render(file_hash, render_placeholder, str(source))
+                        metadata = {**metadata, "placeholder": placeholder}
+
+            if "exif" not in metadata:
+                metadata = {**metadata, "exif": await read_exif(blob["storage_key"])}
+
+            await self._store(file_hash, metadata, save_blob=metadata != blob["file_metadata"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Ошибка обработки изображения {file_hash}: {e}")
+
+    async def _render_variants(self, file_hash: str, source: Path) -> dict | None:
+        with tempfile.TemporaryDirectory(dir=UPLOAD_TMP_DIR) as output_dir:
+            metadata = await self._render(file_hash, render_variants, str(source), output_dir, file_hash)
+            for variant in (metadata or {}).get("variants", []):
+                storage_key = variant["url"].removeprefix(MEDIA_URL_PREFIX)
+                await storage.put_file(storage_key, Path(output_dir) / Path(storage_key).name, "image/webp")
+        return metadata
+
+    async def _render(self, file_hash: str, func, *args):
+        """Выполняет func в пуле процессов; для нечитаемого файла возвращает None."""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, func, *args)
+        except BrokenProcessPool:
+            # Блоб останется необработанным и будет подхвачен resume
+            raise
+        except Exception as e:
+            print(f"Не удалось обработать изображение {file_hash}: {e}")
+            return None
+
+    async def _store(self, file_hash: str, metadata: dict, save_blob: bool) -> None:
+        params = {"file_hash": file_hash, "metadata": json.dumps(metadata)}
+        async with AsyncSessionLocal() as db:
+            if save_blob:
+                await db.execute(
+                    text("UPDATE media_blobs SET file_metadata = CAST(:metadata AS jsonb) WHERE file_hash = :file_hash"),
+                    params,
+                )
+            result = await db.execute(
+                text("""
+                    UPDATE media_files mf
+                    SET file_metadata = coalesce(mf.file_metadata, '{}'::jsonb) || CAST(:metadata AS jsonb)
+                    FROM reports r
+                    WHERE mf.file_hash = :file_hash
+                      AND r.id = mf.report_id
+                      AND ((mf.file_metadata -> 'placeholder') IS NULL OR (mf.file_metadata -> 'exif') IS NULL)
+                    RETURNING r.user_id, mf.report_id
+                """),
+                params,
+            )
+            reports = set(result.tuples().all())
+            mapped = await self._add_travel_points(db, reports, metadata.get("exif"))
+            await db.commit()
+
+        authors = {user_id for user_id, _ in reports}
+
+        # Ленты отдаются по ETag и должны получить варианты и превью сразу;
+        # профили с аватарами обновятся по истечении TTL кэша, а профили
+        # с новой статистикой путешествий — сразу
+        if authors:
+            await invalidate_tags(
+                FEED_PUBLIC,
+                *(user_reports_feed(user_id) for user_id in authors),
+                *(travel_map_tag(user_id) for user_id in mapped),
+                *(f"user:{user_id}" for user_id in mapped),
+            )
+
+    @staticmethod
+    async def _add_travel_points(db: AsyncSession, reports: set, exif: dict | None) -> set:
+        """
+        Добавляет место съемки на карту каждого автора одним пакетным INSERT
+        и учитывает новые точки в статистике путешествий.
+
+        Возвращает:
+            set: Авторы, чьи карта и статистика изменились
+        """
+        if not reports or not exif or "latitude" not in exif:
+            return set()
+        latitude, longitude = exif["latitude"], exif["longitude"]
+        place = geocoder.lookup(latitude, longitude)
+        result = await db.execute(
+            text("""
+                INSERT INTO travel_map (user_id, report_id, location, country_code, latitude, longitude, visited_at)
+                SELECT a.user_id, a.report_id, :location, :country_code, :latitude, :longitude,
+                       coalesce(CAST(:visited_at AS timestamptz), now())
+                FROM unnest(CAST(:user_ids AS uuid[]), CAST(:report_ids AS integer[])) AS a(user_id, report_id)
+                ON CONFLICT (user_id, report_id, round(latitude::numeric, 3), round(longitude::numeric, 3))
+                    WHERE report_id IS NOT NULL
+                DO NOTHING
+                RETURNING id, user_id, latitude, longitude, visited_at, country_code
+            """),
+            {
+                "user_ids": [user_id for user_id, _ in reports],
+                "report_ids": [report_id for _, report_id in reports],
+                "location": place.location if place and place.location else f"{latitude:.5f}, {longitude:.5f}",
+                "country_code": place.country_code if place else None,
+                "latitude": latitude,
+                "longitude": longitude,
+                "visited_at": exif.get("taken_at"),
+            },
+        )
+        return await add_travel_points(db, result.mappings().all())
+
+image_pipeline = ImagePipeline(IMAGE_POOL_SIZE)
@@ -0,0 +1,251 @@
+"""
+Хранилище медиафайлов с адресацией по содержимому.
+
+Каждый файл сохраняется один раз под ключом из своего SHA-256 в
+подкаталогах по первым символам хеша (ab/cd/abcd....jpg). Таблица
+media_blobs считает ссылки на содержимое: повторная загрузка того же
+файла только увеличивает счетчик, а файл удаляется, когда уходит
+последняя ссылка.
+
+Удаление выполняется отдельной транзакцией после фиксации основной:
+строка блоба блокируется, объект удаляется из хранилища, строка удаляется.
+Загрузка того же содержимого в это время ждет блокировку и затем
+записывает объект заново.
+"""
+
+import asyncio
+import re
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.storage import MEDIA_URL_PREFIX, storage
+from app.utils import ALLOWED_MIME_TYPES, MAX_UPLOAD_SIZE, stream_upload_file
+
+MEDIA_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/svg": "svg",
+    "video/mp4": "mp4",
+    "video/quicktime": "mov",
+    "video/webm": "webm",
+    "audio/mpeg": "mp3",
+    "audio/mp4": "m4a",
+    "audio/ogg": "ogg",
+    "audio/wav": "wav",
+}
+
+_BLOB_URL = re.compile(r"/[0-9a-f]{2}/[0-9a-f]{2}/(?P<hash>[0-9a-f]{64})(\.\w+)?$")
+
+
+@dataclass(frozen=True)
+class StoredBlob:
+    file_hash: str
+    url: str
+    content_type: str
+    size: int
+    created: bool
+
+
+def blob_storage_key(file_hash: str, content_type: str) -> str:
+    """Относительный путь блоба внутри каталога загрузок."""
+    ext = MEDIA_EXTENSIONS.get(content_type)
+    name = f"{file_hash}.{ext}" if ext else file_hash
+    return f"{file_hash[:2]}/{file_hash[2:4]}/{name}"
+
+
+def blob_url(storage_key: str) -> str:
+    return MEDIA_URL_PREFIX + storage_key
+
+
+def hash_from_url(url: str | None) -> str | None:
+    """Извлекает хеш из пути блоба; для старых файлов с uuid-именами возвращает None."""
+    if not url:
+        return None
+    match = _BLOB_URL.search(url)
+    return match.group("hash") if match else None
+
+
+async def load_blob_metadata(db: AsyncSession, url: str | None) -> dict | None:
+    """Возвращает метаданные блоба по его URL или None для старых файлов."""
+    file_hash = hash_from_url(url)
+    if not file_hash:
+        return None
+    result = await db.execute(
+        text("SELECT file_metadata FROM media_blobs WHERE file_hash = :file_hash"),
+        {"file_hash": file_hash},
+    )
+    return result.scalar()
+
+
+async def store_blob(db: AsyncSession, upload_file: UploadFile, max_size: int = MAX_UPLOAD_SIZE) -> StoredBlob:
+    """
+    Сохраняет загруженный файл и добавляет ссылку на его содержимое.
+
+    Ссылка учитывается в транзакции db: при откате счетчик не меняется.
+    Если такое содержимое уже хранится, в хранилище ничего не пишется.
+
+    Исключения:
+        HTTPException: 400 при неподдерживаемом типе, 413 при превышении размера
+    """
+    temp_path = None
+    try:
+        if upload_file.content_type not in ALLOWED_MIME_TYPES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Неподдерживаемый тип файла",
+            )
+
+        temp_path, file_hash, size = await stream_upload_file(upload_file, max_size)
+
+        return await add_blob(db, temp_path, file_hash, size, upload_file.content_type)
+
+    finally:
+        if temp_path:
+            await asyncio.to_thread(temp_path.unlink, missing_ok=True)
+        await upload_file.close()
+
+
+async def add_blob(db: AsyncSession, temp_path: Path, file_hash: str, size: int, content_type: str) -> StoredBlob:
+    """
+    Добавляет ссылку на содержимое временного файла с уже посчитанным хешем.
+
+    Файл переносится в хранилище, только если такого содержимого еще нет
+    или на блоб не было ссылок: после сбоя сборки мусора объект мог быть
+    уже удален, поэтому он записывается заново, а варианты строятся снова.
+    Удалять временный файл должен вызывающий.
+    """
+    result = await db.execute(
+        text("""
+            INSERT INTO media_blobs (file_hash, storage_key, content_type, size, ref_count)
+            VALUES (:file_hash, :storage_key, :content_type, :size, 1)
+            ON CONFLICT (file_hash) DO UPDATE
+            SET ref_count = media_blobs.ref_count + 1,
+                file_metadata = CASE WHEN media_blobs.ref_count = 0 THEN NULL ELSE media_blobs.file_metadata END
+            RETURNING storage_key, content_type, (xmax = 0) AS created, ref_count = 1 AS needs_write
+        """),
+        {
+            "file_hash": file_hash,
+            "storage_key": blob_storage_key(file_hash, content_type),
+            "content_type": content_type,
+            "size": size,
+        },
+    )
+    blob = result.mappings().one()
+
+    # Новая или освобожденная строка — объекта в хранилище может не быть
+    if blob["needs_write"]:
+        await storage.put_file(blob["storage_key"], temp_path, blob["content_type"])
+
+    return StoredBlob(
+        file_hash=file_hash,
+        url=blob_url(blob["storage_key"]),
+        content_type=blob["content_type"],
+        size=size,
+        created=blob["created"],
+    )
+
+
+async def release_blobs(db: AsyncSession, *file_hashes: str | None) -> list[str]:
+    """
+    Снимает по одной ссылке с каждого хеша в транзакции db.
+
+    Возвращает:
+        list: Хеши, на которые не осталось ссылок; после фиксации
+            их нужно передать в collect_blobs
+    """
+    orphaned = []
+    for file_hash, count in Counter(h for h in file_hashes if h).items():
+        result = await db.execute(
+            text("""
+                UPDATE media_blobs
+                SET ref_count = GREATEST(ref_count - :count, 0)
+                WHERE file_hash = :file_hash
+                RETURNING ref_count
+            """),
+            {"file_hash": file_hash, "count": count},
+        )
+        if result.scalar() == 0:
+            orphaned.append(file_hash)
+    return orphaned
+
+
+async def discard_blob(blob: StoredBlob) -> None:
+    """
+    Удаляет объект блоба, ссылка на который не была зафиксирована.
+
+    Вызывается после отката транзакции, в которой был вызван store_blob.
+    Если строки блоба нет, она создается с нулевым счетчиком, и удаление
+    идет через collect_blobs: объект остается, если на то же содержимое
+    успела сослаться другая транзакция.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                text("""
+                    INSERT INTO media_blobs (file_hash, storage_key, content_type, size, ref_count)
+                    VALUES (:file_hash, :storage_key, :content_type, :size, 0)
+                    ON CONFLICT (file_hash) DO NOTHING
+                """),
+                {
+                    "file_hash": blob.file_hash,
+                    "storage_key": blob_storage_key(blob.file_hash, blob.content_type),
+                    "content_type": blob.content_type,
+                    "size": blob.size,
+                },
+            )
+            await db.commit()
+    except Exception as e:
+        print(f"Ошибка удаления медиафайлов: {e}")
+        return
+    await collect_blobs([blob.file_hash])
+
+
+async def collect_blobs(file_hashes: list[str]) -> None:
+    """
+    Удаляет строки блобов, на которые не осталось ссылок, и их файлы с вариантами.
+
+    Строки удаляются до файлов и остаются заблокированными, пока файлы
+    удаляются, поэтому одновременная загрузка того же содержимого ждет
+    фиксации и записывает объект заново.
+    """
+    if not file_hashes:
+        return
+
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                text("""
+                    SELECT file_hash
+                    FROM media_blobs
+                    WHERE file_hash = ANY(:file_hashes) AND ref_count = 0
+                    FOR UPDATE SKIP LOCKED
+                """),
+                {"file_hashes": file_hashes},
+            )
+            locked = result.scalars().all()
+            if not locked:
+                return
+
+            result = await db.execute(
+                text("""
+                    DELETE FROM media_blobs
+                    WHERE file_hash = ANY(:file_hashes) AND ref_count = 0
+                    RETURNING storage_key, file_metadata
+                """),
+                {"file_hashes": locked},
+            )
+            for blob in result.mappings().all():
+                variants = (blob["file_metadata"] or {}).get("variants", [])
+                for storage_key in [blob["storage_key"], *(v["url"].removeprefix(MEDIA_URL_PREFIX) for v in variants)]:
+                    await storage.delete(storage_key)
+            await db.commit()
+    except Exception as e:
+        # Строки с нулевым счетчиком остаются; add_blob перезапишет их объекты при повторной загрузке
+        print(f"Ошибка удаления медиафайлов: {e}")
@@ -1,13 +1,15 @@
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func, text
 from sqlalchemy import event, ForeignKeyConstraint, PrimaryKeyConstraint
-from sqlalchemy import Column, UUID, String, DateTime, Text, Date, Integer, ForeignKey, Table, CheckConstraint
-from sqlalchemy import Float, Index, Enum as SQLEnum
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Column, UUID, String, DateTime, Text, Date, Integer, BigInteger, ForeignKey, Table, CheckConstraint
+from sqlalchemy import Computed, Float, Index, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
 from sqlalchemy.orm import relationship
 import uuid
 from enum import Enum
 
+from app.search import build_search_vector, detect_language
+
 Base = declarative_base()
 
 # region Enums
@@ -73,6 +75,19 @@ subscriptions = Table(
     Index('idx_subscriptions_follower', "follower_id"),
     Index('idx_subscriptions_following', "following_id")
 )
+
+# Материализованная лента подписок: строка на каждую пару (подписчик, отчет)
+timelines = Table(
+    "timelines",
+    Base.metadata,
+    Column("follower_id", UUID(as_uuid=True), ForeignKey("users.user_id", ondelete='CASCADE'), nullable=False),
+    Column("report_id", Integer, ForeignKey("reports.id", ondelete='CASCADE'), nullable=False),
+    Column("author_id", UUID(as_uuid=True), ForeignKey("users.user_id", ondelete='CASCADE'), nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    PrimaryKeyConstraint('follower_id', 'report_id'),
+    Index('idx_timelines_feed', "follower_id", "created_at", "report_id"),
+    Index('idx_timelines_author', "follower_id", "author_id")
+)
 # endregion
 
 # region Основные модели
@@ -119,6 +134,10 @@ class Report(Base):
 
     text_content = Column(Text, nullable=False)
 
+    # Поиск: язык выбирается автором или определяется при записи
+    search_language = Column(String(32), nullable=False)
+    search_vector = Column(TSVECTOR)
+
     media_files = relationship('MediaFile', back_populates='report', cascade='all, delete-orphan')
     additional_files = relationship('AdditionalFile', back_populates='report', cascade='all, delete-orphan')
     collaborators = relationship('Collaborator', back_populates='report', cascade='all, delete-orphan')
@@ -127,9 +146,11 @@ class Report(Base):
 
     __table_args__ = (
         CheckConstraint('end_date >= start_date', name='check_dates'),
-        Index('ix_report_text_content', text("to_tsvector('english', text_content)"), postgresql_using='gin'),
+        Index('ix_report_search_vector', 'search_vector', postgresql_using='gin'),
         Index('idx_report_status', 'status'),
-        Index('idx_report_user', 'user_id')
+        Index('idx_report_user', 'user_id'),
+        Index('idx_report_feed', 'created_at', 'id', postgresql_where=text("status != 'PRIVATE'")),
+        Index('idx_report_user_feed', 'user_id', 'created_at', 'id')
     )
 
 class User(Base):
@@ -150,6 +171,13 @@ class User(Base):
     profile_visibility = Column(SQLEnum(ProfileVisibilityEnum, name='profile_visibility'), default=ProfileVisibilityEnum.PUBLIC)
     travel_stats = Column(JSONB, default=lambda: {"countries": [], "kilometers": 0})
     preferences = Column(JSONB, default=lambda: {"theme": "light", "notifications": True})
+    followers_count = Column(Integer, default=0, server_default='0', nullable=False)
+    # С какого момента отчеты автора не раскладываются по лентам, а читаются на лету
+    timeline_pull_since = Column(DateTime(timezone=True))
+    # Увеличивается при смене пароля и отзывает все выданные токены
+    token_version = Column(Integer, default=0, server_default='0', nullable=False)
+    # Время последнего изменения данных, зашитых в access-токен
+    claims_updated_at = Column(DateTime(timezone=True))
 
     # Связи
     authored_reports = relationship('Report', back_populates='author')
@@ -160,7 +188,8 @@ class User(Base):
     __table_args__ = (
         Index('ix_user_travel_stats', travel_stats, postgresql_using='gin'),
         Index('idx_user_email', 'email'),
-        Index('idx_user_username', 'username')
+        Index('idx_user_username', 'username'),
+        Index('idx_user_claims_updated_at', 'claims_updated_at')
     )
 # endregion
 
@@ -183,9 +212,66 @@ class MediaFile(Base):
     file_type = Column(SQLEnum(MediaFileTypeEnum, name='media_file_type'), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     file_metadata = Column(JSONB)
-    file_hash = Column(String(64))
+    file_hash = Column(String(64), index=True)
     report = relationship('Report', back_populates='media_files')
 
+class MediaBlob(Base):
+    """Содержимое файла, хранимое один раз по SHA-256 и разделяемое ссылками."""
+    __tablename__ = 'media_blobs'
+
+    file_hash = Column(String(64), primary_key=True)
+    storage_key = Column(Text, nullable=False)
+    content_type = Column(String(100), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, default=0, server_default='0', nullable=False)
+    # Размеры и производные варианты; заполняется фоновой обработкой
+    file_metadata = Column(JSONB)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class StagedUpload(Base):
+    """Файл, загруженный заранее и ожидающий привязки к отчету."""
+    __tablename__ = 'staged_uploads'
+
+    token = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    file_hash = Column(String(64), nullable=False)
+    url = Column(Text, nullable=False)
+    content_type = Column(String(100), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class TravelStatsDirty(Base):
+    """Пользователь, у которого удалялись точки карты; заполняется триггером базы."""
+    __tablename__ = 'travel_stats_dirty'
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+
+class FeedVersion(Base):
+    """Счетчик версии ленты отчетов, общий для всех воркеров; из него строятся ETag."""
+    __tablename__ = 'feed_versions'
+
+    feed = Column(String(100), primary_key=True)
+    version = Column(BigInteger, default=0, server_default='0', nullable=False)
+
+class ResumableUpload(Base):
+    """Незавершенная возобновляемая загрузка: части лежат в хранилище, смещение — здесь."""
+    __tablename__ = 'resumable_uploads'
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    report_id = Column(Integer, ForeignKey('reports.id', ondelete='CASCADE'), nullable=False)
+    content_type = Column(String(100), nullable=False)
+    filename = Column(String(255))
+    upload_length = Column(BigInteger, nullable=False)
+    upload_offset = Column(BigInteger, default=0, server_default='0', nullable=False)
+    # Ключи принятых частей в порядке смещений
+    chunk_keys = Column(ARRAY(Text), default=list, server_default='{}', nullable=False)
+    # Когда началась фоновая склейка после приема последней части
+    completion_started_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
 class AdditionalFile(Base):
     __tablename__ = 'additional_files'
 
@@ -221,16 +307,35 @@ class TravelMap(Base):
 
     id = Column(Integer, primary_key=True)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False, index=True)
+    # Отчет, из фотографий которого точка получена автоматически
+    report_id = Column(Integer, ForeignKey('reports.id', ondelete='CASCADE'), index=True)
     location = Column(Text, nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
-    visited_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Геохеш точки вычисляет база (функция geohash_encode из миграции)
+    geohash = Column(String(12, collation='C'), Computed('geohash_encode(latitude, longitude, 12)', persisted=True))
+    # ISO 3166-1 alpha-2; заполняется геокодером
+    country_code = Column(String(2))
+    visited_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     user = relationship('User', back_populates='travel_records')
 
     __table_args__ = (
         CheckConstraint('latitude >= -90 AND latitude <= 90', name='check_latitude'),
         CheckConstraint('longitude >= -180 AND longitude <= 180', name='check_longitude'),
-        Index('idx_coordinates', 'latitude', 'longitude')
+        Index('idx_coordinates', 'latitude', 'longitude'),
+        Index('idx_travel_map_user_geohash', 'user_id', 'geohash'),
+        # Поиск ближайших отчетов по всем пользователям
+        Index('idx_travel_map_report_geohash', 'geohash', postgresql_where=text('report_id IS NOT NULL')),
+        # Соседние по времени точки для инкрементального подсчета пути
+        Index('idx_travel_map_user_visited', 'user_id', 'visited_at', 'id'),
+        # Снимки одного отчета в пределах ~100 м дают одну точку
+        Index(
+            'uq_travel_map_report_point',
+            'user_id', 'report_id',
+            text('round(latitude::numeric, 3)'), text('round(longitude::numeric, 3)'),
+            unique=True,
+            postgresql_where=text('report_id IS NOT NULL'),
+        ),
     )
 # endregion
 
@@ -239,5 +344,14 @@ def update_duration(mapper, connection, target):
     if target.start_date and target.end_date:
         target.duration = (target.end_date - target.start_date).days
 
+def update_search_vector(mapper, connection, target):
+    if not target.search_language:
+        target.search_language = detect_language(target.title, target.description, target.text_content).value
+    target.search_vector = build_search_vector(
+        target.search_language, target.title, target.description, target.text_content
+    )
+
 event.listen(Report, 'before_insert', update_duration)
-event.listen(Report, 'before_update', update_duration)
\ No newline at end of file
+event.listen(Report, 'before_update', update_duration)
+event.listen(Report, 'before_insert', update_search_vector)
+event.listen(Report, 'before_update', update_search_vector)
\ No newline at end of file
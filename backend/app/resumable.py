@@ -0,0 +1,396 @@
+"""
+Возобновляемая загрузка больших видео- и аудиофайлов.
+
+Протокол повторяет основу tus 1.0: POST создает загрузку с объявленной
+длиной, PATCH дописывает часть начиная с Upload-Offset, HEAD возвращает
+принятое смещение, с которого клиент продолжает после обрыва связи.
+
+Каждая часть сразу пишется в хранилище отдельным объектом
+(resumable/<id>/<offset>-<nonce>), а состояние загрузки лежит в таблице
+resumable_uploads, поэтому следующую часть может принять любой воркер.
+Транзакция не держится открытой, пока принимаются байты: смещение
+продвигается условным UPDATE, и из двух PATCH с одним смещением
+засчитывается один, второй получает 409.
+
+После последней части загрузка помечается завершаемой, и клиент сразу
+получает ответ, а объекты в фоне склеиваются во временный файл с
+подсчетом SHA-256, содержимое становится блобом, и к отчету добавляется
+строка media_files. Повтор последнего PATCH, пока идет завершение,
+только возвращает смещение; завершение, прерванное остановкой воркера,
+подхватывается заново по истечении RESUMABLE_COMPLETION_TIMEOUT.
+"""
+
+import asyncio
+import hashlib
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator
+
+import anyio
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import invalidate_tags
+from app.database import AsyncSessionLocal
+from app.etag import FEED_PUBLIC, user_reports_feed
+from app.images import image_pipeline
+from app.media import add_blob
+from app.models import MediaFile, MediaFileTypeEnum, ResumableUpload
+from app.storage import RESUMABLE_KEY_PREFIX, storage
+from app.utils import UPLOAD_TMP_DIR
+
+TUS_VERSION = "1.0.0"
+MAX_RESUMABLE_SIZE = 2 * 1024 * 1024 * 1024
+# Срок продлевается с каждой принятой частью
+RESUMABLE_UPLOAD_TTL = timedelta(hours=24)
+# Через это время незавершенная склейка считается брошенной и запускается снова
+RESUMABLE_COMPLETION_TIMEOUT = timedelta(hours=1)
+
+RESUMABLE_MIME_TYPES = {
+    "video/mp4": MediaFileTypeEnum.VIDEO,
+    "video/quicktime": MediaFileTypeEnum.VIDEO,
+    "video/webm": MediaFileTypeEnum.VIDEO,
+    "audio/mpeg": MediaFileTypeEnum.AUDIO,
+    "audio/mp4": MediaFileTypeEnum.AUDIO,
+    "audio/ogg": MediaFileTypeEnum.AUDIO,
+    "audio/wav": MediaFileTypeEnum.AUDIO,
+}
+
+ERROR_RESUMABLE_NOT_FOUND = "Загрузка не найдена или срок ее хранения истек"
+ERROR_OFFSET_MISMATCH = "Смещение не совпадает с принятым размером загрузки"
+
+
+def chunk_storage_key(upload_id: uuid.UUID, offset: int) -> str:
+    # Случайный суффикс: параллельные PATCH с одним смещением не затирают друг друга
+    return f"{RESUMABLE_KEY_PREFIX}/{upload_id}/{offset:016d}-{uuid.uuid4().hex}"
+
+
+async def create_upload(
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        report_id: int,
+        upload_length: int,
+        content_type: str,
+        filename: str | None = None,
+) -> ResumableUpload:
+    """
+    Создает загрузку файла к отчету пользователя.
+
+    Исключения:
+        HTTPException: 400 при неподдерживаемом типе, 404 для чужого или
+            несуществующего отчета, 413 при превышении размера
+    """
+    if content_type not in RESUMABLE_MIME_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неподдерживаемый тип файла")
+    if upload_length <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректная длина загрузки")
+    if upload_length > MAX_RESUMABLE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Превышен максимальный размер файла",
+        )
+
+    result = await db.execute(
+        text("SELECT 1 FROM reports WHERE id = :report_id AND user_id = :user_id"),
+        {"report_id": report_id, "user_id": user_id},
+    )
+    if result.scalar() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Отчет не найден")
+
+    upload = ResumableUpload(
+        user_id=user_id,
+        report_id=report_id,
+        content_type=content_type,
+        filename=filename[:255] if filename else None,
+        upload_length=upload_length,
+        upload_offset=0,
+        chunk_keys=[],
+        expires_at=datetime.now(timezone.utc) + RESUMABLE_UPLOAD_TTL,
+    )
+    db.add(upload)
+    await db.commit()
+    return upload
+
+
+async def load_upload(db: AsyncSession, user_id: uuid.UUID, upload_id: uuid.UUID) -> dict:
+    """
+    Возвращает состояние загрузки пользователя.
+
+    Исключения:
+        HTTPException: 404, если загрузка чужая, завершена или истекла
+    """
+    result = await db.execute(
+        text("""
+            SELECT id, report_id, content_type, filename, upload_length, upload_offset, chunk_keys
+            FROM resumable_uploads
+            WHERE id = :upload_id AND user_id = :user_id AND expires_at > now()
+        """),
+        {"upload_id": upload_id, "user_id": user_id},
+    )
+    upload = result.mappings().first()
+    if not upload:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=ERROR_RESUMABLE_NOT_FOUND)
+    return dict(upload)
+
+
+async def append_chunk(
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        upload_id: uuid.UUID,
+        offset: int,
+        chunks: AsyncIterator[bytes],
+) -> int:
+    """
+    Принимает часть загрузки, начинающуюся с offset.
+
+    Часть записывается в хранилище целиком или не записывается вовсе:
+    при обрыве связи смещение не меняется и клиент повторяет часть.
+    После последней части загрузка завершается в фоне.
+
+    Возвращает:
+        int: Новое смещение загрузки
+
+    Исключения:
+        HTTPException: 404 для неизвестной загрузки, 409 при несовпадении
+            смещения, 413, если данные выходят за объявленную длину
+    """
+    upload = await load_upload(db, user_id, upload_id)
+    # Транзакция не должна оставаться открытой, пока клиент передает байты
+    await db.commit()
+
+    if offset != upload["upload_offset"]:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=ERROR_OFFSET_MISMATCH)
+
+    remaining = upload["upload_length"] - offset
+    received = 0
+
+    async def limited() -> AsyncIterator[bytes]:
+        nonlocal received
+        async for chunk in chunks:
+            received += len(chunk)
+            if received > remaining:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="Данные выходят за объявленную длину загрузки",
+                )
+            yield chunk
+
+    if remaining > 0:
+        storage_key = chunk_storage_key(upload_id, offset)
+        await storage.put_stream(storage_key, limited(), "application/octet-stream")
+        if received == 0:
+            await storage.delete(storage_key)
+            return offset
+
+        result = await db.execute(
+            text("""
+                UPDATE resumable_uploads
+                SET upload_offset = upload_offset + :received,
+                    chunk_keys = array_append(chunk_keys, :storage_key),
+                    expires_at = :expires_at
+                WHERE id = :upload_id AND upload_offset = :offset
+                RETURNING upload_offset
+            """),
+            {
+                "upload_id": upload_id,
+                "offset": offset,
+                "received": received,
+                "storage_key": storage_key,
+                "expires_at": datetime.now(timezone.utc) + RESUMABLE_UPLOAD_TTL,
+            },
+        )
+        new_offset = result.scalar()
+        if new_offset is None:
+            await db.commit()
+            # Ту же часть уже принял другой запрос
+            await storage.delete(storage_key)
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=ERROR_OFFSET_MISMATCH)
+    else:
+        # Повтор последнего PATCH: завершение уже идет или было прервано
+        new_offset = offset
+
+    claimed = new_offset == upload["upload_length"] and await _claim_completion(db, upload_id)
+    await db.commit()
+    if claimed:
+        upload_completer.schedule(upload_id)
+    return new_offset
+
+
+async def _claim_completion(db: AsyncSession, upload_id: uuid.UUID | None = None) -> list[uuid.UUID]:
+    """
+    Помечает полностью принятые загрузки завершаемыми, если их еще никто
+    не завершает или завершение брошено (по умолчанию — все такие загрузки).
+
+    Возвращает:
+        list: Загрузки, завершать которые должен вызывающий
+    """
+    upload_filter = "" if upload_id is None else "AND id = :upload_id"
+    result = await db.execute(
+        text(f"""
+            UPDATE resumable_uploads
+            SET completion_started_at = now(),
+                expires_at = :expires_at
+            WHERE upload_offset = upload_length
+              AND (completion_started_at IS NULL OR completion_started_at < now() - :completion_timeout)
+              {upload_filter}
+            RETURNING id
+        """),
+        {
+            "upload_id": upload_id,
+            "expires_at": datetime.now(timezone.utc) + RESUMABLE_UPLOAD_TTL,
+            "completion_timeout": RESUMABLE_COMPLETION_TIMEOUT,
+        },
+    )
+    return result.scalars().all()
+
+
+async def _assemble(chunk_keys: list[str]) -> tuple[Path, str, int]:
+    """Склеивает части во временный файл, считая SHA-256 и размер."""
+    temp = tempfile.NamedTemporaryFile(dir=UPLOAD_TMP_DIR, delete=False)
+    temp.close()
+    path = Path(temp.name)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with await anyio.open_file(path, "wb") as file:
+            for storage_key in chunk_keys:
+                async for chunk in storage.get_stream(storage_key):
+                    # hashlib отпускает GIL на больших блоках
+                    await asyncio.to_thread(digest.update, chunk)
+                    await file.write(chunk)
+                    size += len(chunk)
+    except BaseException:
+        await asyncio.to_thread(path.unlink, missing_ok=True)
+        raise
+    return path, digest.hexdigest(), size
+
+
+async def complete_upload(db: AsyncSession, upload_id: uuid.UUID) -> None:
+    """
+    Превращает принятые части в блоб и прикрепляет файл к отчету.
+
+    Строка загрузки удаляется в той же транзакции, что создает
+    media_files, поэтому повторное завершение ничего не дублирует.
+    После фиксации блоб ставится в обработку, а ленты автора сбрасываются.
+    """
+    result = await db.execute(
+        text("SELECT chunk_keys FROM resumable_uploads WHERE id = :upload_id"),
+        {"upload_id": upload_id},
+    )
+    chunk_keys = result.scalar()
+    await db.commit()
+    if chunk_keys is None:
+        return
+
+    temp_path, file_hash, size = await _assemble(chunk_keys)
+    try:
+        result = await db.execute(
+            text("""
+                DELETE FROM resumable_uploads
+                WHERE id = :upload_id AND upload_offset = upload_length
+                RETURNING user_id, report_id, content_type, filename
+            """),
+            {"upload_id": upload_id},
+        )
+        upload = result.mappings().first()
+        if not upload:
+            # Загрузку уже завершил другой воркер
+            await db.rollback()
+            return
+
+        blob = await add_blob(db, temp_path, file_hash, size, upload["content_type"])
+        db.add(MediaFile(
+            report_id=upload["report_id"],
+            file_path=blob.url,
+            file_type=RESUMABLE_MIME_TYPES[upload["content_type"]],
+            file_hash=blob.file_hash,
+            file_metadata={
+                "content_type": blob.content_type,
+                "size": blob.size,
+                "filename": upload["filename"],
+            },
+        ))
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+    finally:
+        await asyncio.to_thread(temp_path.unlink, missing_ok=True)
+
+    await _delete_chunks(chunk_keys)
+    image_pipeline.schedule(blob.file_hash)
+    await invalidate_tags(FEED_PUBLIC, user_reports_feed(upload["user_id"]))
+
+
+class UploadCompleter:
+    """Фоновое завершение загрузок: склейка не держит запрос клиента."""
+
+    def __init__(self):
+        self._tasks: dict[uuid.UUID, asyncio.Task] = {}
+
+    def schedule(self, *upload_ids: uuid.UUID) -> None:
+        """Запускает завершение загрузок, уже помеченных завершаемыми."""
+        for upload_id in set(upload_ids):
+            if upload_id in self._tasks:
+                continue
+            task = asyncio.create_task(self._complete(upload_id))
+            self._tasks[upload_id] = task
+            task.add_done_callback(lambda _, upload_id=upload_id: self._tasks.pop(upload_id, None))
+
+    async def resume(self) -> None:
+        """Подхватывает принятые загрузки, завершение которых не началось или брошено."""
+        async with AsyncSessionLocal() as db:
+            upload_ids = await _claim_completion(db)
+            await db.commit()
+        self.schedule(*upload_ids)
+
+    def shutdown(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+
+    async def _complete(self, upload_id: uuid.UUID) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await complete_upload(db, upload_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Ошибка завершения загрузки {upload_id}: {e}")
+
+
+upload_completer = UploadCompleter()
+
+
+async def cancel_upload(db: AsyncSession, user_id: uuid.UUID, upload_id: uuid.UUID) -> None:
+    """Прерывает загрузку и удаляет принятые части."""
+    result = await db.execute(
+        text("DELETE FROM resumable_uploads WHERE id = :upload_id AND user_id = :user_id RETURNING chunk_keys"),
+        {"upload_id": upload_id, "user_id": user_id},
+    )
+    chunk_keys = result.scalar()
+    if chunk_keys is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=ERROR_RESUMABLE_NOT_FOUND)
+    await db.commit()
+    await _delete_chunks(chunk_keys)
+
+
+async def expire_resumable_uploads() -> None:
+    """Удаляет брошенные загрузки вместе с их частями."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            text("DELETE FROM resumable_uploads WHERE expires_at <= now() RETURNING chunk_keys")
+        )
+        expired = result.scalars().all()
+        await db.commit()
+    await _delete_chunks([storage_key for chunk_keys in expired for storage_key in chunk_keys])
+
+
+async def _delete_chunks(chunk_keys: list[str]) -> None:
+    for storage_key in chunk_keys:
+        try:
+            await storage.delete(storage_key)
+        except Exception as e:
+            print(f"Ошибка удаления части загрузки {storage_key}: {e}")
@@ -0,0 +1,108 @@
+"""
+Фильтр отзыва для проверки access-токенов без обращения к базе.
+
+Access-токен несет роль, статус и версию токенов пользователя. Пока
+пользователь не попал в фильтр, этим утверждениям можно доверять.
+В фильтр попадают пользователи, у которых за время жизни access-токена
+менялись права, статус, видимость профиля или пароль; для них токен
+проверяется по актуальным данным. Фильтр периодически пересобирается из
+базы, а локальные изменения и сообщения шины добавляются сразу.
+"""
+
+import asyncio
+import hashlib
+import math
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.models import User
+
+REVOCATION_CAPACITY = 10_000
+REVOCATION_ERROR_RATE = 0.01
+REVOCATION_SYNC_INTERVAL = 30
+
+
+class BloomFilter:
+    """Битовый фильтр Блума с двойным хешированием."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def add(self, item: bytes) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: bytes) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def _positions(self, item: bytes):
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+
+class RevocationList:
+    """Множество пользователей, утверждениям в токенах которых нельзя доверять."""
+
+    def __init__(self, window: timedelta):
+        """
+        Параметры:
+            window: Сколько времени пользователь остается в фильтре после
+                изменения — не меньше времени жизни access-токена
+        """
+        self.window = window
+        self._filter = BloomFilter(REVOCATION_CAPACITY, REVOCATION_ERROR_RATE)
+        self._added_during_sync: set[uuid.UUID] | None = None
+        self._task: asyncio.Task | None = None
+
+    def add(self, user_id: uuid.UUID) -> None:
+        self._filter.add(user_id.bytes)
+        if self._added_during_sync is not None:
+            self._added_during_sync.add(user_id)
+
+    def might_be_revoked(self, user_id: uuid.UUID) -> bool:
+        return user_id.bytes in self._filter
+
+    async def start(self) -> None:
+        """Выполняет первую синхронизацию и запускает периодическую."""
+        await self.sync()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def sync(self) -> None:
+        """Пересобирает фильтр по пользователям, измененным в пределах окна."""
+        self._added_during_sync = set()
+        try:
+            since = datetime.now(timezone.utc) - self.window
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(User.user_id).where(User.claims_updated_at > since))
+                user_ids = result.scalars().all()
+
+            rebuilt = BloomFilter(max(REVOCATION_CAPACITY, len(user_ids) * 2), REVOCATION_ERROR_RATE)
+            for user_id in [*user_ids, *self._added_during_sync]:
+                rebuilt.add(user_id.bytes)
+            self._filter = rebuilt
+        finally:
+            self._added_during_sync = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(REVOCATION_SYNC_INTERVAL)
+            try:
+                await self.sync()
+            except Exception as e:
+                print(f"Ошибка синхронизации фильтра отзыва: {e}")
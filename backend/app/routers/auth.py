@@ -28,6 +28,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
+from app.cache import invalidate_tags
 from app.database import get_db
 from app.models import AccountStatusEnum, PasswordResetToken, RoleEnum, User
 from app.schemas import (
@@ -35,13 +36,14 @@ from app.schemas import (
     PasswordResetNewPassword,
     PasswordResetRequest,
     Token,
+    TokenRefresh,
     UserCreate,
     UserResponse,
 )
 from app.security import (
-    ACCESS_TOKEN_EXPIRE_DAYS,
-    REFRESH_TOKEN_EXPIRE_DAYS,
-    create_access_token,
+    Principal,
+    create_token_pair,
+    decode_refresh_token,
     get_admin_user,
     get_current_user,
     get_password_hash,
@@ -66,6 +68,7 @@ ERROR_MESSAGES = {
     "reset_limit": "Try again later",
     "invalid_code": "Invalid or expired code",
     "too_many_attempts": "Too many attempts",
+    "invalid_refresh": "Invalid refresh token",
 }
 
 
@@ -114,7 +117,7 @@ async def register(
 
     new_user = User(
         **user_data.model_dump(exclude={"password"}),
-        password_hash=get_password_hash(user_data.password),
+        password_hash=await get_password_hash(user_data.password),
         account_status=AccountStatusEnum.ACTIVE,
         role=RoleEnum.USER,
     )
@@ -139,7 +142,7 @@ async def login(
     user = await db.execute(select(User).where(User.username == form_data.username))
     user = user.scalars().first()
 
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user or not await verify_password(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=ERROR_MESSAGES["invalid_credentials"],
@@ -154,20 +157,43 @@ async def login(
     user.last_login = datetime.now(timezone.utc)
     await db.commit()
 
-    access_token = create_access_token(
-        data={"sub": str(user.user_id)},
-        expires_delta=timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS),
-    )
-    refresh_token = create_access_token(
-        data={"sub": str(user.user_id), "refresh": True},
-        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
-    )
+    return create_token_pair(user)
+
 
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "refresh_token": refresh_token,
-    }
+@router.post(
+    "/refresh",
+    response_model=Token,
+    summary="Обновление токенов",
+    description="Выдает новую пару токенов по refresh-токену",
+)
+async def refresh_tokens(
+        refresh_data: TokenRefresh,
+        db: AsyncSession = Depends(get_db),
+):
+    """
+    Обменивает refresh-токен на новую пару токенов.
+
+    Данные пользователя читаются из базы, поэтому новый access-токен
+    несет актуальные роль и статус. Токены, выданные до смены пароля,
+    отклоняются по версии.
+    """
+    user_id, token_version = decode_refresh_token(refresh_data.refresh_token)
+    user = await db.get(User, user_id)
+
+    if not user or user.token_version != token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=ERROR_MESSAGES["invalid_refresh"],
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    if user.account_status != AccountStatusEnum.ACTIVE:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=ERROR_MESSAGES["account_inactive"],
+        )
+
+    return create_token_pair(user)
 
 
 @router.get(
@@ -176,10 +202,11 @@ async def login(
     summary="Получить текущего пользователя",
 )
 async def get_current_user_endpoint(
-        current_user: User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
 ):
     """Возвращает информацию о текущем аутентифицированном пользователе."""
-    return current_user
+    return await db.get(User, current_user.user_id)
 
 
 @router.post(
@@ -197,7 +224,7 @@ async def create_admin(
 
     new_user = User(
         **user_data.model_dump(exclude={"password"}),
-        password_hash=get_password_hash(user_data.password),
+        password_hash=await get_password_hash(user_data.password),
         role=RoleEnum.ADMIN,
         account_status=AccountStatusEnum.ACTIVE,
     )
@@ -336,9 +363,13 @@ async def reset_password(
             detail="User not found",
         )
 
-    user.password_hash = get_password_hash(password_data.new_password)
+    user.password_hash = await get_password_hash(password_data.new_password)
+    # Смена пароля отзывает все ранее выданные токены
+    user.token_version += 1
+    user.claims_updated_at = datetime.now(timezone.utc)
     await db.delete(await db.get(PasswordResetToken, password_data.email))
     await db.commit()
+    await invalidate_tags(f"user:{user.user_id}")
 
     return {"message": "Password has been successfully updated"}
 
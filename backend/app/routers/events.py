@@ -0,0 +1,110 @@
+"""
+Модуль push-уведомлений.
+
+Отдает клиенту поток Server-Sent Events о новых отчетах и о новых
+подписчиках вместо периодического опроса лент.
+
+Токен передается один раз при открытии потока, поэтому поток
+закрывается, когда токен истекает, а при каждом heartbeat доступ
+проверяется заново (отзыв, смена пароля, блокировка). Клиент
+переподключается уже со свежим токеном.
+"""
+
+import asyncio
+import json
+import time
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.events import FOLLOW_EVENTS, NEW_FOLLOWER, REPORT_EVENTS, broker, is_visible
+from app.models import subscriptions
+from app.security import authenticate_token, token_expires_at
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+HEARTBEAT_INTERVAL = 15
+RECONNECT_DELAY_MS = 5000
+
+
+@router.get(
+    "/stream",
+    summary="Поток событий",
+    description="SSE-поток событий об отчетах и подписчиках с учетом прав доступа",
+)
+async def stream_events(
+        request: Request,
+        token: str = Query(..., description="Access-токен (EventSource не передает заголовки)"),
+):
+    """
+    Открывает SSE-поток для текущего пользователя.
+
+    Сессия БД нужна только на время проверки токена и загрузки подписок,
+    поэтому соединение с базой не удерживается на всё время потока.
+    """
+    async with AsyncSessionLocal() as db:
+        user = await authenticate_token(token, db)
+        result = await db.execute(
+            select(subscriptions.c.following_id).where(
+                subscriptions.c.follower_id == user.user_id
+            )
+        )
+        following = {str(following_id) for following_id in result.scalars()}
+
+    return StreamingResponse(
+        _event_stream(request, token, str(user.user_id), following),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _is_authorized(token: str) -> bool:
+    """Проверяет токен повторно; к базе обращается, только если пользователь мог быть отозван."""
+    async with AsyncSessionLocal() as db:
+        try:
+            await authenticate_token(token, db)
+        except HTTPException:
+            return False
+    return True
+
+
+async def _event_stream(request: Request, token: str, viewer_id: str, following: set[str]):
+    expires_at = token_expires_at(token)
+    checked_at = time.monotonic()
+    async with broker.subscribe() as queue:
+        yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+
+        while not await request.is_disconnected():
+            remaining = expires_at - time.time()
+            if remaining <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=min(HEARTBEAT_INTERVAL, remaining))
+            except asyncio.TimeoutError:
+                event = None
+
+            # При плотном потоке событий таймаут не наступает, поэтому проверка идет по времени
+            if time.monotonic() - checked_at >= HEARTBEAT_INTERVAL:
+                if time.time() >= expires_at or not await _is_authorized(token):
+                    return
+                checked_at = time.monotonic()
+            if event is None:
+                yield ": ping\n\n"
+                continue
+
+            # Подписки самого зрителя меняют видимость FRIENDS_ONLY отчетов
+            if event["type"] in FOLLOW_EVENTS and event["follower_id"] == viewer_id:
+                if event["type"] == NEW_FOLLOWER:
+                    following.add(event["following_id"])
+                else:
+                    following.discard(event["following_id"])
+
+            if not is_visible(event, viewer_id, following):
+                continue
+
+            data = dict(event)
+            if event["type"] in REPORT_EVENTS:
+                data["report"] = {**event["report"], "is_owner": event["author_id"] == viewer_id}
+            yield f"event: {event['type']}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
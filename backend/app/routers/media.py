@@ -0,0 +1,157 @@
+"""
+Модуль раздачи загруженных медиафайлов.
+
+Файлы с именами из хеша содержимого неизменяемы, поэтому отдаются с
+сильным ETag из хеша и Cache-Control: immutable. Поддерживаются
+условные запросы и одиночные диапазоны байтов (Range), нужные для
+перемотки видео и аудио. Если задан MEDIA_ACCEL_REDIRECT, приложение
+только проверяет запрос и выставляет заголовки, а сами байты отдает
+фронтовой прокси через X-Accel-Redirect. При удаленном хранилище
+клиент перенаправляется на адрес объекта в нем.
+"""
+
+import asyncio
+import mimetypes
+import os
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+
+from app.etag import is_not_modified
+from app.storage import MEDIA_URL_PREFIX, PRIVATE_KEY_PREFIXES, LocalStorage, file_chunks, storage
+
+router = APIRouter(prefix=MEDIA_URL_PREFIX.rstrip("/"), tags=["Media"])
+
+# Префикс internal-локации прокси, например /protected-media/
+MEDIA_ACCEL_REDIRECT = os.getenv("MEDIA_ACCEL_REDIRECT")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MUTABLE_CACHE_CONTROL = "public, max-age=3600"
+# Перенаправление живет меньше подписанной ссылки
+REDIRECT_CACHE_CONTROL = "private, max-age=600"
+
+ERROR_MEDIA_NOT_FOUND = "Файл не найден"
+
+# Оригиналы (<hash>.<ext>) и производные варианты (<hash>-<width>.webp)
+_CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}(-\d+)?$")
+
+
+def _resolve_media(root: Path, path: str) -> tuple[Path, os.stat_result] | None:
+    """Находит файл внутри корня хранилища; блокирующая операция."""
+    root = root.resolve()
+    target = (root / path).resolve()
+    if not target.is_relative_to(root) or target == root or target.relative_to(root).parts[0] in PRIVATE_KEY_PREFIXES:
+        return None
+    try:
+        stat = target.stat()
+    except OSError:
+        return None
+    if not target.is_file():
+        return None
+    return target, stat
+
+
+def _parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Разбирает заголовок Range с одним диапазоном.
+
+    Возвращает:
+        tuple | None: Первый и последний байт включительно или None, если
+            заголовок нужно проигнорировать и отдать файл целиком (в том
+            числе недопустимый диапазон вида bytes=5-3, RFC 9110)
+
+    Исключения:
+        HTTPException: 416, если диапазон не пересекается с файлом
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    first, _, last = header.removeprefix("bytes=").strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(0, size - int(last))
+            end = size - 1
+    except ValueError:
+        return None
+
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+@router.get(
+    "/{path:path}",
+    summary="Получение медиафайла",
+    description="Отдает загруженный файл с поддержкой ETag, Range и долгосрочного кэширования",
+)
+@router.head(
+    "/{path:path}",
+    summary="Заголовки медиафайла",
+    description="Отдает заголовки файла без тела: размер, ETag и поддержку Range",
+)
+async def get_media(path: str, request: Request):
+    if not isinstance(storage, LocalStorage):
+        parts = path.split("/")
+        if ".." in parts or parts[0] in PRIVATE_KEY_PREFIXES:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=ERROR_MEDIA_NOT_FOUND)
+        return RedirectResponse(
+            await storage.presign(path),
+            status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+            headers={"Cache-Control": REDIRECT_CACHE_CONTROL},
+        )
+
+    resolved = await asyncio.to_thread(_resolve_media, storage.root, path)
+    if not resolved:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=ERROR_MEDIA_NOT_FOUND)
+    target, stat = resolved
+
+    if _CONTENT_ADDRESSED.match(target.stem):
+        etag = f'"{target.stem}"'
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        # Старые файлы с uuid-именами
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        cache_control = MUTABLE_CACHE_CONTROL
+
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    media_type = mimetypes.guess_type(target.name)[0] or "application/octet-stream"
+
+    if is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if MEDIA_ACCEL_REDIRECT:
+        relative = target.relative_to(storage.root.resolve()).as_posix()
+        headers["X-Accel-Redirect"] = MEDIA_ACCEL_REDIRECT.rstrip("/") + "/" + quote(relative)
+        return Response(headers=headers, media_type=media_type)
+
+    # Диапазон учитывается, только если файл не изменился с момента первого ответа
+    if_range = request.headers.get("if-range")
+    byte_range = None if if_range and if_range != etag else _parse_range(request.headers.get("range"), stat.st_size)
+
+    if byte_range is None:
+        return FileResponse(target, media_type=media_type, headers=headers, stat_result=stat)
+
+    start, end = byte_range
+    length = end - start + 1
+    headers.update({
+        "Content-Range": f"bytes {start}-{end}/{stat.st_size}",
+        "Content-Length": str(length),
+    })
+    body = file_chunks(target, start, length) if request.method == "GET" else iter(())
+    return StreamingResponse(
+        body,
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers,
+    )
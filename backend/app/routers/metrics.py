@@ -0,0 +1,30 @@
+"""
+Модуль служебных метрик.
+
+Эндпоинты доступны только администраторам.
+"""
+
+from fastapi import APIRouter, Depends
+
+from app.cache import response_cache
+from app.security import get_admin_user, password_hasher
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"], dependencies=[Depends(get_admin_user)])
+
+
+@router.get(
+    "/cache",
+    summary="Статистика кэша ответов",
+    description="Возвращает размер кэша и счетчики попаданий, промахов и вытеснений",
+)
+async def get_cache_stats():
+    return response_cache.stats()
+
+
+@router.get(
+    "/hashing",
+    summary="Статистика хеширования паролей",
+    description="Возвращает загрузку пула bcrypt, число отказов и распределение задержек",
+)
+async def get_hashing_stats():
+    return password_hasher.stats()
@@ -5,8 +5,8 @@
 включая загрузку изображений и управление видимостью контента.
 """
 
-from datetime import date
-from pathlib import Path
+from datetime import date, datetime
+from uuid import UUID
 
 from fastapi import (
     APIRouter,
@@ -14,20 +14,58 @@ from fastapi import (
     File,
     Form,
     HTTPException,
+    Query,
+    Request,
+    Response,
     UploadFile,
     status,
 )
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache import invalidates, response_cache
 from app.database import get_db
-from app.models import Report, ReportStatusEnum, User, VisibilityOptionEnum
-from app.schemas import ReportResponse
-from app.security import get_current_user
-from app.utils import save_upload_file
+from app.etag import (
+    FEED_PUBLIC,
+    build_etag,
+    feed_versions,
+    is_not_modified,
+    not_modified_response,
+    set_cache_headers,
+)
+from app.events import REPORT_CREATED, broker, report_event
+from app.geo import geohash_ranges, radius_box
+from app.images import image_pipeline
+from app.media import hash_from_url, store_blob
+from app.models import MediaFile, MediaFileTypeEnum, Report, ReportStatusEnum, VisibilityOptionEnum
+from app.schemas import ReportResponse, StagedUploadResponse
+from app.search import SEARCH_QUERY, SearchLanguageEnum
+from app.security import Principal, get_current_user
+from app.timeline import fan_out_report, read_timeline
+from app.travel_stats import EARTH_RADIUS_KM
+from app.uploads import claim_uploads, stage_upload
+from app.utils import (
+    FEED_MAX_PAGE_SIZE,
+    FEED_PAGE_SIZE,
+    REPORT_CARD_COLUMNS,
+    decode_cursor,
+    encode_cursor,
+)
 
 router = APIRouter(prefix="/report", tags=["Report"])
-UPLOAD_DIR = Path(r"C:\Users\Иван\Desktop\MainApp\react-vite-project\public\uploads")
+
+SEARCH_RANK = "ts_rank_cd(r.search_vector, q.query)"
+SEARCH_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10"
+
+NEARBY_DEFAULT_LIMIT = 10
+NEARBY_MAX_LIMIT = 50
+NEARBY_INITIAL_RADIUS_KM = 1.0
+NEARBY_RADIUS_GROWTH = 4
+NEARBY_MAX_RADIUS_KM = 4096.0
+# ~100 м: запросы у одной достопримечательности попадают в одну запись кэша
+NEARBY_CACHE_PRECISION = 3
+NEARBY_CACHE_TTL = 300
+
 
 @router.post(
     "/",
@@ -36,6 +74,7 @@ UPLOAD_DIR = Path(r"C:\Users\Иван\Desktop\MainApp\react-vite-project\public\
     summary="Создание нового отчета",
     description="Создает новый отчет с возможностью загрузки изображений и настройками видимости",
 )
+@invalidates(FEED_PUBLIC, "reports:{current_user.user_id}")
 async def create_report(
         # Основные поля
         title: str = Form(..., description="Заголовок отчета"),
@@ -44,13 +83,19 @@ async def create_report(
         end_date: date = Form(..., description="Дата окончания периода отчета"),
         status: ReportStatusEnum = Form(..., description="Статус отчета"),
 
-        # Файлы
-        main_image: UploadFile = File(..., description="Главное изображение"),
-        side_image: UploadFile = File(..., description="Дополнительное изображение"),
+        # Файлы: токены предварительной загрузки или сами файлы
+        main_image_token: UUID | None = Form(None, description="Токен загрузки главного изображения"),
+        side_image_token: UUID | None = Form(None, description="Токен загрузки дополнительного изображения"),
+        main_image: UploadFile | None = File(None, description="Главное изображение"),
+        side_image: UploadFile | None = File(None, description="Дополнительное изображение"),
 
         # Технические поля
         html_path: str = Form(..., description="Путь к HTML-файлу"),
         text_content: str = Form(..., description="Текстовое содержимое"),
+        search_language: SearchLanguageEnum | None = Form(
+            None,
+            description="Язык текста для поиска (по умолчанию определяется автоматически)",
+        ),
 
         # Настройки видимости
         likes_status: VisibilityOptionEnum = Form(
@@ -68,20 +113,28 @@ async def create_report(
 
         # Зависимости
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_user),
+        current_user: Principal = Depends(get_current_user),
 ):
     """
     Создает новый отчет с прикрепленными файлами и настройками видимости.
 
+    Изображения передаются токенами из POST /report/uploads — тогда
+    запрос только записывает метаданные — либо файлами, как раньше.
+
     Возвращает:
         ReportResponse: Созданный отчет
     """
-    main_image_path = None
-    side_image_path = None
+    if (main_image_token is None) == (main_image is None) or (side_image_token is None) == (side_image is None):
+        raise HTTPException(
+            status_code=400,
+            detail="Каждое изображение передается либо токеном загрузки, либо файлом",
+        )
 
     try:
-        main_image_path = await save_upload_file(main_image)
-        side_image_path = await save_upload_file(side_image)
+        tokens = [token for token in (main_image_token, side_image_token) if token]
+        claimed = iter(await claim_uploads(db, current_user.user_id, *tokens))
+        main_blob = next(claimed) if main_image_token else await store_blob(db, main_image)
+        side_blob = next(claimed) if side_image_token else await store_blob(db, side_image)
 
         new_report = Report(
             user_id=current_user.user_id,
@@ -89,10 +142,11 @@ async def create_report(
             description=description,
             start_date=start_date,
             end_date=end_date,
-            main_image=main_image_path,
-            side_image=side_image_path,
+            main_image=main_blob.url,
+            side_image=side_blob.url,
             html_path=html_path,
             text_content=text_content,
+            search_language=search_language.value if search_language else None,
             status=status,
             likes_status=likes_status,
             comment_status=comment_status,
@@ -100,51 +154,395 @@ async def create_report(
         )
 
         db.add(new_report)
+        await db.flush()
+        db.add_all([
+            MediaFile(
+                report_id=new_report.id,
+                file_path=blob.url,
+                file_type=MediaFileTypeEnum.IMAGE,
+                file_hash=blob.file_hash,
+                file_metadata={"role": role, "content_type": blob.content_type, "size": blob.size},
+            )
+            for role, blob in (("main_image", main_blob), ("side_image", side_blob))
+        ])
+        await fan_out_report(db, new_report.id)
         await db.commit()
         await db.refresh(new_report)
+        image_pipeline.schedule(main_blob.file_hash, side_blob.file_hash)
 
+        await broker.publish(report_event(REPORT_CREATED, new_report, current_user.username))
         return new_report
 
+    except HTTPException:
+        raise
     except Exception as e:
-        for path in [main_image_path, side_image_path]:
-            if path and (UPLOAD_DIR / path.split("/")[-1]).exists():
-                (UPLOAD_DIR / path.split("/")[-1]).unlink()
+        # Ссылки на блобы откатываются вместе с транзакцией, файлы не удаляются:
+        # то же содержимое может использоваться другими отчетами
+        await db.rollback()
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            status_code=500,
             detail=f"Ошибка при создании отчета: {str(e)}",
         )
 
 
+@router.post(
+    "/uploads",
+    response_model=StagedUploadResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Предварительная загрузка изображения",
+    description="Сохраняет изображение и возвращает токен для создания отчета",
+)
+async def upload_report_image(
+        file: UploadFile = File(..., description="Изображение"),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+):
+    """
+    Загружает изображение отдельно от создания отчета.
+
+    Изображения можно загружать параллельно; токен действует час и
+    передается в POST /report/ вместо файла.
+    """
+    staged = await stage_upload(db, current_user.user_id, file)
+    image_pipeline.schedule(hash_from_url(staged["url"]))
+    return staged
+
+
 @router.get(
     "/reports_card",
     summary="Получение карточек отчетов",
-    description="Возвращает список публичных отчетов с информацией об авторах",
+    description="Возвращает страницу публичных отчетов с информацией об авторах",
 )
 async def get_all_reports(
+        request: Request,
+        response: Response,
+        cursor: str | None = Query(None, description="Курсор следующей страницы"),
+        limit: int = Query(FEED_PAGE_SIZE, ge=1, le=FEED_MAX_PAGE_SIZE, description="Размер страницы"),
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_user),
+        current_user: Principal = Depends(get_current_user),
 ):
     """
-    Получает список всех публичных отчетов с дополнительной информацией об авторе.
+    Получает страницу публичных отчетов с дополнительной информацией об авторе.
+
+    Пагинация по ключу (created_at, id): курсор следующей страницы
+    возвращается в поле next_cursor, для последней страницы он равен None.
+    Выбираются только поля карточки, без текста отчета.
+    Поддерживает условный запрос по If-None-Match.
 
     Возвращает:
-        dict: Словарь с ключом 'reports' и списком отчетов
+        dict: Словарь с ключами 'reports' и 'next_cursor'
+    """
+    etag = build_etag(await feed_versions.get(db, FEED_PUBLIC), current_user.user_id, cursor, limit)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    page = await _load_public_feed_page(db, cursor, limit)
+    reports = [
+        {**row, "is_owner": row["user_id"] == current_user.user_id}
+        for row in page["reports"]
+    ]
+
+    set_cache_headers(response, etag)
+    return {"reports": reports, "next_cursor": page["next_cursor"]}
+
+
+@response_cache.cached(FEED_PUBLIC, key_params=("cursor", "limit"))
+async def _load_public_feed_page(db: AsyncSession, cursor: str | None, limit: int) -> dict:
+    """Загружает страницу публичной ленты, общую для всех пользователей."""
+    params = {"limit": limit + 1}
+    query = f"""
+        SELECT
+            {REPORT_CARD_COLUMNS},
+            u.username as author_username
+        FROM reports r
+        JOIN users u ON r.user_id = u.user_id
+        WHERE r.status != 'PRIVATE'
     """
+
+    if cursor:
+        params.update(_parse_feed_cursor(cursor))
+        query += """
+            AND (r.created_at, r.id) < (:cursor_created_at, :cursor_id)
+        """
+
+    query += """
+        ORDER BY r.created_at DESC, r.id DESC
+        LIMIT :limit
+    """
+
     try:
-        query = text("""
-            SELECT 
-                r.*,
-                u.username as author_username,
-                r.user_id = :current_user_id as is_owner
-            FROM reports r
-            JOIN users u ON r.user_id = u.user_id
-            WHERE r.status != 'PRIVATE'
-            ORDER BY r.created_at DESC
-        """)
-        result = await db.execute(query, {"current_user_id": current_user.user_id})
-        return {"reports": result.mappings().all()}
+        result = await db.execute(text(query), params)
+        rows = [dict(row) for row in result.mappings()]
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при получении отчетов: {str(e)}",
-        )
\ No newline at end of file
+        )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(created_at=rows[-1]["created_at"], id=rows[-1]["id"])
+
+    return {"reports": rows, "next_cursor": next_cursor}
+
+
+@router.get(
+    "/following",
+    summary="Лента подписок",
+    description="Возвращает страницу отчетов пользователей, на которых подписан текущий пользователь",
+)
+async def get_following_reports(
+        cursor: str | None = Query(None, description="Курсор следующей страницы"),
+        limit: int = Query(FEED_PAGE_SIZE, ge=1, le=FEED_MAX_PAGE_SIZE, description="Размер страницы"),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+):
+    """
+    Получает страницу ленты подписок.
+
+    Возвращает:
+        dict: Словарь с ключами 'reports' и 'next_cursor'
+    """
+    cursor_params = _parse_feed_cursor(cursor) if cursor else None
+
+    try:
+        rows = await read_timeline(db, current_user.user_id, limit + 1, cursor_params)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при получении отчетов: {str(e)}",
+        )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(created_at=rows[-1]["created_at"], id=rows[-1]["id"])
+
+    return {"reports": rows, "next_cursor": next_cursor}
+
+
+@router.get(
+    "/search",
+    summary="Поиск отчетов",
+    description="Полнотекстовый поиск по тексту отчетов с ранжированием и выделением фрагментов",
+)
+async def search_reports(
+        q: str = Query(..., min_length=1, max_length=200, description="Поисковый запрос"),
+        cursor: str | None = Query(None, description="Курсор следующей страницы"),
+        limit: int = Query(FEED_PAGE_SIZE, ge=1, le=FEED_MAX_PAGE_SIZE, description="Размер страницы"),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+):
+    """
+    Ищет отчеты, доступные текущему пользователю.
+
+    Запрос строится для всех языковых конфигураций и сравнивается с
+    хранимым search_vector, поэтому совпадения выбираются по GIN-индексу
+    ix_report_search_vector. Результаты упорядочены
+    по ts_rank_cd, пагинация по ключу (rank, id). Фрагменты ts_headline
+    вычисляются только для строк возвращаемой страницы.
+
+    Возвращает:
+        dict: Словарь с ключами 'reports' и 'next_cursor'
+    """
+    params = {
+        "query": q,
+        "current_user_id": current_user.user_id,
+        "limit": limit + 1,
+        "headline_options": SEARCH_HEADLINE_OPTIONS,
+    }
+    cursor_filter = ""
+    if cursor:
+        params.update(_parse_search_cursor(cursor))
+        cursor_filter = f"AND ({SEARCH_RANK}, r.id) < (:cursor_rank, :cursor_id)"
+
+    query = f"""
+        WITH q AS (
+            SELECT {SEARCH_QUERY} AS query
+        ),
+        page AS (
+            SELECT r.id, {SEARCH_RANK} AS rank
+            FROM reports r, q
+            WHERE r.search_vector @@ q.query
+              AND (
+                  r.user_id = :current_user_id
+                  OR r.status = 'PUBLIC'
+                  OR (
+                      r.status = 'FRIENDS_ONLY'
+                      AND EXISTS (
+                          SELECT 1 FROM subscriptions
+                          WHERE follower_id = :current_user_id
+                          AND following_id = r.user_id
+                      )
+                  )
+              )
+              {cursor_filter}
+            ORDER BY rank DESC, r.id DESC
+            LIMIT :limit
+        )
+        SELECT
+            {REPORT_CARD_COLUMNS},
+            u.username as author_username,
+            r.user_id = :current_user_id as is_owner,
+            page.rank,
+            ts_headline(r.search_language::regconfig, r.text_content, q.query, :headline_options) as snippet
+        FROM page
+        JOIN reports r ON r.id = page.id
+        JOIN users u ON r.user_id = u.user_id
+        CROSS JOIN q
+        ORDER BY page.rank DESC, page.id DESC
+    """
+
+    try:
+        result = await db.execute(text(query), params)
+        rows = result.mappings().all()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при поиске отчетов: {str(e)}",
+        )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rank=rows[-1]["rank"], id=rows[-1]["id"])
+
+    return {"reports": rows, "next_cursor": next_cursor}
+
+
+def _parse_search_cursor(cursor: str) -> dict:
+    """Преобразует курсор поиска в параметры запроса."""
+    values = decode_cursor(cursor)
+    try:
+        return {"cursor_rank": float(values["rank"]), "cursor_id": int(values["id"])}
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации",
+        )
+
+
+def _parse_feed_cursor(cursor: str) -> dict:
+    """Преобразует курсор ленты в параметры запроса."""
+    values = decode_cursor(cursor)
+    try:
+        return {
+            "cursor_created_at": datetime.fromisoformat(values["created_at"]),
+            "cursor_id": int(values["id"]),
+        }
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации",
+        )
+
+
+@router.get(
+    "/nearby",
+    summary="Отчеты рядом с местом",
+    description="Возвращает ближайшие к точке публичные отчеты по местам съемки их фотографий",
+)
+async def get_nearby_reports(
+        latitude: float = Query(..., ge=-90, le=90, description="Широта"),
+        longitude: float = Query(..., ge=-180, le=180, description="Долгота"),
+        limit: int = Query(NEARBY_DEFAULT_LIMIT, ge=1, le=NEARBY_MAX_LIMIT, description="Число отчетов"),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+):
+    """
+    Находит limit публичных отчетов, ближайших к точке.
+
+    Расстояние до отчета — расстояние до ближайшей его точки на картах
+    путешествий. Координаты округляются до NEARBY_CACHE_PRECISION знаков,
+    поэтому популярные места отдаются из общего кэша.
+
+    Возвращает:
+        dict: Словарь с ключами 'reports' (с полями distance_km,
+            point_latitude, point_longitude и location) и 'radius_km'
+    """
+    page = await _load_nearby_reports(
+        db,
+        round(latitude, NEARBY_CACHE_PRECISION),
+        round(longitude, NEARBY_CACHE_PRECISION),
+        limit,
+    )
+    reports = [
+        {**row, "is_owner": row["user_id"] == current_user.user_id}
+        for row in page["reports"]
+    ]
+    return {"reports": reports, "radius_km": page["radius_km"]}
+
+
+@response_cache.cached(FEED_PUBLIC, key_params=("latitude", "longitude", "limit"), ttl=NEARBY_CACHE_TTL)
+async def _load_nearby_reports(db: AsyncSession, latitude: float, longitude: float, limit: int) -> dict:
+    """
+    Ищет ближайшие отчеты, расширяя радиус в NEARBY_RADIUS_GROWTH раз.
+
+    На каждом шаге круг покрывается диапазонами геохешей, и точки
+    отчетов читаются по индексу idx_travel_map_report_geohash только
+    внутри них. Если в круге нашлось limit отчетов, они и есть ближайшие:
+    остальные лежат дальше радиуса. В плотных местах хватает первого
+    шага, в пустых поиск доходит до NEARBY_MAX_RADIUS_KM.
+    """
+    radius_km = NEARBY_INITIAL_RADIUS_KM
+    while True:
+        ranges = geohash_ranges(*radius_box(latitude, longitude, radius_km))
+        try:
+            result = await db.execute(
+                text(f"""
+                    WITH nearest AS (
+                        SELECT DISTINCT ON (t.report_id)
+                            t.report_id, t.latitude, t.longitude, t.location, d.distance_km
+                        FROM unnest(CAST(:starts AS text[]), CAST(:ends AS text[])) AS c(start_hash, end_hash)
+                        CROSS JOIN LATERAL (
+                            SELECT report_id, latitude, longitude, location
+                            FROM travel_map
+                            WHERE report_id IS NOT NULL
+                              AND geohash >= c.start_hash COLLATE "C"
+                              AND geohash < c.end_hash COLLATE "C"
+                        ) t
+                        CROSS JOIN LATERAL (
+                            SELECT 2 * CAST(:earth_radius_km AS double precision) * asin(least(1, sqrt(
+                                sin(radians(t.latitude - :latitude) / 2) ^ 2
+                                + cos(radians(:latitude)) * cos(radians(t.latitude))
+                                * sin(radians(t.longitude - :longitude) / 2) ^ 2
+                            ))) AS distance_km
+                        ) d
+                        WHERE d.distance_km <= :radius_km
+                        ORDER BY t.report_id, d.distance_km
+                    )
+                    SELECT
+                        {REPORT_CARD_COLUMNS},
+                        u.username as author_username,
+                        n.latitude as point_latitude,
+                        n.longitude as point_longitude,
+                        n.location,
+                        n.distance_km
+                    FROM nearest n
+                    JOIN reports r ON r.id = n.report_id
+                    JOIN users u ON r.user_id = u.user_id
+                    WHERE r.status = 'PUBLIC'
+                    ORDER BY n.distance_km, r.id
+                    LIMIT :limit
+                """),
+                {
+                    "starts": [start for start, _ in ranges],
+                    "ends": [end for _, end in ranges],
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "radius_km": radius_km,
+                    "earth_radius_km": EARTH_RADIUS_KM,
+                    "limit": limit,
+                },
+            )
+            rows = [dict(row) for row in result.mappings()]
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Ошибка при получении отчетов: {str(e)}",
+            )
+
+        if len(rows) == limit or radius_km >= NEARBY_MAX_RADIUS_KM:
+            return {"reports": rows, "radius_km": radius_km}
+        radius_km = min(radius_km * NEARBY_RADIUS_GROWTH, NEARBY_MAX_RADIUS_KM)
@@ -0,0 +1,178 @@
+"""
+Модуль возобновляемой загрузки видео и аудио к отчетам.
+
+Эндпоинты совместимы с клиентами tus 1.0 (например, tus-js-client):
+создание загрузки, докачка частей и запрос принятого смещения.
+"""
+
+import base64
+import binascii
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.resumable import (
+    MAX_RESUMABLE_SIZE,
+    TUS_VERSION,
+    append_chunk,
+    cancel_upload,
+    create_upload,
+    load_upload,
+)
+from app.security import Principal, get_current_user
+
+router = APIRouter(prefix="/report", tags=["Resumable uploads"])
+
+TUS_HEADERS = {"Tus-Resumable": TUS_VERSION}
+PATCH_CONTENT_TYPE = "application/offset+octet-stream"
+
+
+def _check_version(tus_resumable: str | None) -> None:
+    if tus_resumable is not None and tus_resumable != TUS_VERSION:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Неподдерживаемая версия протокола загрузки",
+            headers={"Tus-Version": TUS_VERSION},
+        )
+
+
+def _parse_metadata(header: str | None) -> dict[str, str]:
+    """Разбирает Upload-Metadata: пары «ключ base64-значение» через запятую."""
+    metadata = {}
+    for pair in filter(None, (item.strip() for item in (header or "").split(","))):
+        key, _, value = pair.partition(" ")
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный Upload-Metadata")
+    return metadata
+
+
+@router.options(
+    "/{report_id}/media",
+    summary="Возможности сервера загрузки",
+    description="Сообщает версию протокола tus и максимальный размер файла",
+)
+async def resumable_options(report_id: int):
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers={
+            **TUS_HEADERS,
+            "Tus-Version": TUS_VERSION,
+            "Tus-Max-Size": str(MAX_RESUMABLE_SIZE),
+            "Tus-Extension": "creation,termination",
+        },
+    )
+
+
+@router.post(
+    "/{report_id}/media",
+    status_code=status.HTTP_201_CREATED,
+    summary="Создание возобновляемой загрузки",
+    description="Создает загрузку видео или аудио к отчету; адрес загрузки возвращается в Location",
+)
+async def create_resumable_upload(
+        report_id: int,
+        request: Request,
+        upload_length: int = Header(..., description="Полный размер файла в байтах"),
+        upload_metadata: str | None = Header(None, description="Метаданные tus: filename, filetype"),
+        tus_resumable: str | None = Header(None),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+):
+    """
+    Создает загрузку файла к отчету текущего пользователя.
+
+    Тип файла передается в метаданных filetype, имя — в filename.
+    """
+    _check_version(tus_resumable)
+    metadata = _parse_metadata(upload_metadata)
+    upload = await create_upload(
+        db,
+        current_user.user_id,
+        report_id,
+        upload_length,
+        metadata.get("filetype", ""),
+        metadata.get("filename"),
+    )
+    return Response(
+        status_code=status.HTTP_201_CREATED,
+        headers={
+            **TUS_HEADERS,
+            "Location": str(request.url_for("get_resumable_offset", upload_id=upload.id)),
+            "Upload-Offset": "0",
+        },
+    )
+
+
+@router.head(
+    "/media/uploads/{upload_id}",
+    summary="Состояние возобновляемой загрузки",
+    description="Возвращает принятое смещение, с которого нужно продолжить загрузку",
+)
+async def get_resumable_offset(
+        upload_id: UUID,
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+):
+    upload = await load_upload(db, current_user.user_id, upload_id)
+    return Response(
+        headers={
+            **TUS_HEADERS,
+            "Upload-Offset": str(upload["upload_offset"]),
+            "Upload-Length": str(upload["upload_length"]),
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+@router.patch(
+    "/media/uploads/{upload_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Загрузка части файла",
+    description="Дописывает часть файла начиная с Upload-Offset",
+)
+async def patch_resumable_upload(
+        upload_id: UUID,
+        request: Request,
+        upload_offset: int = Header(..., description="Смещение начала части"),
+        tus_resumable: str | None = Header(None),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+):
+    """
+    Принимает часть файла потоком, не буферизуя ее в памяти.
+
+    После последней части файл прикрепляется к отчету в фоне, не задерживая ответ.
+    """
+    _check_version(tus_resumable)
+    if request.headers.get("content-type") != PATCH_CONTENT_TYPE:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Ожидается Content-Type: {PATCH_CONTENT_TYPE}",
+        )
+
+    new_offset = await append_chunk(db, current_user.user_id, upload_id, upload_offset, request.stream())
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers={**TUS_HEADERS, "Upload-Offset": str(new_offset)},
+    )
+
+
+@router.delete(
+    "/media/uploads/{upload_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Отмена возобновляемой загрузки",
+    description="Прерывает загрузку и удаляет принятые части",
+)
+async def delete_resumable_upload(
+        upload_id: UUID,
+        tus_resumable: str | None = Header(None),
+        db: AsyncSession = Depends(get_db),
+        current_user: Principal = Depends(get_current_user),
+):
+    _check_version(tus_resumable)
+    await cancel_upload(db, current_user.user_id, upload_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=TUS_HEADERS)
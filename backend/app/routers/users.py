@@ -7,6 +7,7 @@
 - Управления видимостью профиля
 """
 
+import asyncio
 from uuid import UUID
 from fastapi import (
     APIRouter,
@@ -14,53 +15,76 @@ from fastapi import (
     File,
     Form,
     HTTPException,
+    Query,
+    Request,
+    Response,
     UploadFile,
     status,
 )
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text, func
-from pathlib import Path
+from sqlalchemy import select, text, func, update
 from datetime import datetime, timezone
 from typing import List
 
+from app.cache import invalidates, response_cache
+from app.clusters import CLUSTER_MAX_ZOOM, TILE_SIZE, ClusterIndex
 from app.database import get_db
-from app.models import User, ProfileVisibilityEnum, subscriptions
-from app.schemas import UserProfileResponse, UserFollowResponse, ChechSubscribersResponse
-from app.security import get_current_user
-from app.utils import save_upload_file
+from app.etag import (
+    build_etag,
+    feed_versions,
+    is_not_modified,
+    not_modified_response,
+    set_cache_headers,
+    user_reports_feed,
+)
+from app.events import FOLLOWER_REMOVED, NEW_FOLLOWER, broker, follow_event
+from app.geo import geohash_ranges
+from app.images import image_pipeline
+from app.media import collect_blobs, hash_from_url, load_blob_metadata, release_blobs, store_blob
+from app.models import User, ProfileVisibilityEnum, ReportStatusEnum, subscriptions
+from app.schemas import UserProfileResponse, UserFollowResponse, ChechSubscribersResponse, TravelMapResponse
+from app.security import Principal, get_current_user
+from app.timeline import backfill_timeline, remove_from_timeline, update_fanout_mode
+from app.utils import MAX_AVATAR_SIZE, REPORT_COLUMNS
 
 router = APIRouter(prefix="/users", tags=["Users"])
-UPLOAD_DIR = Path(r"C:\Users\Иван\Desktop\MainApp\react-vite-project\public\uploads")
 
 ERROR_USER_NOT_FOUND = "Пользователь не найден"
 ERROR_PRIVATE_PROFILE = "Профиль закрыт для просмотра"
 ERROR_FRIENDS_ONLY_PROFILE = "Профиль доступен только друзьям"
 
+MAP_MAX_ZOOM = 18
+MAP_MAX_POINTS = 5000
+# Кластеры сбрасываются явно при добавлении точек
+TRAVEL_MAP_CACHE_TTL = 3600
+
 
 @router.get("/{user_id}/profile", response_model=UserProfileResponse)
 async def get_user_profile(
         user_id: UUID,
         db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ):
-    user = await db.get(User, user_id)
+    user = await _load_profile(db, user_id)
     if not user:
         raise HTTPException(404, detail=ERROR_USER_NOT_FOUND)
 
     response_data = {
-        "user_id": user.user_id,
-        "username": user.username,
-        "avatar_url": user.avatar_url,
-        "bio": user.bio,
-        "profile_visibility": user.profile_visibility,
+        "user_id": user["user_id"],
+        "username": user["username"],
+        "avatar_url": user["avatar_url"],
+        "avatar_variants": user["avatar_variants"],
+        "avatar_placeholder": user["avatar_placeholder"],
+        "bio": user["bio"],
+        "profile_visibility": user["profile_visibility"],
     }
 
-    if user.profile_visibility == ProfileVisibilityEnum.PRIVATE:
+    if user["profile_visibility"] == ProfileVisibilityEnum.PRIVATE:
         if current_user.user_id != user_id:
             raise HTTPException(403, detail=ERROR_PRIVATE_PROFILE)
-        response_data["travel_stats"] = user.travel_stats
+        response_data["travel_stats"] = user["travel_stats"]
 
-    elif user.profile_visibility == ProfileVisibilityEnum.FRIENDS_ONLY:
+    elif user["profile_visibility"] == ProfileVisibilityEnum.FRIENDS_ONLY:
         is_following = await db.execute(
             select(subscriptions).where(
                 subscriptions.c.follower_id == current_user.user_id,
@@ -70,13 +94,32 @@ async def get_user_profile(
         if current_user.user_id != user_id and not is_following.scalar():
             return UserProfileResponse(**{**response_data, "travel_stats": {}})
 
-        response_data["travel_stats"] = user.travel_stats
+        response_data["travel_stats"] = user["travel_stats"]
 
     else:
-        response_data["travel_stats"] = user.travel_stats
+        response_data["travel_stats"] = user["travel_stats"]
 
     return UserProfileResponse(**response_data)
 
+
+@response_cache.cached("user:{user_id}", key_params=("user_id",))
+async def _load_profile(db: AsyncSession, user_id: UUID) -> dict | None:
+    """Загружает поля профиля без учета прав зрителя."""
+    user = await db.get(User, user_id)
+    if not user:
+        return None
+    avatar_metadata = await load_blob_metadata(db, user.avatar_url)
+    return {
+        "user_id": user.user_id,
+        "username": user.username,
+        "avatar_url": user.avatar_url,
+        "avatar_variants": (avatar_metadata or {}).get("variants"),
+        "avatar_placeholder": (avatar_metadata or {}).get("placeholder"),
+        "bio": user.bio,
+        "profile_visibility": user.profile_visibility,
+        "travel_stats": user.travel_stats,
+    }
+
 @router.get(
     "/me",
     response_model=UserProfileResponse,
@@ -84,10 +127,11 @@ async def get_user_profile(
     description="Возвращает полную информацию о текущем аутентифицированном пользователе",
 )
 async def get_current_user_profile(
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """Получение профиля текущего пользователя"""
-    return current_user
+    return await db.get(User, current_user.user_id)
 
 
 @router.get(
@@ -97,8 +141,10 @@ async def get_current_user_profile(
 )
 async def get_user_public_reports(
     user_id: UUID,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) :
     """
     Получение отчетов пользователя с учетом прав доступа.
@@ -108,47 +154,60 @@ async def get_user_public_reports(
       - PUBLIC отчеты
       - FRIENDS_ONLY если есть подписка
     """
-    user_exists = await db.execute(select(User).where(User.user_id == user_id))
-    if not user_exists.scalar():
+    etag = build_etag(await feed_versions.get(db, user_reports_feed(user_id)), current_user.user_id, user_id)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    reports = await _load_user_reports(db, user_id)
+    if reports is None:
         raise HTTPException(
             status_code=404,
             detail=ERROR_USER_NOT_FOUND
         )
 
-    base_query = """
-        SELECT 
-            r.*,
-            u.username as author_username,
-            (r.user_id = :current_user_id) as is_owner
-        FROM reports r
-        JOIN users u ON r.user_id = u.user_id
-        WHERE r.user_id = :user_id
-    """
-
-    if current_user.user_id != user_id:
-        base_query += """
-            AND (
-                r.status = 'PUBLIC' 
-                OR (
-                    r.status = 'FRIENDS_ONLY' 
-                    AND EXISTS (
-                        SELECT 1 FROM subscriptions 
-                        WHERE follower_id = :current_user_id 
-                        AND following_id = :user_id
-                    )
+    is_owner = current_user.user_id == user_id
+    if not is_owner:
+        visible_statuses = {ReportStatusEnum.PUBLIC.name}
+        has_friends_only = any(r["status"] == ReportStatusEnum.FRIENDS_ONLY.name for r in reports)
+        if has_friends_only:
+            is_following = await db.execute(
+                select(subscriptions).where(
+                    subscriptions.c.follower_id == current_user.user_id,
+                    subscriptions.c.following_id == user_id
                 )
             )
-        """
+            if is_following.scalar():
+                visible_statuses.add(ReportStatusEnum.FRIENDS_ONLY.name)
+        reports = [r for r in reports if r["status"] in visible_statuses]
+
+    set_cache_headers(response, etag)
+    return {"reports": [{**r, "is_owner": is_owner} for r in reports]}
+
+
+@response_cache.cached("reports:{user_id}", key_params=("user_id",))
+async def _load_user_reports(db: AsyncSession, user_id: UUID) -> list[dict] | None:
+    """
+    Загружает все отчеты пользователя без учета прав зрителя.
+
+    Возвращает None, если пользователь не существует.
+    """
+    user_exists = await db.execute(select(User.user_id).where(User.user_id == user_id))
+    if not user_exists.scalar():
+        return None
 
     try:
         result = await db.execute(
-            text(base_query),
-            {
-                "user_id": user_id,
-                "current_user_id": current_user.user_id
-            }
+            text(f"""
+                SELECT
+                    {REPORT_COLUMNS},
+                    u.username as author_username
+                FROM reports r
+                JOIN users u ON r.user_id = u.user_id
+                WHERE r.user_id = :user_id
+            """),
+            {"user_id": user_id}
         )
-        return {"reports": result.mappings().all()}
+        return [dict(row) for row in result.mappings()]
 
     except Exception as e:
         raise HTTPException(
@@ -157,35 +216,25 @@ async def get_user_public_reports(
         )
 
 
-
 @router.get(
     "/reports",
     summary="Получить собственные отчеты",
     description="Возвращает все отчеты текущего пользователя",
 )
 async def get_user_reports(
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Получение всех отчетов текущего пользователя"""
-    try:
-        query = text("""
-            SELECT 
-                r.*,
-                u.username as author_username,
-                true as is_owner
-            FROM reports r
-            JOIN users u ON r.user_id = u.user_id
-            WHERE r.user_id = :user_id
-        """)
-        result = await db.execute(query, {"user_id": current_user.user_id})
-        return {"reports": result.mappings().all()}
+    etag = build_etag(await feed_versions.get(db, user_reports_feed(current_user.user_id)), current_user.user_id)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Ошибка при получении отчетов: {str(e)}"
-        )
+    reports = await _load_user_reports(db, current_user.user_id) or []
+    set_cache_headers(response, etag)
+    return {"reports": [{**r, "is_owner": True} for r in reports]}
 
 @router.post(
     "/changeprof",
@@ -193,6 +242,7 @@ async def get_user_reports(
     summary="Обновление данных пользователя",
     description="Обновляет данные полей имени, фамилии, описания, статус профиля и аватарку",
 )
+@invalidates("user:{current_user.user_id}")
 async def change_profile(
     first_name: str = Form(..., description="Имя"),
     last_name: str = Form(..., description="Фамилия"),
@@ -200,37 +250,39 @@ async def change_profile(
     profile_visibility: ProfileVisibilityEnum = Form(..., description="Приватность профиля"),
     avatar_url: UploadFile | None = File(None, description="Аватар профиля"),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    avatar_filename = current_user.avatar_url.split("/")[-1] if current_user.avatar_url else None
-    new_avatar_path = None
-
     try:
-        if avatar_url:
-            new_avatar_path = await save_upload_file(avatar_url)
-            avatar_filename = new_avatar_path.split("/")[-1]
-
         user = await db.get(User, current_user.user_id)
         if not user:
             raise HTTPException(status_code=404, detail=ERROR_USER_NOT_FOUND)
 
+        avatar_blob = None
+        orphaned_blobs = []
+        if avatar_url:
+            avatar_blob = await store_blob(db, avatar_url, MAX_AVATAR_SIZE)
+            orphaned_blobs = await release_blobs(db, hash_from_url(user.avatar_url))
+            user.avatar_url = avatar_blob.url
+
         user.first_name = first_name
         user.last_name = last_name
         user.bio = bio
+        if user.profile_visibility != profile_visibility:
+            # Видимость профиля зашита в access-токены
+            user.claims_updated_at = datetime.now(timezone.utc)
         user.profile_visibility = profile_visibility
-        if new_avatar_path:
-            user.avatar_url = new_avatar_path
 
         await db.commit()
         await db.refresh(user)
+        await collect_blobs(orphaned_blobs)
+        if avatar_blob:
+            image_pipeline.schedule(avatar_blob.file_hash)
         return user
 
     except HTTPException:
         raise
     except Exception as e:
         await db.rollback()
-        if new_avatar_path and (UPLOAD_DIR / avatar_filename).exists():
-            (UPLOAD_DIR / avatar_filename).unlink()
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при обновлении профиля: {str(e)}"
@@ -242,26 +294,9 @@ async def change_profile(
 )
 async def get_follow_user(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    try:
-        query = text("""
-            SELECT 
-                s.*,
-                u.username,
-                u.avatar_url
-            FROM subscriptions s
-            JOIN users u ON s.follower_id = u.user_id
-            WHERE following_id = :following_id
-            ORDER BY s.created_at DESC
-        """)
-        result = await db.execute(query, {"following_id": current_user.user_id})
-        return {"subscribers": result.mappings().all()}
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Ошибка при получении отчетов: {str(e)}",
-        )
+    return {"subscribers": await _load_subscribers(db, current_user.user_id)}
 
 @router.get(
     "/{user_id}/subscribers",
@@ -271,6 +306,17 @@ async def get_follow_others_user(
     user_id = UUID,
     db: AsyncSession = Depends(get_db)
 ):
+    return {"subscribers": await _load_subscribers(db, user_id)}
+
+
+def _subscriber_tags(subscribers: list[dict]) -> list[str]:
+    # Список показывает имена и аватары подписчиков
+    return [f"user:{row['follower_id']}" for row in subscribers]
+
+
+@response_cache.cached("followers:{user_id}", _subscriber_tags, key_params=("user_id",))
+async def _load_subscribers(db: AsyncSession, user_id) -> list[dict]:
+    """Загружает подписчиков пользователя, начиная с новых."""
     try:
         query = text("""
             SELECT 
@@ -283,7 +329,7 @@ async def get_follow_others_user(
             ORDER BY s.created_at DESC
         """)
         result = await db.execute(query, {"following_id": user_id})
-        return {"subscribers": result.mappings().all()}
+        return [dict(row) for row in result.mappings()]
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -295,10 +341,11 @@ async def get_follow_others_user(
     response_model=UserFollowResponse,
     summary="Подписаться на пользователя"
 )
+@invalidates("followers:{following_id}", "reports:{following_id}")
 async def follow_user(
     following_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     try:
         if current_user.user_id == following_id:
@@ -323,7 +370,17 @@ async def follow_user(
             created_at=func.now()
         )
         await db.execute(query)
+        await db.execute(
+            update(User)
+            .where(User.user_id == following_id)
+            .values(followers_count=User.followers_count + 1)
+        )
+        await update_fanout_mode(db, following_id)
+        await backfill_timeline(db, current_user.user_id, following_id)
         await db.commit()
+        await broker.publish(
+            follow_event(NEW_FOLLOWER, current_user.user_id, following_id, current_user.username)
+        )
 
         return {
             "follower_id": current_user.user_id,
@@ -341,10 +398,11 @@ async def follow_user(
     "/follow/{following_id}",
     summary="Отписаться от пользователя"
 )
+@invalidates("followers:{following_id}", "reports:{following_id}")
 async def unfollow_user(
     following_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     result = await db.execute(
         subscriptions.delete().where(
@@ -354,14 +412,22 @@ async def unfollow_user(
     )
     if result.rowcount == 0:
         raise HTTPException(404, "Подписка не найдена")
+    await db.execute(
+        update(User)
+        .where(User.user_id == following_id)
+        .values(followers_count=User.followers_count - 1)
+    )
+    await update_fanout_mode(db, following_id)
+    await remove_from_timeline(db, current_user.user_id, following_id)
     await db.commit()
+    await broker.publish(follow_event(FOLLOWER_REMOVED, current_user.user_id, following_id))
     return {"message": "Подписка удалена"}
 
 @router.get("/{following_id}/is-following", summary="Проверить подписку", response_model=bool)
 async def check_subscription(
     following_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     print(f"Checking subscription: {current_user.user_id} -> {following_id}")
     try:
@@ -378,3 +444,154 @@ async def check_subscription(
         print(f"Subscription check error: {str(e)}")
         raise HTTPException(500, f"Ошибка: {str(e)}")
 
+
+async def _map_report_statuses(db: AsyncSession, user_id: UUID, current_user: Principal) -> list[str] | None:
+    """
+    Статусы отчетов, точки которых видны зрителю; None — видны все.
+
+    Исключения:
+        HTTPException: 404 для несуществующего пользователя, 403 для
+            закрытого профиля
+    """
+    user = await _load_profile(db, user_id)
+    if not user:
+        raise HTTPException(404, detail=ERROR_USER_NOT_FOUND)
+    if current_user.user_id == user_id:
+        return None
+    if user["profile_visibility"] == ProfileVisibilityEnum.PRIVATE:
+        raise HTTPException(403, detail=ERROR_PRIVATE_PROFILE)
+
+    result = await db.execute(
+        select(subscriptions).where(
+            subscriptions.c.follower_id == current_user.user_id,
+            subscriptions.c.following_id == user_id
+        )
+    )
+    is_following = result.scalar() is not None
+    if user["profile_visibility"] == ProfileVisibilityEnum.FRIENDS_ONLY and not is_following:
+        raise HTTPException(403, detail=ERROR_FRIENDS_ONLY_PROFILE)
+
+    statuses = [ReportStatusEnum.PUBLIC.name]
+    if is_following:
+        statuses.append(ReportStatusEnum.FRIENDS_ONLY.name)
+    return statuses
+
+
+@router.get(
+    "/{user_id}/map",
+    response_model=TravelMapResponse,
+    summary="Точки карты путешествий",
+    description="Возвращает точки пользователя в области просмотра карты",
+)
+async def get_user_map(
+    user_id: UUID,
+    south: float = Query(-90, ge=-90, le=90, description="Южная граница области"),
+    west: float = Query(-180, ge=-180, le=180, description="Западная граница области"),
+    north: float = Query(90, ge=-90, le=90, description="Северная граница области"),
+    east: float = Query(180, ge=-180, le=180, description="Восточная граница области"),
+    zoom: int = Query(2, ge=0, le=MAP_MAX_ZOOM, description="Масштаб карты"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """
+    Получение точек карты в прямоугольнике просмотра.
+
+    До масштаба CLUSTER_MAX_ZOOM возвращаются центроиды кластеров с
+    числом точек из кэшированного индекса пользователя, поэтому ответ
+    ограничен несколькими сотнями объектов. На более крупных масштабах
+    область мала и отдаются сами точки: она покрывается несколькими
+    диапазонами геохешей, каждый из которых читается одним проходом по
+    индексу (user_id, geohash). Точки, совпадающие с точностью до пикселя
+    тайла, отдаются одной с их числом. Точки из отчетов, скрытых от
+    зрителя, не учитываются.
+    """
+    if south > north:
+        raise HTTPException(400, "Южная граница области должна быть не больше северной")
+
+    statuses = await _map_report_statuses(db, user_id, current_user)
+
+    if zoom <= CLUSTER_MAX_ZOOM:
+        index = await _load_cluster_index(db, user_id, statuses and tuple(statuses))
+        latitudes, longitudes, counts, truncated = index.query(south, west, north, east, zoom)
+        return TravelMapResponse(
+            zoom=zoom,
+            latitudes=latitudes,
+            longitudes=longitudes,
+            counts=counts,
+            truncated=truncated,
+        )
+
+    ranges = geohash_ranges(south, west, north, east)
+    longitude_filter = (
+        "t.longitude BETWEEN :west AND :east" if west <= east
+        else "(t.longitude >= :west OR t.longitude <= :east)"
+    )
+    status_filter = "" if statuses is None else "AND (t.report_id IS NULL OR r.status::text = ANY(:statuses))"
+    # Около одного пикселя тайла на данном масштабе
+    step = 360 / (TILE_SIZE * 2 ** zoom)
+
+    result = await db.execute(
+        text(f"""
+            SELECT
+                round(t.latitude / :step) * :step AS latitude,
+                round(t.longitude / :step) * :step AS longitude,
+                count(*) AS count
+            FROM unnest(CAST(:starts AS text[]), CAST(:ends AS text[])) AS c(start_hash, end_hash)
+            CROSS JOIN LATERAL (
+                SELECT latitude, longitude, report_id
+                FROM travel_map
+                WHERE user_id = :user_id
+                  AND geohash >= c.start_hash COLLATE "C"
+                  AND geohash < c.end_hash COLLATE "C"
+            ) t
+            LEFT JOIN reports r ON r.id = t.report_id
+            WHERE t.latitude BETWEEN :south AND :north
+              AND {longitude_filter}
+              {status_filter}
+            GROUP BY 1, 2
+            LIMIT :limit
+        """),
+        {
+            "user_id": user_id,
+            "starts": [start for start, _ in ranges],
+            "ends": [end for _, end in ranges],
+            "south": south,
+            "north": north,
+            "west": west,
+            "east": east,
+            "statuses": statuses,
+            "step": step,
+            "limit": MAP_MAX_POINTS + 1,
+        },
+    )
+    points = result.all()
+
+    return TravelMapResponse(
+        zoom=zoom,
+        latitudes=[round(latitude, 6) for latitude, _, _ in points[:MAP_MAX_POINTS]],
+        longitudes=[round(longitude, 6) for _, longitude, _ in points[:MAP_MAX_POINTS]],
+        counts=[count for _, _, count in points[:MAP_MAX_POINTS]],
+        truncated=len(points) > MAP_MAX_POINTS,
+    )
+
+
+@response_cache.cached("travel_map:{user_id}", key_params=("user_id", "statuses"), ttl=TRAVEL_MAP_CACHE_TTL)
+async def _load_cluster_index(db: AsyncSession, user_id: UUID, statuses: tuple[str, ...] | None) -> ClusterIndex:
+    """Строит индекс кластеров по точкам пользователя из отчетов с данными статусами."""
+    status_filter = "" if statuses is None else "AND (t.report_id IS NULL OR r.status::text = ANY(:statuses))"
+    result = await db.execute(
+        text(f"""
+            SELECT t.latitude, t.longitude
+            FROM travel_map t
+            LEFT JOIN reports r ON r.id = t.report_id
+            WHERE t.user_id = :user_id
+              {status_filter}
+        """),
+        {"user_id": user_id, "statuses": list(statuses or ())},
+    )
+    points = result.all()
+    return await asyncio.to_thread(
+        ClusterIndex,
+        [latitude for latitude, _ in points],
+        [longitude for _, longitude in points],
+    )
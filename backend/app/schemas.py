@@ -61,6 +61,8 @@ class UserProfileResponse(BaseModel):
     user_id: UUID
     username: str
     avatar_url: str | None
+    avatar_variants: list[dict] | None = None
+    avatar_placeholder: str | None = None
     bio: str | None
     registration_date: datetime | None = None
     travel_stats: dict | None = None
@@ -88,6 +90,22 @@ class Token(BaseModel):
     token_type: str
     refresh_token: str
 
+class StagedUploadResponse(BaseModel):
+    token: UUID
+    url: str
+    expires_at: datetime
+
+class TravelMapResponse(BaseModel):
+    """Кластеры карты в области просмотра: центроиды и число точек параллельными массивами."""
+    zoom: int
+    latitudes: list[float]
+    longitudes: list[float]
+    counts: list[int]
+    truncated: bool = False
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
 class PasswordResetRequest(BaseModel):
     email: EmailStr
     first_name: str
@@ -0,0 +1,51 @@
+"""
+Полнотекстовый поиск по отчетам.
+
+Каждый отчет хранит столбец search_vector, собранный из заголовка (вес A),
+описания (вес B) и текста (вес C) с конфигурацией языка отчета.
+Поисковый запрос строится сразу для всех поддерживаемых конфигураций и
+объединяется через ||, поэтому остается константой и использует GIN-индекс.
+"""
+
+import re
+from enum import Enum
+
+from sqlalchemy import cast, func, literal
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+
+class SearchLanguageEnum(str, Enum):
+    RUSSIAN = 'russian'
+    ENGLISH = 'english'
+    SIMPLE = 'simple'
+
+
+# Конфигурация russian стеммит кириллицу русским стеммером, а латиницу — английским,
+# поэтому подходит и для смешанных текстов
+_CYRILLIC = re.compile(r"[А-Яа-яЁё]")
+_LATIN = re.compile(r"[A-Za-z]")
+
+SEARCH_QUERY = " || ".join(
+    f"websearch_to_tsquery('{language.value}', :query)" for language in SearchLanguageEnum
+)
+
+
+def detect_language(*texts: str | None) -> SearchLanguageEnum:
+    """Определяет конфигурацию поиска по алфавиту текста."""
+    content = " ".join(text for text in texts if text)
+    if _CYRILLIC.search(content):
+        return SearchLanguageEnum.RUSSIAN
+    if _LATIN.search(content):
+        return SearchLanguageEnum.ENGLISH
+    return SearchLanguageEnum.SIMPLE
+
+
+def build_search_vector(language: str, title: str | None, description: str | None, text_content: str | None):
+    """SQL-выражение взвешенного tsvector для вставки в столбец search_vector."""
+    config = cast(literal(language), REGCONFIG)
+    parts = [
+        func.setweight(func.to_tsvector(config, title or ""), "A"),
+        func.setweight(func.to_tsvector(config, description or ""), "B"),
+        func.setweight(func.to_tsvector(config, text_content or ""), "C"),
+    ]
+    return parts[0].op("||")(parts[1]).op("||")(parts[2])
@@ -1,30 +1,132 @@
 from fastapi import status
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
 from typing import Optional
+import asyncio
 import os
+import time
 import uuid
 
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.cache import MISSING, TTLCache, on_invalidate, on_reset
 from app.database import get_db
-from app.models import User, AccountStatusEnum, RoleEnum
+from app.models import User, AccountStatusEnum, ProfileVisibilityEnum, RoleEnum
+from app.revocation import RevocationList
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_DAYS = 7
+ACCESS_TOKEN_EXPIRE_MINUTES = 15
 REFRESH_TOKEN_EXPIRE_DAYS = 365
 
+ACCESS_TOKEN_TYPE = "access"
+REFRESH_TOKEN_TYPE = "refresh"
+
+PRINCIPAL_CACHE_SIZE = 50_000
+PRINCIPAL_CACHE_TTL = 300
+PRINCIPAL_NEGATIVE_TTL = 30
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# bcrypt отпускает GIL, поэтому хватает пула потоков
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", os.cpu_count() or 2))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", HASH_POOL_SIZE * 8))
+HASH_LATENCY_BUCKETS_MS = (50, 100, 200, 400, 800, 1600)
+
+
+class PasswordHasher:
+    """
+    Выполняет bcrypt в отдельном пуле потоков, не блокируя цикл событий.
+
+    Число ожидающих и выполняющихся операций ограничено: при переполнении
+    запрос сразу получает 503 вместо того, чтобы копиться в очереди.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._workers = workers
+        self._max_pending = max_pending
+        self._pending = 0
+        self._rejected = 0
+        self._latency = {
+            operation: {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(HASH_LATENCY_BUCKETS_MS) + 1)}
+            for operation in ("hash", "verify")
+        }
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", pwd_context.verify, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self._workers,
+            "max_pending": self._max_pending,
+            "pending": self._pending,
+            "rejected": self._rejected,
+            "buckets_ms": list(HASH_LATENCY_BUCKETS_MS),
+            "latency": self._latency,
+        }
+
+    async def _run(self, operation: str, func, *args):
+        if self._pending >= self._max_pending:
+            self._rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Service is busy, try again later",
+                headers={"Retry-After": "1"},
+            )
+
+        self._pending += 1
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(func, *args)
+
+        def finished(_) -> None:
+            # Поток продолжает работу и после отмены ожидающего запроса,
+            # поэтому операция считается завершенной только по future пула
+            try:
+                loop.call_soon_threadsafe(self._finish, operation, started)
+            except RuntimeError:
+                # Цикл событий уже закрыт при остановке
+                pass
+
+        future.add_done_callback(finished)
+        return await asyncio.wrap_future(future)
+
+    def _finish(self, operation: str, started: float) -> None:
+        self._pending -= 1
+        self._record(operation, (time.perf_counter() - started) * 1000)
+
+    def _record(self, operation: str, elapsed_ms: float) -> None:
+        latency = self._latency[operation]
+        latency["count"] += 1
+        latency["total_ms"] += elapsed_ms
+        latency["max_ms"] = max(latency["max_ms"], elapsed_ms)
+        bucket = next(
+            (i for i, bound in enumerate(HASH_LATENCY_BUCKETS_MS) if elapsed_ms <= bound),
+            len(HASH_LATENCY_BUCKETS_MS),
+        )
+        latency["buckets"][bucket] += 1
+
+
+password_hasher = PasswordHasher(HASH_POOL_SIZE, HASH_MAX_PENDING)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
+
+async def get_password_hash(password: str) -> str:
+    return await password_hasher.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -32,10 +134,135 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
-):
+def create_token_pair(user: User) -> dict:
+    """
+    Выдает короткоживущий access-токен с утверждениями о пользователе
+    и долгоживущий refresh-токен.
+    """
+    subject = str(user.user_id)
+    access_token = create_access_token(
+        data={
+            "sub": subject,
+            "type": ACCESS_TOKEN_TYPE,
+            "name": user.username,
+            "role": user.role.value,
+            "status": user.account_status.value,
+            "vis": user.profile_visibility.value,
+            "ver": user.token_version,
+        },
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+    refresh_token = create_access_token(
+        data={"sub": subject, "type": REFRESH_TOKEN_TYPE, "ver": user.token_version},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+    }
+
+def decode_refresh_token(token: str) -> tuple[uuid.UUID, int]:
+    """
+    Проверяет refresh-токен и возвращает идентификатор пользователя и версию токенов.
+
+    Исключения:
+        HTTPException: 401 при невалидном токене
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Старые refresh-токены помечены флагом refresh вместо типа
+        if payload.get("type") != REFRESH_TOKEN_TYPE and not payload.get("refresh"):
+            raise ValueError("not a refresh token")
+        return uuid.UUID(payload["sub"]), payload.get("ver", 0)
+    except (JWTError, KeyError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+@dataclass(frozen=True)
+class Principal:
+    """Облегченное представление аутентифицированного пользователя."""
+
+    user_id: uuid.UUID
+    username: str
+    role: RoleEnum
+    account_status: AccountStatusEnum
+    profile_visibility: ProfileVisibilityEnum
+    token_version: int = 0
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            user_id=user.user_id,
+            username=user.username,
+            role=user.role,
+            account_status=user.account_status,
+            profile_visibility=user.profile_visibility,
+            token_version=user.token_version,
+        )
+
+    @classmethod
+    def from_claims(cls, user_id: uuid.UUID, payload: dict) -> Optional["Principal"]:
+        """Собирает Principal из утверждений access-токена, если они есть."""
+        if "role" not in payload:
+            return None
+        return cls(
+            user_id=user_id,
+            username=payload["name"],
+            role=RoleEnum(payload["role"]),
+            account_status=AccountStatusEnum(payload["status"]),
+            profile_visibility=ProfileVisibilityEnum(payload["vis"]),
+            token_version=payload["ver"],
+        )
+
+
+# Отсутствующие пользователи кэшируются как None на короткое время
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+# Окно берется с запасом на расхождение часов между воркерами
+revocation_list = RevocationList(timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES + 1))
+
+
+@on_invalidate
+def _evict_principals(tags: tuple[str, ...]) -> None:
+    for tag in tags:
+        if tag.startswith("user:"):
+            try:
+                user_id = uuid.UUID(tag.removeprefix("user:"))
+            except ValueError:
+                continue
+            principal_cache.pop(user_id)
+            # Утверждения в уже выданных токенах могли устареть
+            revocation_list.add(user_id)
+
+
+on_reset(principal_cache.clear)
+
+
+async def load_principal(user_id: uuid.UUID, db: AsyncSession) -> Optional[Principal]:
+    """Возвращает Principal из кэша или загружает его из базы."""
+    principal = principal_cache.get(user_id)
+    if principal is MISSING:
+        user = await db.get(User, user_id)
+        principal = Principal.from_user(user) if user else None
+        principal_cache.set(user_id, principal, None if principal else PRINCIPAL_NEGATIVE_TTL)
+    return principal
+
+
+async def authenticate_token(token: str, db: AsyncSession) -> Principal:
+    """
+    Проверяет JWT и возвращает активного пользователя.
+
+    Утверждения access-токена принимаются без обращения к базе, если
+    пользователь не попал в фильтр отзыва. Иначе, как и для старых токенов
+    без утверждений, Principal берется из кэша или базы и сверяется версия токенов.
+
+    Исключения:
+        HTTPException: 401 при невалидном токене или неактивном аккаунте
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -43,21 +270,39 @@ async def get_current_user(
     )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if payload.get("type", ACCESS_TOKEN_TYPE) != ACCESS_TOKEN_TYPE or payload.get("refresh"):
+            raise credentials_exception
         user_id = payload.get("sub")
         if not user_id:
             raise credentials_exception
-        user = await db.get(User, uuid.UUID(user_id))
-        if not user or user.account_status != AccountStatusEnum.ACTIVE:
+        user_id = uuid.UUID(user_id)
+
+        user = Principal.from_claims(user_id, payload)
+        if user is None or revocation_list.might_be_revoked(user_id):
+            user = await load_principal(user_id, db)
+            if not user or user.token_version != payload.get("ver", 0):
+                raise credentials_exception
+        if user.account_status != AccountStatusEnum.ACTIVE:
             raise credentials_exception
         return user
-    except (JWTError, ValueError) as e:
+    except (JWTError, KeyError, ValueError) as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token format"
         )
 
+def token_expires_at(token: str) -> float:
+    """Время истечения уже проверенного токена в секундах Unix."""
+    return float(jwt.get_unverified_claims(token)["exp"])
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    return await authenticate_token(token, db)
+
 async def get_admin_user(
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     if current_user.role != RoleEnum.ADMIN:
         raise HTTPException(
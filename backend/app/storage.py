@@ -0,0 +1,281 @@
+"""
+Хранилище файлов с подключаемыми драйверами.
+
+Код приложения работает с ключами (ab/cd/<hash>.jpg), а не с путями:
+драйвер решает, где лежат байты. Локальный драйвер пишет в MEDIA_ROOT,
+S3-совместимый — в бакет (AWS S3, MinIO) через aiobotocore с
+переиспользуемым пулом соединений и multipart-загрузкой. Драйвер
+выбирается переменной STORAGE_BACKEND (local или s3).
+
+Приемка файлов всегда идет через локальный временный каталог: ключ
+вычисляется из хеша, который известен только после чтения всего файла.
+"""
+
+import asyncio
+import contextlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import AsyncExitStack
+from pathlib import Path
+from typing import AsyncIterator
+
+import anyio
+
+from app.utils import UPLOAD_CHUNK_SIZE, UPLOAD_DIR, UPLOAD_TMP_DIR
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+MEDIA_URL_PREFIX = "/uploads/"
+# Служебные ключи: временные файлы и части незавершенных загрузок не раздаются
+RESUMABLE_KEY_PREFIX = "resumable"
+PRIVATE_KEY_PREFIXES = (UPLOAD_TMP_DIR.name, RESUMABLE_KEY_PREFIX)
+
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+# Публичный адрес бакета или CDN; без него отдаются подписанные ссылки
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL")
+S3_MAX_CONNECTIONS = int(os.getenv("S3_MAX_CONNECTIONS", 32))
+# S3 требует части multipart-загрузки не меньше 5 МБ, кроме последней
+S3_PART_SIZE = 8 * 1024 * 1024
+S3_UPLOAD_CONCURRENCY = 4
+PRESIGN_EXPIRES = 3600
+
+
+async def file_chunks(path: Path, start: int = 0, length: int | None = None) -> AsyncIterator[bytes]:
+    """Читает файл по частям вне цикла событий."""
+    async with await anyio.open_file(path, "rb") as file:
+        await file.seek(start)
+        while length is None or length > 0:
+            size = UPLOAD_CHUNK_SIZE if length is None else min(UPLOAD_CHUNK_SIZE, length)
+            chunk = await file.read(size)
+            if not chunk:
+                break
+            if length is not None:
+                length -= len(chunk)
+            yield chunk
+
+
+class Storage(ABC):
+    """Интерфейс хранилища файлов по ключам."""
+
+    async def start(self) -> None:
+        UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes], content_type: str) -> None:
+        """Записывает поток байтов под ключом, заменяя существующий объект."""
+
+    @abstractmethod
+    def get_stream(self, key: str, start: int = 0, end: int | None = None) -> AsyncIterator[bytes]:
+        """Читает объект или диапазон байтов [start, end] включительно."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Удаляет объект; отсутствие объекта ошибкой не считается."""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def presign(self, key: str, expires: int = PRESIGN_EXPIRES) -> str:
+        """Возвращает URL, по которому клиент может скачать объект."""
+
+    async def put_file(self, key: str, path: Path, content_type: str) -> None:
+        """Сохраняет локальный временный файл под ключом. Файл может быть перемещен."""
+        await self.put_stream(key, file_chunks(path), content_type)
+
+    @contextlib.asynccontextmanager
+    async def local_copy(self, key: str):
+        """Дает путь к локальной копии объекта на время блока."""
+        temp = tempfile.NamedTemporaryFile(dir=UPLOAD_TMP_DIR, suffix=Path(key).suffix, delete=False)
+        temp.close()
+        path = Path(temp.name)
+        try:
+            async with await anyio.open_file(path, "wb") as file:
+                async for chunk in self.get_stream(key):
+                    await file.write(chunk)
+            yield path
+        finally:
+            await asyncio.to_thread(path.unlink, missing_ok=True)
+
+
+class LocalStorage(Storage):
+    """Файлы в каталоге на диске; их отдает роутер media."""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes], content_type: str) -> None:
+        temp = tempfile.NamedTemporaryFile(dir=UPLOAD_TMP_DIR, delete=False)
+        temp.close()
+        path = Path(temp.name)
+        try:
+            async with await anyio.open_file(path, "wb") as file:
+                async for chunk in chunks:
+                    await file.write(chunk)
+            await self.put_file(key, path, content_type)
+        finally:
+            await asyncio.to_thread(path.unlink, missing_ok=True)
+
+    async def put_file(self, key: str, path: Path, content_type: str) -> None:
+        # Временный каталог на том же разделе: переименование атомарно и без копирования
+        await asyncio.to_thread(self._move, path, self.path(key))
+
+    def get_stream(self, key: str, start: int = 0, end: int | None = None) -> AsyncIterator[bytes]:
+        return file_chunks(self.path(key), start, None if end is None else end - start + 1)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self.path(key).unlink, missing_ok=True)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self.path(key).is_file)
+
+    async def presign(self, key: str, expires: int = PRESIGN_EXPIRES) -> str:
+        return MEDIA_URL_PREFIX + key
+
+    @contextlib.asynccontextmanager
+    async def local_copy(self, key: str):
+        yield self.path(key)
+
+    @staticmethod
+    def _move(source: Path, target: Path) -> None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, target)
+
+
+class S3Storage(Storage):
+    """S3-совместимый бакет; клиент и пул соединений живут все время работы воркера."""
+
+    def __init__(self, bucket: str, endpoint_url: str | None, region: str, public_url: str | None):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self._stack = AsyncExitStack()
+        self._client = None
+
+    async def start(self) -> None:
+        await super().start()
+        from aiobotocore.config import AioConfig
+        from aiobotocore.session import get_session
+
+        config = AioConfig(
+            max_pool_connections=S3_MAX_CONNECTIONS,
+            # MinIO и большинство S3-совместимых серверов требуют path-style адреса
+            s3={"addressing_style": "path"} if self.endpoint_url else None,
+        )
+        self._client = await self._stack.enter_async_context(
+            get_session().create_client(
+                "s3",
+                endpoint_url=self.endpoint_url,
+                region_name=self.region,
+                config=config,
+            )
+        )
+
+    async def stop(self) -> None:
+        await self._stack.aclose()
+        self._client = None
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes], content_type: str) -> None:
+        buffer = bytearray()
+        upload_id = None
+        part_number = 0
+        parts = []
+        pending: set[asyncio.Task] = set()
+
+        async def upload_part(number: int, body: bytes) -> None:
+            response = await self._client.upload_part(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body
+            )
+            parts.append({"PartNumber": number, "ETag": response["ETag"]})
+
+        try:
+            async for chunk in chunks:
+                buffer.extend(chunk)
+                while len(buffer) >= S3_PART_SIZE:
+                    if upload_id is None:
+                        response = await self._client.create_multipart_upload(
+                            Bucket=self.bucket, Key=key, ContentType=content_type
+                        )
+                        upload_id = response["UploadId"]
+                    if len(pending) >= S3_UPLOAD_CONCURRENCY:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            task.result()
+                    body = bytes(buffer[:S3_PART_SIZE])
+                    del buffer[:S3_PART_SIZE]
+                    part_number += 1
+                    pending.add(asyncio.create_task(upload_part(part_number, body)))
+
+            # Небольшие файлы загружаются одним запросом
+            if upload_id is None:
+                await self._client.put_object(
+                    Bucket=self.bucket, Key=key, Body=bytes(buffer), ContentType=content_type
+                )
+                return
+
+            if buffer:
+                part_number += 1
+                pending.add(asyncio.create_task(upload_part(part_number, bytes(buffer))))
+            if pending:
+                await asyncio.gather(*pending)
+            await self._client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": sorted(parts, key=lambda part: part["PartNumber"])},
+            )
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            if upload_id is not None:
+                await self._client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+    async def get_stream(self, key: str, start: int = 0, end: int | None = None) -> AsyncIterator[bytes]:
+        params = {"Bucket": self.bucket, "Key": key}
+        if start or end is not None:
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+        response = await self._client.get_object(**params)
+        async with response["Body"] as body:
+            while chunk := await body.read(UPLOAD_CHUNK_SIZE):
+                yield chunk
+
+    async def delete(self, key: str) -> None:
+        await self._client.delete_object(Bucket=self.bucket, Key=key)
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await self._client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except self._client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def presign(self, key: str, expires: int = PRESIGN_EXPIRES) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{key}"
+        return await self._client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=expires
+        )
+
+
+def create_storage() -> Storage:
+    if STORAGE_BACKEND == "s3":
+        if not S3_BUCKET:
+            raise RuntimeError("Для STORAGE_BACKEND=s3 требуется S3_BUCKET")
+        return S3Storage(S3_BUCKET, S3_ENDPOINT_URL, S3_REGION, S3_PUBLIC_URL)
+    return LocalStorage(UPLOAD_DIR)
+
+
+storage = create_storage()
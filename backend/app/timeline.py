@@ -0,0 +1,229 @@
+"""
+Лента отчетов от пользователей, на которых подписан читатель.
+
+Для обычных авторов лента строится при записи: create_report раскладывает
+новый отчет в таблицу timelines всем подписчикам, и чтение сводится к
+одному диапазонному сканированию индекса idx_timelines_feed. Отчеты
+авторов с большим числом подписчиков не раскладываются, а подтягиваются
+при чтении из их собственных отчетов и сливаются с материализованной частью.
+
+Режим хранится у автора (users.timeline_pull_since) и переключается с
+гистерезисом: в режим чтения на лету при FANOUT_FOLLOWER_LIMIT подписчиков,
+обратно — только ниже FANOUT_PUSH_LIMIT, и тогда отчеты, не разложенные
+за время чтения на лету, раскладываются всем подписчикам.
+"""
+
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.utils import REPORT_CARD_COLUMNS
+
+# Начиная с этого числа подписчиков отчеты автора читаются на лету
+FANOUT_FOLLOWER_LIMIT = 5000
+# Ниже этого числа раскладка при записи возобновляется
+FANOUT_PUSH_LIMIT = 4000
+# Сколько последних отчетов автора добавляется в ленту при подписке
+TIMELINE_BACKFILL_SIZE = 50
+
+
+async def fan_out_report(db: AsyncSession, report_id: int) -> None:
+    """
+    Раскладывает отчет в ленты подписчиков автора.
+
+    Выполняется в транзакции создания отчета, после flush. Строка автора
+    блокируется на чтение, чтобы переключение режима не разошлось с
+    раскладкой: отчет либо раскладывается здесь, либо попадает в дозапись
+    при возврате к раскладке.
+    """
+    result = await db.execute(
+        text("""
+            SELECT a.timeline_pull_since
+            FROM users a
+            JOIN reports r ON r.user_id = a.user_id
+            WHERE r.id = :report_id
+            FOR SHARE OF a
+        """),
+        {"report_id": report_id},
+    )
+    if result.scalar() is not None:
+        return
+
+    await db.execute(
+        text("""
+            INSERT INTO timelines (follower_id, report_id, author_id, created_at)
+            SELECT s.follower_id, r.id, r.user_id, r.created_at
+            FROM reports r
+            JOIN subscriptions s ON s.following_id = r.user_id
+            WHERE r.id = :report_id
+              AND r.status != 'PRIVATE'
+            ON CONFLICT DO NOTHING
+        """),
+        {"report_id": report_id},
+    )
+
+
+async def update_fanout_mode(db: AsyncSession, author_id: UUID) -> None:
+    """
+    Переключает режим раскладки автора после изменения числа подписчиков.
+
+    Вызывается в транзакции подписки или отписки, когда строка автора уже
+    заблокирована обновлением followers_count.
+    """
+    result = await db.execute(
+        text("SELECT followers_count, timeline_pull_since FROM users WHERE user_id = :author_id"),
+        {"author_id": author_id},
+    )
+    author = result.mappings().first()
+    if author is None:
+        return
+
+    if author["timeline_pull_since"] is None and author["followers_count"] >= FANOUT_FOLLOWER_LIMIT:
+        await db.execute(
+            text("UPDATE users SET timeline_pull_since = now() WHERE user_id = :author_id"),
+            {"author_id": author_id},
+        )
+    elif author["timeline_pull_since"] is not None and author["followers_count"] < FANOUT_PUSH_LIMIT:
+        # Отчеты периода чтения на лету и последние отчеты для подписчиков,
+        # пришедших в этот период без дозаписи
+        await db.execute(
+            text("""
+                WITH missing AS (
+                    SELECT id, user_id, created_at
+                    FROM reports
+                    WHERE user_id = :author_id
+                      AND status != 'PRIVATE'
+                      AND created_at >= :pull_since
+                    UNION
+                    (
+                        SELECT id, user_id, created_at
+                        FROM reports
+                        WHERE user_id = :author_id
+                          AND status != 'PRIVATE'
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT :backfill_size
+                    )
+                )
+                INSERT INTO timelines (follower_id, report_id, author_id, created_at)
+                SELECT s.follower_id, m.id, m.user_id, m.created_at
+                FROM subscriptions s
+                CROSS JOIN missing m
+                WHERE s.following_id = :author_id
+                ON CONFLICT DO NOTHING
+            """),
+            {
+                "author_id": author_id,
+                "pull_since": author["timeline_pull_since"],
+                "backfill_size": TIMELINE_BACKFILL_SIZE,
+            },
+        )
+        await db.execute(
+            text("UPDATE users SET timeline_pull_since = NULL WHERE user_id = :author_id"),
+            {"author_id": author_id},
+        )
+
+
+async def backfill_timeline(db: AsyncSession, follower_id: UUID, author_id: UUID) -> None:
+    """Добавляет последние отчеты автора в ленту нового подписчика."""
+    await db.execute(
+        text("""
+            INSERT INTO timelines (follower_id, report_id, author_id, created_at)
+            SELECT :follower_id, r.id, r.user_id, r.created_at
+            FROM reports r
+            JOIN users a ON a.user_id = r.user_id
+            WHERE r.user_id = :author_id
+              AND r.status != 'PRIVATE'
+              AND a.timeline_pull_since IS NULL
+            ORDER BY r.created_at DESC, r.id DESC
+            LIMIT :backfill_size
+            ON CONFLICT DO NOTHING
+        """),
+        {
+            "follower_id": follower_id,
+            "author_id": author_id,
+            "backfill_size": TIMELINE_BACKFILL_SIZE,
+        },
+    )
+
+
+async def remove_from_timeline(db: AsyncSession, follower_id: UUID, author_id: UUID) -> None:
+    """Удаляет отчеты автора из ленты бывшего подписчика."""
+    await db.execute(
+        text("""
+            DELETE FROM timelines
+            WHERE follower_id = :follower_id AND author_id = :author_id
+        """),
+        {"follower_id": follower_id, "author_id": author_id},
+    )
+
+
+async def read_timeline(
+        db: AsyncSession,
+        follower_id: UUID,
+        limit: int,
+        cursor: dict | None = None,
+) -> list[dict]:
+    """
+    Читает страницу ленты подписок, упорядоченную по (created_at, id).
+
+    Параметры:
+        cursor: Параметры cursor_created_at и cursor_id последней строки
+            предыдущей страницы (опционально)
+
+    Возвращает:
+        list[dict]: До limit карточек отчетов
+    """
+    params = {"follower_id": follower_id, "limit": limit}
+    push_filter = ""
+    pull_filter = ""
+    if cursor:
+        params.update(cursor)
+        push_filter = "AND (t.created_at, t.report_id) < (:cursor_created_at, :cursor_id)"
+        pull_filter = "AND (r.created_at, r.id) < (:cursor_created_at, :cursor_id)"
+
+    pushed = await db.execute(
+        text(f"""
+            SELECT
+                {REPORT_CARD_COLUMNS},
+                u.username as author_username,
+                false as is_owner
+            FROM timelines t
+            JOIN reports r ON r.id = t.report_id
+            JOIN users u ON u.user_id = r.user_id
+            WHERE t.follower_id = :follower_id
+              AND r.status != 'PRIVATE'
+              {push_filter}
+            ORDER BY t.created_at DESC, t.report_id DESC
+            LIMIT :limit
+        """),
+        params,
+    )
+    pulled = await db.execute(
+        text(f"""
+            SELECT
+                {REPORT_CARD_COLUMNS},
+                u.username as author_username,
+                false as is_owner
+            FROM subscriptions s
+            JOIN users u ON u.user_id = s.following_id
+            JOIN LATERAL (
+                SELECT *
+                FROM reports r
+                WHERE r.user_id = s.following_id
+                  AND r.status != 'PRIVATE'
+                  {pull_filter}
+                ORDER BY r.created_at DESC, r.id DESC
+                LIMIT :limit
+            ) r ON true
+            WHERE s.follower_id = :follower_id
+              AND u.timeline_pull_since IS NOT NULL
+        """),
+        params,
+    )
+
+    # Разложенные до перехода в режим чтения на лету отчеты приходят из обеих частей
+    rows = {row["id"]: dict(row) for row in pulled.mappings()}
+    rows.update((row["id"], dict(row)) for row in pushed.mappings())
+    merged = sorted(rows.values(), key=lambda row: (row["created_at"], row["id"]), reverse=True)
+    return merged[:limit]
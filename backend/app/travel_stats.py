@@ -0,0 +1,335 @@
+"""
+Статистика путешествий пользователя (users.travel_stats).
+
+countries — отсортированный список кодов стран точек карты, kilometers —
+сумма расстояний по дуге большого круга между точками, упорядоченными
+по времени посещения. Профиль только читает готовое значение.
+
+Статистика обновляется инкрементально: вставка точки меняет сумму лишь
+на отрезки с ее соседями по времени, которые находятся двумя запросами
+по индексу (user_id, visited_at, id). Строка пользователя блокируется до
+конца транзакции, поэтому изменения карты одного пользователя из разных
+воркеров применяются по очереди.
+
+Точки удаляются в основном каскадно вместе с отчетами, поэтому удаления
+отмечает триггер базы, а статистику отмеченных пользователей в фоне
+пересчитывает TravelStatsRefresher.
+
+Полный пересчет для заполнения и сверки векторизован NumPy и
+запускается командой python -m app.travel_stats.
+"""
+
+import asyncio
+import json
+import math
+from itertools import groupby
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import invalidate_tags
+from app.clusters import travel_map_tag
+from app.database import AsyncSessionLocal
+
+EARTH_RADIUS_KM = 6371.0088
+
+EMPTY_TRAVEL_STATS = {"countries": [], "kilometers": 0}
+# Расхождение накопленной суммы с пересчетом из-за округления, не требующее записи
+KILOMETERS_TOLERANCE = 1e-3
+
+TRAVEL_STATS_REFRESH_INTERVAL = 30
+TRAVEL_STATS_REFRESH_BATCH = 100
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _haversine_km_np(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def _detour_km(previous, point, following) -> float:
+    """На сколько удлиняется путь, если вставить point между соседями."""
+    detour = 0.0
+    if previous:
+        detour += haversine_km(previous["latitude"], previous["longitude"], point["latitude"], point["longitude"])
+    if following:
+        detour += haversine_km(point["latitude"], point["longitude"], following["latitude"], following["longitude"])
+    if previous and following:
+        detour -= haversine_km(
+            previous["latitude"], previous["longitude"], following["latitude"], following["longitude"]
+        )
+    return detour
+
+
+async def _lock_stats(db: AsyncSession, user_id: UUID) -> dict | None:
+    result = await db.execute(
+        text("SELECT travel_stats FROM users WHERE user_id = :user_id FOR UPDATE"),
+        {"user_id": user_id},
+    )
+    row = result.first()
+    if row is None:
+        return None
+    return {**EMPTY_TRAVEL_STATS, **(row[0] or {})}
+
+
+async def _neighbours(db: AsyncSession, user_id: UUID, point, excluded: list[int]):
+    """Предыдущая и следующая по времени точки, не считая excluded."""
+    found = []
+    for condition, order in (("<", "DESC"), (">", "ASC")):
+        result = await db.execute(
+            text(f"""
+                SELECT latitude, longitude
+                FROM travel_map
+                WHERE user_id = :user_id
+                  AND (visited_at, id) {condition} (:visited_at, :id)
+                  AND id <> ALL(:excluded)
+                ORDER BY visited_at {order}, id {order}
+                LIMIT 1
+            """),
+            {"user_id": user_id, "visited_at": point["visited_at"], "id": point["id"], "excluded": excluded},
+        )
+        found.append(result.mappings().first())
+    return found
+
+
+async def _save_stats(db: AsyncSession, user_id: UUID, countries: list[str], kilometers: float) -> None:
+    await db.execute(
+        text("""
+            UPDATE users
+            SET travel_stats = coalesce(travel_stats, '{}'::jsonb) || CAST(:stats AS jsonb)
+            WHERE user_id = :user_id
+        """),
+        {
+            "user_id": user_id,
+            "stats": json.dumps({"countries": countries, "kilometers": max(kilometers, 0.0)}),
+        },
+    )
+
+
+async def add_points(db: AsyncSession, points: list) -> set[UUID]:
+    """
+    Учитывает в статистике только что вставленные точки карты.
+
+    Вызывается в транзакции вставки; points — строки с id, user_id,
+    latitude, longitude, visited_at и country_code.
+
+    Возвращает:
+        set: Пользователи, чья статистика изменилась
+    """
+    changed = set()
+    for user_id, user_points in groupby(sorted(points, key=lambda p: str(p["user_id"])), key=lambda p: p["user_id"]):
+        user_points = list(user_points)
+        stats = await _lock_stats(db, user_id)
+        if stats is None:
+            continue
+
+        kilometers = stats["kilometers"]
+        # Еще не учтенные точки не должны считаться соседями
+        pending = {point["id"] for point in user_points}
+        for point in user_points:
+            pending.discard(point["id"])
+            previous, following = await _neighbours(db, user_id, point, list(pending))
+            kilometers += _detour_km(previous, point, following)
+
+        countries = set(stats["countries"]) | {p["country_code"] for p in user_points if p["country_code"]}
+        await _save_stats(db, user_id, sorted(countries), kilometers)
+        changed.add(user_id)
+    return changed
+
+
+def compute_travel_stats(user_ids: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray, country_codes: np.ndarray) -> dict:
+    """
+    Считает статистику для точек, отсортированных по пользователю и времени.
+
+    Возвращает:
+        dict: user_id -> {"countries": [...], "kilometers": float}
+    """
+    if not len(user_ids):
+        return {}
+
+    # Номер группы пользователя для каждой строки
+    starts = np.r_[True, user_ids[1:] != user_ids[:-1]]
+    group = np.cumsum(starts) - 1
+    owners = user_ids[starts]
+
+    segments = _haversine_km_np(latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:])
+    # Отрезки между последней точкой одного пользователя и первой следующего не считаются
+    segments[starts[1:]] = 0
+    kilometers = np.bincount(group[1:], weights=segments, minlength=len(owners))
+
+    countries = [[] for _ in owners]
+    known = np.flatnonzero(np.not_equal(country_codes, None))
+    if len(known):
+        pairs = np.unique(np.rec.fromarrays([group[known], country_codes[known].astype(str)]))
+        for index, code in pairs.tolist():
+            countries[index].append(code)
+
+    return {
+        owner: {"countries": owner_countries, "kilometers": float(km)}
+        for owner, owner_countries, km in zip(owners.tolist(), countries, kilometers)
+    }
+
+
+async def _recompute(db: AsyncSession, user_ids: list[UUID] | None) -> tuple[int, set[UUID]]:
+    """
+    Пересчитывает статистику пользователей (по умолчанию всех) в транзакции db
+    и записывает только ту, что разошлась с сохраненной.
+
+    Возвращает:
+        tuple: Число пользователей с точками на карте и пользователи,
+            чья статистика изменилась
+    """
+    scope = "" if user_ids is None else "AND user_id = ANY(:user_ids)"
+    params = {"user_ids": user_ids}
+    result = await db.execute(
+        text(f"""
+            SELECT user_id, latitude, longitude, country_code
+            FROM travel_map
+            WHERE true {scope}
+            ORDER BY user_id, visited_at, id
+        """),
+        params,
+    )
+    rows = result.all()
+    columns = list(zip(*rows)) or [(), (), (), ()]
+    stats = compute_travel_stats(
+        np.array(columns[0], dtype=object),
+        np.array(columns[1], dtype=np.float64),
+        np.array(columns[2], dtype=np.float64),
+        np.array(columns[3], dtype=object),
+    )
+
+    # Пользователи без точек интересны, только если у них сохранена непустая статистика
+    result = await db.execute(
+        text(f"""
+            SELECT user_id, travel_stats
+            FROM users
+            WHERE (
+                user_id = ANY(:with_points)
+                OR travel_stats -> 'countries' <> '[]'::jsonb
+                OR (travel_stats ->> 'kilometers')::float <> 0
+            )
+            {scope}
+        """),
+        {**params, "with_points": list(stats)},
+    )
+    changed = {}
+    for user_id, saved in result.all():
+        saved = {**EMPTY_TRAVEL_STATS, **(saved or {})}
+        expected = stats.get(user_id, EMPTY_TRAVEL_STATS)
+        if (
+            sorted(saved["countries"]) != expected["countries"]
+            or abs(saved["kilometers"] - expected["kilometers"]) > KILOMETERS_TOLERANCE
+        ):
+            changed[user_id] = expected
+
+    if changed:
+        await db.execute(
+            text("""
+                UPDATE users
+                SET travel_stats = coalesce(travel_stats, '{}'::jsonb) || CAST(:stats AS jsonb)
+                WHERE user_id = :user_id
+            """),
+            [{"user_id": user_id, "stats": json.dumps(value)} for user_id, value in changed.items()],
+        )
+    return len(stats), set(changed)
+
+
+async def recompute_travel_stats(user_ids: list[UUID] | None = None) -> int:
+    """
+    Полностью пересчитывает статистику пользователей (по умолчанию всех).
+
+    Вставка точек на время пересчета блокируется, чтобы инкрементальные
+    обновления не потерялись.
+
+    Возвращает:
+        int: Число пользователей с точками на карте
+    """
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("LOCK TABLE travel_map IN SHARE MODE"))
+        count, _ = await _recompute(db, user_ids)
+        await db.commit()
+    return count
+
+
+async def refresh_deleted_points() -> None:
+    """
+    Пересчитывает статистику пользователей, у которых удалялись точки.
+
+    Триггер на travel_map записывает таких пользователей в travel_stats_dirty
+    при любом удалении, в том числе каскадном вместе с отчетом. Строки
+    пользователей блокируются, как при вставке точек, а занятые другим
+    воркером пропускаются.
+    """
+    while True:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                text("""
+                    SELECT d.user_id
+                    FROM travel_stats_dirty d
+                    JOIN users u ON u.user_id = d.user_id
+                    ORDER BY d.user_id
+                    LIMIT :batch_size
+                    FOR UPDATE OF d, u SKIP LOCKED
+                """),
+                {"batch_size": TRAVEL_STATS_REFRESH_BATCH},
+            )
+            user_ids = result.scalars().all()
+            if not user_ids:
+                return
+
+            _, changed = await _recompute(db, user_ids)
+            await db.execute(
+                text("DELETE FROM travel_stats_dirty WHERE user_id = ANY(:user_ids)"),
+                {"user_ids": user_ids},
+            )
+            await db.commit()
+
+        await invalidate_tags(
+            *(travel_map_tag(user_id) for user_id in user_ids),
+            *(f"user:{user_id}" for user_id in changed),
+        )
+        if len(user_ids) < TRAVEL_STATS_REFRESH_BATCH:
+            return
+
+
+class TravelStatsRefresher:
+    """Периодически учитывает в статистике удаленные точки карты."""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await refresh_deleted_points()
+            except Exception as e:
+                print(f"Ошибка пересчета статистики путешествий: {e}")
+            await asyncio.sleep(TRAVEL_STATS_REFRESH_INTERVAL)
+
+
+travel_stats_refresher = TravelStatsRefresher()
+
+
+if __name__ == "__main__":
+    print(f"Пересчитана статистика пользователей: {asyncio.run(recompute_travel_stats())}")
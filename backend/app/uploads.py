@@ -0,0 +1,156 @@
+"""
+Предварительная загрузка файлов для отчетов.
+
+Клиент загружает изображения заранее и параллельно, получая токены,
+а при создании отчета передает только токены: запрос создания отчета
+не ждет приема файлов и пишет в базу одни метаданные. Загруженный
+файл держит ссылку на блоб; при привязке ссылка переходит к строке
+media_files, а невостребованные загрузки удаляются по истечении срока.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.media import StoredBlob, collect_blobs, discard_blob, release_blobs, store_blob
+from app.resumable import expire_resumable_uploads, upload_completer
+from app.utils import MAX_UPLOAD_SIZE
+
+STAGED_UPLOAD_TTL = timedelta(hours=1)
+STAGED_UPLOAD_SWEEP_INTERVAL = 300
+
+ERROR_UPLOAD_NOT_FOUND = "Загрузка не найдена или срок ее хранения истек"
+
+
+async def stage_upload(
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        upload_file: UploadFile,
+        max_size: int = MAX_UPLOAD_SIZE,
+) -> dict:
+    """
+    Сохраняет файл, выдает токен для последующей привязки к отчету
+    и фиксирует транзакцию db.
+
+    Если запись загрузки не удалась, объект, уже записанный в хранилище,
+    удаляется, чтобы не остаться без ссылок.
+
+    Возвращает:
+        dict: Токен, URL файла и время истечения загрузки
+    """
+    blob = await store_blob(db, upload_file, max_size)
+    try:
+        result = await db.execute(
+            text("""
+                INSERT INTO staged_uploads (token, user_id, file_hash, url, content_type, size, expires_at)
+                VALUES (:token, :user_id, :file_hash, :url, :content_type, :size, :expires_at)
+                RETURNING token, url, expires_at
+            """),
+            {
+                "token": uuid.uuid4(),
+                "user_id": user_id,
+                "file_hash": blob.file_hash,
+                "url": blob.url,
+                "content_type": blob.content_type,
+                "size": blob.size,
+                "expires_at": datetime.now(timezone.utc) + STAGED_UPLOAD_TTL,
+            },
+        )
+        staged = dict(result.mappings().one())
+        await db.commit()
+    except BaseException:
+        # Откат снимает блокировку строки блоба, иначе очистка ждала бы саму себя
+        await db.rollback()
+        await discard_blob(blob)
+        raise
+    return staged
+
+
+async def claim_uploads(db: AsyncSession, user_id: uuid.UUID, *tokens: uuid.UUID) -> list[StoredBlob]:
+    """
+    Забирает загрузки пользователя в транзакции db.
+
+    Ссылки на блобы переходят к вызывающему без изменения счетчиков.
+
+    Возвращает:
+        list: Блобы в порядке переданных токенов
+
+    Исключения:
+        HTTPException: 400, если токен повторяется, чужой или истек
+    """
+    if len(set(tokens)) != len(tokens):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=ERROR_UPLOAD_NOT_FOUND)
+
+    result = await db.execute(
+        text("""
+            DELETE FROM staged_uploads
+            WHERE token = ANY(:tokens)
+              AND user_id = :user_id
+              AND expires_at > now()
+            RETURNING token, file_hash, url, content_type, size
+        """),
+        {"tokens": list(tokens), "user_id": user_id},
+    )
+    claimed = {row["token"]: row for row in result.mappings()}
+    if len(claimed) != len(tokens):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=ERROR_UPLOAD_NOT_FOUND)
+
+    return [
+        StoredBlob(
+            file_hash=claimed[token]["file_hash"],
+            url=claimed[token]["url"],
+            content_type=claimed[token]["content_type"],
+            size=claimed[token]["size"],
+            created=False,
+        )
+        for token in tokens
+    ]
+
+
+async def expire_staged_uploads() -> None:
+    """Удаляет невостребованные загрузки и освобождает их блобы."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            text("DELETE FROM staged_uploads WHERE expires_at <= now() RETURNING file_hash")
+        )
+        orphaned = await release_blobs(db, *result.scalars().all())
+        await db.commit()
+    await collect_blobs(orphaned)
+
+
+class StagedUploadSweeper:
+    """Периодически удаляет истекшие и брошенные загрузки во всех воркерах."""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await expire_staged_uploads()
+                await expire_resumable_uploads()
+                # Завершения, брошенные остановленными воркерами
+                await upload_completer.resume()
+            except Exception as e:
+                print(f"Ошибка удаления истекших загрузок: {e}")
+            await asyncio.sleep(STAGED_UPLOAD_SWEEP_INTERVAL)
+
+
+staged_upload_sweeper = StagedUploadSweeper()
@@ -1,65 +1,158 @@
-import uuid
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import tempfile
 from pathlib import Path
+from typing import BinaryIO
 
 from fastapi import (
-    File,
     HTTPException,
     UploadFile,
     status,
 )
+from fastapi.encoders import jsonable_encoder
 
-UPLOAD_DIR = Path(r"C:\Users\Иван\Desktop\MainApp\react-vite-project\public\uploads")
+# Корень хранилища медиафайлов; по умолчанию каталог uploads рядом с приложением
+UPLOAD_DIR = Path(os.getenv("MEDIA_ROOT", Path(__file__).resolve().parent.parent / "uploads"))
 ALLOWED_MIME_TYPES = ["image/jpeg", "image/png", "image/webp", "image/svg"]
 MAX_AVATAR_SIZE = 5 * 1024 * 1024
+MAX_UPLOAD_SIZE = 20 * 1024 * 1024
 
+# Временный каталог на том же разделе, чтобы переименование было атомарным
+UPLOAD_TMP_DIR = UPLOAD_DIR / ".tmp"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-async def save_upload_file(upload_file: UploadFile, max_size: int = None) -> str:
-    """
-    Сохраняет загруженный файл на сервер с проверкой типа и размера.
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
 
-    Параметры:
-        upload_file: Загруженный файл
-        max_size: Максимальный допустимый размер файла в байтах (опционально)
+# Поля карточки отчета: всё, кроме текста и технических настроек
+REPORT_CARD_COLUMNS = """
+    r.id,
+    r.user_id,
+    r.title,
+    r.description,
+    r.main_image,
+    r.side_image,
+    r.start_date,
+    r.end_date,
+    r.duration,
+    r.likes,
+    r.comments_count,
+    r.status,
+    r.created_at,
+    r.updated_at,
+    (
+        SELECT jsonb_object_agg(
+            mf.file_metadata ->> 'role',
+            jsonb_build_object(
+                'variants', mf.file_metadata -> 'variants',
+                'placeholder', mf.file_metadata -> 'placeholder'
+            )
+        )
+        FROM media_files mf
+        WHERE mf.report_id = r.id
+          AND (mf.file_metadata -> 'variants') IS NOT NULL
+    ) AS images
+"""
+
+# Все поля отчета, кроме служебных поисковых столбцов
+REPORT_COLUMNS = REPORT_CARD_COLUMNS + """,
+    r.html_path,
+    r.text_content,
+    r.likes_status,
+    r.comment_status,
+    r.addit_file_status
+"""
+
+
+def encode_cursor(**values) -> str:
+    """
+    Упаковывает значения ключа пагинации в непрозрачную строку курсора.
 
     Возвращает:
-        str: Относительный путь к сохраненному файлу
+        str: base64url-строка без выравнивающих символов
+    """
+    raw = json.dumps(jsonable_encoder(values), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Распаковывает курсор, полученный от encode_cursor.
 
     Исключения:
-        HTTPException: При ошибках валидации или сохранения файла
+        HTTPException: Если курсор поврежден
     """
     try:
-        # Проверка типа файла
-        if upload_file.content_type not in ALLOWED_MIME_TYPES:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Неподдерживаемый тип файла",
-            )
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, dict):
+            raise ValueError
+        return values
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации",
+        )
 
-        # Проверка размера файла
-        content = await upload_file.read()
-        if max_size and len(content) > max_size:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="Превышен максимальный размер файла",
-            )
 
-        # Генерация уникального имени файла
-        file_ext = upload_file.filename.split(".")[-1] if "." in upload_file.filename else ""
-        unique_filename = f"{uuid.uuid4()}.{file_ext}" if file_ext else f"{uuid.uuid4()}"
-        file_path = UPLOAD_DIR / unique_filename
+class UploadTooLarge(Exception):
+    """Файл превысил допустимый размер во время копирования."""
+
 
-        # Сохранение файла
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
+def _copy_to_temp(source: BinaryIO, max_size: int | None) -> tuple[Path, str, int]:
+    """
+    Копирует поток во временный файл по частям, считая SHA-256 и размер.
 
-        return f"/uploads/{unique_filename}"
+    Выполняется в пуле потоков: чтение и запись блокирующие.
+    """
+    UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Ошибка при сохранении файла: {str(e)}",
-        )
-    finally:
-        await upload_file.close()
\ No newline at end of file
+    with tempfile.NamedTemporaryFile(dir=UPLOAD_TMP_DIR, delete=False) as buffer:
+        temp_path = Path(buffer.name)
+        try:
+            source.seek(0)
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if max_size and size > max_size:
+                    raise UploadTooLarge
+                digest.update(chunk)
+                buffer.write(chunk)
+        except BaseException:
+            buffer.close()
+            temp_path.unlink(missing_ok=True)
+            raise
+
+    return temp_path, digest.hexdigest(), size
+
+
+async def stream_upload_file(upload_file: UploadFile, max_size: int | None = MAX_UPLOAD_SIZE) -> tuple[Path, str, int]:
+    """
+    Потоково сохраняет загруженный файл во временный каталог.
+
+    Параметры:
+        upload_file: Загруженный файл
+        max_size: Максимальный допустимый размер файла в байтах
+
+    Возвращает:
+        tuple: Путь к временному файлу, SHA-256 содержимого и размер в байтах
+
+    Исключения:
+        HTTPException: 413 при превышении размера
+    """
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail="Превышен максимальный размер файла",
+    )
+    # Размер из заголовков части формы позволяет отказать без копирования
+    if max_size and upload_file.size is not None and upload_file.size > max_size:
+        raise too_large
+
+    try:
+        return await asyncio.to_thread(_copy_to_temp, upload_file.file, max_size)
+    except UploadTooLarge:
+        raise too_large
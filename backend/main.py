@@ -1,16 +1,54 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
 from pathlib import Path
 import uvicorn
 
-from app.routers import reports, auth, users
+from app.routers import reports, auth, users, events, metrics, media, resumable
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.routers.auth import limiter
+from app.cache import invalidation_bus
+from app.events import broker
+from app.geocoder import geocoder
+from app.images import image_pipeline
+from app.resumable import upload_completer
+from app.storage import storage
+from app.uploads import staged_upload_sweeper
+from app.security import password_hasher, revocation_list
+from app.travel_stats import travel_stats_refresher
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await storage.start()
+    # Слушатели LISTEN/NOTIFY: инвалидация кэшей и события между воркерами
+    await invalidation_bus.start()
+    await broker.bus.start()
+    # Фильтр отзыва должен быть заполнен до приема первых запросов
+    await revocation_list.start()
+    # Индекс полигонов открывается через mmap и не копируется в память воркера
+    geocoder.load()
+    # Блобы, не обработанные до перезапуска
+    await image_pipeline.resume()
+    await upload_completer.resume()
+    await staged_upload_sweeper.start()
+    await travel_stats_refresher.start()
+    yield
+    await travel_stats_refresher.stop()
+    await staged_upload_sweeper.stop()
+    upload_completer.shutdown()
+    image_pipeline.shutdown()
+    await revocation_list.stop()
+    await broker.bus.stop()
+    await invalidation_bus.stop()
+    password_hasher.shutdown()
+    await storage.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.state.limiter = limiter
 app.add_middleware(SlowAPIMiddleware)
@@ -29,12 +67,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Заголовки протокола возобновляемой загрузки должны быть видны клиенту
+    expose_headers=["Location", "Upload-Offset", "Upload-Length", "Tus-Resumable", "Tus-Version", "Tus-Max-Size"],
 )
 
 # Подключение роутеров
 app.include_router(reports.router)
 app.include_router(auth.router)
 app.include_router(users.router)
+app.include_router(events.router)
+app.include_router(metrics.router)
+app.include_router(media.router)
+app.include_router(resumable.router)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="192.168.0.78", port=8000)
\ No newline at end of file
@@ -0,0 +1,119 @@
+import random
+
+import pytest
+
+from app.geo import (
+    GEOHASH_ALPHABET,
+    GEOHASH_RANGE_END,
+    MAX_COVER_CELLS,
+    encode_geohash,
+    geohash_ranges,
+    radius_box,
+)
+
+BOX_COUNT = 500
+POINTS_PER_BOX = 20
+
+
+def _random_box(rng: random.Random, crossing: bool) -> tuple[float, float, float, float]:
+    south, north = sorted(rng.uniform(-90, 90) for _ in range(2))
+    if crossing:
+        west, east = rng.uniform(0, 180), rng.uniform(-180, 0)
+    else:
+        west, east = sorted(rng.uniform(-180, 180) for _ in range(2))
+    # Часть прямоугольников — маленькие, чтобы покрытие шло длинными геохешами
+    if rng.random() < 0.5:
+        scale = 10 ** -rng.uniform(0, 4)
+        north = min(90, south + (north - south) * scale)
+        width = (east - west) % 360 * scale
+        east = west + width if west + width <= 180 else west + width - 360
+    return south, west, north, east
+
+
+def _random_point(rng: random.Random, box) -> tuple[float, float]:
+    south, west, north, east = box
+    width = (east - west) % 360 if west > east else east - west
+    longitude = west + rng.uniform(0, width)
+    if longitude > 180:
+        longitude -= 360
+    return rng.uniform(south, north), longitude
+
+
+def _covered(ranges: list[tuple[str, str]], geohash: str) -> bool:
+    return any(start <= geohash < end for start, end in ranges)
+
+
+def _cell_count(ranges: list[tuple[str, str]]) -> int:
+    """Число ячеек в диапазонах одной длины геохеша."""
+    precision = len(ranges[0][0])
+
+    def value(geohash: str) -> int:
+        if geohash == GEOHASH_RANGE_END:
+            return 1 << (precision * 5)
+        result = 0
+        for char in geohash:
+            result = (result << 5) | GEOHASH_ALPHABET.index(char)
+        return result
+
+    return sum(value(end) - value(start) for start, end in ranges)
+
+
+def test_encode_known_vector():
+    assert encode_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+
+def test_encode_prefix_matches_shorter_precision():
+    assert encode_geohash(57.64911, 10.40744).startswith("u4pruydqqvj")
+    assert encode_geohash(57.64911, 10.40744, 5) == "u4pru"
+
+
+@pytest.mark.parametrize("crossing", [False, True])
+def test_ranges_contain_points_inside_box(crossing):
+    rng = random.Random(crossing)
+    for _ in range(BOX_COUNT):
+        box = _random_box(rng, crossing)
+        ranges = geohash_ranges(*box)
+        for _ in range(POINTS_PER_BOX):
+            latitude, longitude = _random_point(rng, box)
+            assert _covered(ranges, encode_geohash(latitude, longitude)), (box, latitude, longitude)
+
+
+def test_ranges_contain_box_corners():
+    rng = random.Random(7)
+    for _ in range(BOX_COUNT):
+        south, west, north, east = box = _random_box(rng, rng.random() < 0.5)
+        ranges = geohash_ranges(*box)
+        for latitude in (south, north):
+            for longitude in (west, east):
+                assert _covered(ranges, encode_geohash(latitude, longitude)), (box, latitude, longitude)
+
+
+def test_ranges_respect_cell_cap():
+    rng = random.Random(11)
+    for _ in range(BOX_COUNT):
+        box = _random_box(rng, False)
+        assert _cell_count(geohash_ranges(*box)) <= MAX_COVER_CELLS, box
+
+
+def test_crossing_box_caps_each_half():
+    rng = random.Random(13)
+    for _ in range(BOX_COUNT):
+        south, west, north, east = _random_box(rng, True)
+        assert _cell_count(geohash_ranges(south, west, north, 180)) <= MAX_COVER_CELLS
+        assert _cell_count(geohash_ranges(south, -180, north, east)) <= MAX_COVER_CELLS
+        assert len(geohash_ranges(south, west, north, east)) <= 2 * MAX_COVER_CELLS
+
+
+def test_custom_cell_cap():
+    assert _cell_count(geohash_ranges(10, 10, 20, 20, max_cells=4)) <= 4
+
+
+def test_radius_box_near_antimeridian():
+    south, west, north, east = radius_box(0, 179.9, 50)
+    assert west > east
+    assert _covered(geohash_ranges(south, west, north, east), encode_geohash(0, -179.9))
+
+
+def test_radius_box_covering_pole():
+    _, west, _, east = radius_box(89.9, 0, 50)
+    assert (west, east) == (-180.0, 180.0)
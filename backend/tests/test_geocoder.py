@@ -0,0 +1,151 @@
+import json
+import random
+
+import pytest
+
+from app.geocoder import Place, ReverseGeocoder, build_dataset
+
+COLUMNS, ROWS = 40, 50
+CELL_WIDTH, CELL_HEIGHT = 9.0, 3.2
+WEST, SOUTH = -180.0, -80.0
+POINT_COUNT = 3000
+# Точки не ближе к границе ячейки, чем погрешность округления в кэше
+MARGIN = 0.01
+
+
+def _square(west: float, south: float, east: float, north: float) -> list:
+    return [[west, south], [east, south], [east, north], [west, north], [west, south]]
+
+
+def _feature(geometry: dict, code, country: str, name: str) -> dict:
+    return {
+        "type": "Feature",
+        "properties": {"iso_a2": code, "admin": country, "name": name},
+        "geometry": geometry,
+    }
+
+
+def _cell_code(column: int, row: int) -> str:
+    return chr(65 + column % 26) + chr(65 + row % 26)
+
+
+def _grid_features() -> list:
+    return [
+        _feature(
+            {
+                "type": "Polygon",
+                "coordinates": [_square(
+                    WEST + column * CELL_WIDTH,
+                    SOUTH + row * CELL_HEIGHT,
+                    WEST + (column + 1) * CELL_WIDTH,
+                    SOUTH + (row + 1) * CELL_HEIGHT,
+                )],
+            },
+            _cell_code(column, row),
+            f"C{column}_{row}",
+            f"R{column}_{row}",
+        )
+        for column in range(COLUMNS)
+        for row in range(ROWS)
+    ]
+
+
+@pytest.fixture(scope="module")
+def geocoder(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("geocoder")
+    features = _grid_features() + [
+        # Вложен в ячейку сетки и должен выигрывать у нее
+        _feature({"type": "Polygon", "coordinates": [_square(1, 1, 2, 2)]}, -99, "Small", "S"),
+        # Две части, у первой дыра
+        _feature(
+            {
+                "type": "MultiPolygon",
+                "coordinates": [
+                    [_square(0, 82, 20, 88), _square(5, 84, 15, 86)],
+                    [_square(-20, 82, -10, 88)],
+                ],
+            },
+            "HL",
+            "Holed",
+            "H",
+        ),
+    ]
+    source = directory / "regions.geojson"
+    source.write_text(json.dumps({"type": "FeatureCollection", "features": features}), encoding="utf-8")
+
+    assert build_dataset(source, directory, "iso_a2", "admin", "name") == COLUMNS * ROWS + 3
+
+    geocoder = ReverseGeocoder(directory)
+    geocoder.load()
+    assert geocoder.enabled
+    return geocoder
+
+
+def _random_cell_point(rng: random.Random) -> tuple[int, int, float, float]:
+    column, row = rng.randrange(COLUMNS), rng.randrange(ROWS)
+    latitude = SOUTH + row * CELL_HEIGHT + rng.uniform(MARGIN, CELL_HEIGHT - MARGIN)
+    longitude = WEST + column * CELL_WIDTH + rng.uniform(MARGIN, CELL_WIDTH - MARGIN)
+    return column, row, latitude, longitude
+
+
+def _in_small(latitude: float, longitude: float) -> bool:
+    return 1 - MARGIN <= latitude <= 2 + MARGIN and 1 - MARGIN <= longitude <= 2 + MARGIN
+
+
+def test_lookup_grid(geocoder):
+    rng = random.Random(1)
+    for _ in range(POINT_COUNT):
+        column, row, latitude, longitude = _random_cell_point(rng)
+        if _in_small(latitude, longitude):
+            continue
+        assert geocoder.lookup(latitude, longitude) == Place(
+            _cell_code(column, row), f"C{column}_{row}", f"R{column}_{row}",
+        ), (latitude, longitude)
+
+
+def test_candidates_include_containing_cell(geocoder):
+    rng = random.Random(2)
+    for _ in range(POINT_COUNT):
+        column, row, latitude, longitude = _random_cell_point(rng)
+        candidates = geocoder._candidates(latitude, longitude)
+        # Полигоны переупорядочены упаковкой, регионы идут в порядке признаков
+        regions = geocoder._polygon_regions[candidates].tolist()
+        assert column * ROWS + row in regions
+        # Рамки ячеек касаются только соседей
+        assert len(candidates) <= 5
+
+
+def test_smallest_polygon_wins(geocoder):
+    rng = random.Random(3)
+    for _ in range(100):
+        latitude, longitude = rng.uniform(1.01, 1.99), rng.uniform(1.01, 1.99)
+        assert geocoder.lookup(latitude, longitude) == Place(None, "Small", "S")
+    # Та же ячейка сетки вне вложенного полигона
+    assert geocoder.lookup(2.5, 2.5).name == "R20_25"
+
+
+def test_multipolygon_with_hole(geocoder):
+    assert geocoder.lookup(83, 2).country == "Holed"
+    assert geocoder.lookup(85, -15).country == "Holed"
+    assert geocoder.lookup(85, 10) is None
+
+
+def test_outside_polygons(geocoder):
+    assert geocoder.lookup(85, 50) is None
+    assert geocoder.lookup(-85, 0) is None
+
+
+def test_lookup_many_matches_lookup(geocoder):
+    rng = random.Random(4)
+    points = [_random_cell_point(rng)[2:] for _ in range(200)]
+    points += points[:50]
+    latitudes, longitudes = zip(*points)
+    assert geocoder.lookup_many(latitudes, longitudes) == [geocoder.lookup(*point) for point in points]
+
+
+def test_disabled_without_data(tmp_path):
+    geocoder = ReverseGeocoder(tmp_path)
+    geocoder.load()
+    assert not geocoder.enabled
+    assert geocoder.lookup(0, 0) is None
+    assert geocoder.lookup_many([0, 1], [0, 1]) == [None, None]
@@ -0,0 +1,105 @@
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.routers import media
+from app.storage import LocalStorage
+
+SIZE = 10
+CONTENT = bytes(range(SIZE))
+FILE_HASH = "ab" * 32
+FILE_PATH = f"ab/ab/{FILE_HASH}.jpg"
+ETAG = f'"{FILE_HASH}"'
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=2-5", (2, 5)),
+    ("bytes=2-100", (2, SIZE - 1)),
+    ("bytes=4-", (4, SIZE - 1)),
+    ("bytes=0-", (0, SIZE - 1)),
+    ("bytes=-3", (SIZE - 3, SIZE - 1)),
+    ("bytes=-100", (0, SIZE - 1)),
+])
+def test_parse_range(header, expected):
+    assert media._parse_range(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "items=1-2",
+    "bytes=1-2,4-5",
+    "bytes=a-b",
+    "bytes=5-3",
+])
+def test_parse_range_ignored(header):
+    assert media._parse_range(header, SIZE) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=10-", "bytes=10-20", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(HTTPException) as error:
+        media._parse_range(header, SIZE)
+    assert error.value.status_code == 416
+    assert error.value.headers == {"Content-Range": f"bytes */{SIZE}"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    path = tmp_path / FILE_PATH
+    path.parent.mkdir(parents=True)
+    path.write_bytes(CONTENT)
+    monkeypatch.setattr(media, "storage", LocalStorage(tmp_path))
+    monkeypatch.setattr(media, "MEDIA_ACCEL_REDIRECT", None)
+
+    app = FastAPI()
+    app.include_router(media.router)
+    return TestClient(app)
+
+
+def _url() -> str:
+    return media.router.prefix + "/" + FILE_PATH
+
+
+def test_range_request(client):
+    response = client.get(_url(), headers={"Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[2:6]
+    assert response.headers["content-range"] == f"bytes 2-5/{SIZE}"
+    assert response.headers["etag"] == ETAG
+
+
+def test_if_range_matching(client):
+    response = client.get(_url(), headers={"Range": "bytes=-3", "If-Range": ETAG})
+    assert response.status_code == 206
+    assert response.content == CONTENT[-3:]
+
+
+def test_if_range_not_matching(client):
+    response = client.get(_url(), headers={"Range": "bytes=-3", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_if_range_not_matching_skips_unsatisfiable_range(client):
+    response = client.get(_url(), headers={"Range": "bytes=100-", "If-Range": '"stale"'})
+    assert response.status_code == 200
+
+
+def test_inverted_range_returns_whole_file(client):
+    response = client.get(_url(), headers={"Range": "bytes=5-3"})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_unsatisfiable_range(client):
+    response = client.get(_url(), headers={"Range": f"bytes={SIZE}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{SIZE}"
+
+
+def test_head_range_has_no_body(client):
+    response = client.head(_url(), headers={"Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert response.content == b""
+    assert response.headers["content-length"] == "4"
@@ -1,5 +1,6 @@
 import { Link } from 'react-router-dom';
 import avatar from '/Page1_avatar.png';
+import { mediaUrl } from '../utils/helpers';
 import '../pages/SubscriptionsPage-style.css';
 
 const SubscriberCard = ({ subscriber, onClose }) => {
@@ -11,7 +12,7 @@ const SubscriberCard = ({ subscriber, onClose }) => {
         >
             <div className="avatar-container">
                 <img
-                    src={subscriber?.avatar_url || avatar}
+                    src={mediaUrl(subscriber?.avatar_url) || avatar}
                     alt="Аватар"
                     className="subscriber-avatar"
                 />
@@ -2,6 +2,7 @@ import { useNavigate } from 'react-router-dom';
 import ReportImage from '/report.svg';
 import EditImage from '/edit-button-svgrepo-com.svg';
 import goToProfile from '/profile-round-1342-svgrepo-com.svg';
+import { buildSrcSet, mediaUrl, placeholderStyle } from '../utils/helpers';
 import './TravelCard-style.css';
 
 function DateBox({ day, month }) {
@@ -16,6 +17,8 @@ function DateBox({ day, month }) {
 export default function TravelCard({
   mainImage,
   sideImage,
+  mainImageMedia,
+  sideImageMedia,
   destination,
   description,
   startDate,
@@ -63,12 +66,26 @@ export default function TravelCard({
       </div>
 
       <div className="travel-header">
-        <img src={mainImage} alt="Main Travel" />
+        <img
+          src={mediaUrl(mainImage)}
+          srcSet={buildSrcSet(mainImageMedia?.variants)}
+          sizes="490px"
+          style={placeholderStyle(mainImageMedia?.placeholder)}
+          loading="lazy"
+          alt="Main Travel"
+        />
         <div className="side-info">
           <button className="report-button">
             <img src={ReportImage} alt="Report" />
           </button>
-          <img src={sideImage} alt="Side Travel" />
+          <img
+            src={mediaUrl(sideImage)}
+            srcSet={buildSrcSet(sideImageMedia?.variants)}
+            sizes="210px"
+            style={placeholderStyle(sideImageMedia?.placeholder)}
+            loading="lazy"
+            alt="Side Travel"
+          />
         </div>
       </div>
 
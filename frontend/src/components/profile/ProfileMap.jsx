@@ -6,11 +6,20 @@ import markerIcon2x from 'leaflet/dist/images/marker-icon-2x.png';
 import markerIcon from 'leaflet/dist/images/marker-icon.png';
 import markerShadow from 'leaflet/dist/images/marker-shadow.png';
 
-const ProfileMap = ({ isFollowing, isOwner }) => {
+const MAP_URL = (userId) => `http://192.168.0.78:8000/users/${userId}/map`;
+
+const clusterIcon = (L, count) => L.divIcon({
+  html: `<span>${count}</span>`,
+  className: 'map-cluster',
+  iconSize: [36, 36],
+});
+
+const ProfileMap = ({ userId, isFollowing, isOwner }) => {
   const mapRef = useRef(null);
   const mapInstance = useRef(null);
   const markersRef = useRef([]);
   const updateMapZoomRef = useRef(null);
+  const requestRef = useRef(null);
 
   useEffect(() => {
     if (!isFollowing && !isOwner) {
@@ -57,18 +66,52 @@ const ProfileMap = ({ isFollowing, isOwner }) => {
             attribution: '© OpenStreetMap'
           }).addTo(mapInstance.current);
 
-          const locations = [
-            { name: "Токио", lat: 35.6895, lng: 139.6917 },
-            { name: "Берлин", lat: 52.5200, lng: 13.4050 },
-            { name: "Рио-де-Жанейро", lat: -22.9068, lng: -43.1729 },
-            { name: "Москва", lat: 55.7558, lng: 37.6173 }
-          ];
-
-          markersRef.current = locations.map(location => 
-            L.marker([location.lat, location.lng])
-              .addTo(mapInstance.current)
-              .bindPopup(`<h3>${location.name}</h3>`)
-          );
+          // Сервер отдает кластеры для видимой области и текущего масштаба
+          const loadPoints = async () => {
+            if (!mapInstance.current || !userId) return;
+            requestRef.current?.abort();
+            const controller = new AbortController();
+            requestRef.current = controller;
+
+            const bounds = mapInstance.current.getBounds();
+            const params = new URLSearchParams({
+              south: Math.max(bounds.getSouth(), -90),
+              west: Math.max(bounds.getWest(), -180),
+              north: Math.min(bounds.getNorth(), 90),
+              east: Math.min(bounds.getEast(), 180),
+              zoom: mapInstance.current.getZoom(),
+            });
+            const token = localStorage.getItem('access_token');
+
+            try {
+              const response = await fetch(`${MAP_URL(userId)}?${params}`, {
+                headers: token ? { Authorization: `Bearer ${token}` } : {},
+                signal: controller.signal,
+              });
+              if (!response.ok) return;
+              const data = await response.json();
+
+              markersRef.current.forEach(marker => marker.remove());
+              markersRef.current = data.latitudes.map((lat, i) => {
+                const count = data.counts[i];
+                const marker = count > 1
+                  ? L.marker([lat, data.longitudes[i]], { icon: clusterIcon(L, count) })
+                      .on('click', () => mapInstance.current.setView(
+                        [lat, data.longitudes[i]],
+                        mapInstance.current.getZoom() + 2
+                      ))
+                  : L.marker([lat, data.longitudes[i]]);
+                return marker.addTo(mapInstance.current);
+              });
+            } catch (error) {
+              if (error.name !== 'AbortError') {
+                console.error('Ошибка при загрузке точек карты:', error);
+              }
+            }
+          };
+
+          mapInstance.current.on('moveend', loadPoints);
+          loadPoints();
         };
 
         const initialZoom = window.innerWidth <= 768 ? 1 : 2;
@@ -84,6 +127,7 @@ const ProfileMap = ({ isFollowing, isOwner }) => {
     initMap();
 
     return () => {
+      requestRef.current?.abort();
       if (mapInitialized) {
         window.removeEventListener('resize', updateMapZoomRef.current);
       }
@@ -93,7 +137,7 @@ const ProfileMap = ({ isFollowing, isOwner }) => {
         mapInstance.current = null;
       }
     };
-  }, [isFollowing]);
+  }, [isFollowing, userId]);
 
   if (!isFollowing && !isOwner) {
     return <div className="map-section" />;
@@ -3,6 +3,7 @@ import './ProfileSlidebar-style.css';
 import avatar from '/Page1_avatar.png';
 import ReportImage from '/report.svg';
 import { useNavigate } from 'react-router-dom';
+import { buildSrcSet, mediaUrl, placeholderStyle } from '../../utils/helpers';
 
 const truncateText = (text, maxLength) => {
   if (text.length > maxLength) {
@@ -31,7 +32,10 @@ const ProfileSlidebar = ({
   return (
     <div className="profile-slidebar">
       <img
-        src={userData?.avatar_url || avatar}
+        src={mediaUrl(userData?.avatar_url) || avatar}
+        srcSet={userData?.avatar_url ? buildSrcSet(userData?.avatar_variants) : undefined}
+        sizes="390px"
+        style={userData?.avatar_url ? placeholderStyle(userData?.avatar_placeholder) : undefined}
         alt="Фото профиля"
         className="profile-img"
       />
@@ -3,13 +3,44 @@ import { useNavigate } from 'react-router-dom';
 
 const AuthContext = createContext();
 
+// Access-токен живет 15 минут, обновляем его заранее
+const TOKEN_REFRESH_INTERVAL = 10 * 60 * 1000;
+
+// Возвращает новый access-токен или null
+const refreshTokens = async () => {
+  const refreshToken = localStorage.getItem('refresh_token');
+  if (!refreshToken) return null;
+
+  const response = await fetch('http://192.168.0.78:8000/refresh', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ refresh_token: refreshToken })
+  });
+  if (!response.ok) return null;
+
+  const data = await response.json();
+  localStorage.setItem('access_token', data.access_token);
+  localStorage.setItem('refresh_token', data.refresh_token);
+  return data.access_token;
+};
+
 export function AuthProvider({ children }) {
   const [user, setUser] = useState(null);
   const [isLoading, setIsLoading] = useState(true);
+  // Текущий access-токен: от него зависят долгоживущие соединения (SSE)
+  const [accessToken, setAccessToken] = useState(() => localStorage.getItem('access_token'));
   const navigate = useNavigate();
 
   useEffect(() => {
     const checkAuth = async () => {
+      if (localStorage.getItem('refresh_token')) {
+        try {
+          const token = await refreshTokens();
+          if (token) setAccessToken(token);
+        } catch (error) {
+          console.error('Ошибка обновления токена:', error);
+        }
+      }
       const token = localStorage.getItem('access_token');
       if (token) {
         try {
@@ -38,6 +69,21 @@ export function AuthProvider({ children }) {
     checkAuth();
   }, []);
 
+  useEffect(() => {
+    if (!user) return;
+
+    const timer = setInterval(async () => {
+      try {
+        const token = await refreshTokens();
+        if (token) setAccessToken(token);
+        else logout();
+      } catch (error) {
+        console.error('Ошибка обновления токена:', error);
+      }
+    }, TOKEN_REFRESH_INTERVAL);
+    return () => clearInterval(timer);
+  }, [user]);
+
   const login = async (username, password) => {
     try {
       const response = await fetch('http://192.168.0.78:8000/login', {
@@ -50,6 +96,8 @@ export function AuthProvider({ children }) {
       
       const data = await response.json();
       localStorage.setItem('access_token', data.access_token);
+      localStorage.setItem('refresh_token', data.refresh_token);
+      setAccessToken(data.access_token);
       
       const userResponse = await fetch('http://192.168.0.78:8000/auth/me', {
         headers: {
@@ -71,12 +119,14 @@ export function AuthProvider({ children }) {
 
   const logout = () => {
     localStorage.removeItem('access_token');
+    localStorage.removeItem('refresh_token');
+    setAccessToken(null);
     setUser(null);
     navigate('/login');
   };
 
   return (
-    <AuthContext.Provider value={{ user, isLoading, login, logout }}>
+    <AuthContext.Provider value={{ user, accessToken, isLoading, login, logout }}>
       {children}
     </AuthContext.Provider>
   );
@@ -0,0 +1,44 @@
+import { useEffect, useRef } from 'react';
+import { useAuth } from '../context/AuthContext';
+
+const STREAM_URL = 'http://192.168.0.78:8000/events/stream';
+const EVENT_TYPES = ['report_created', 'new_follower', 'follower_removed'];
+const RECONNECT_DELAY = 3000;
+
+// Подписка на SSE-поток событий вместо периодического опроса
+export const useReportEvents = (onEvent, enabled = true) => {
+  const handlerRef = useRef(onEvent);
+  handlerRef.current = onEvent;
+  const { accessToken } = useAuth();
+
+  useEffect(() => {
+    if (!enabled || !accessToken) return;
+
+    let source = null;
+    let timer = null;
+    let stopped = false;
+
+    const connect = () => {
+      const token = localStorage.getItem('access_token');
+      if (!token) return;
+
+      source = new EventSource(`${STREAM_URL}?token=${encodeURIComponent(token)}`);
+      const listener = (event) => handlerRef.current(event.type, JSON.parse(event.data));
+      EVENT_TYPES.forEach((type) => source.addEventListener(type, listener));
+
+      // Сервер закрывает поток по истечении токена, а браузер переподключился бы
+      // со старым токеном в URL и после 401 закрыл поток навсегда
+      source.onerror = () => {
+        source.close();
+        if (!stopped) timer = setTimeout(connect, RECONNECT_DELAY);
+      };
+    };
+
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(timer);
+      if (source) source.close();
+    };
+  }, [enabled, accessToken]);
+};
@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { useReportEvents } from './useReportEvents';
 
 export const useReportsFetch = (
   isForeignProfile, 
@@ -77,12 +78,14 @@ export const useReportsFetch = (
     if (enableAccessCheck && !profileData) return;
     
     fetchReports();
-
-    if (!isForeignProfile) {
-      const intervalId = setInterval(fetchReports, 5000);
-      return () => clearInterval(intervalId);
-    }
   }, [isForeignProfile, userId, profileData, isFollowing, enableAccessCheck]);
 
+  useReportEvents((type, data) => {
+    if (type !== 'report_created') return;
+
+    const isRelevant = isForeignProfile ? data.author_id === userId : data.report.is_owner;
+    if (isRelevant) fetchReports();
+  });
+
   return { reports, loading, error, fetchReports };
 };
\ No newline at end of file
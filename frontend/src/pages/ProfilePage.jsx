@@ -116,7 +116,7 @@ export default function ProfilePage({ isForeignProfile = false }) {
             {hasFullAccess() && (
               <div className="main-content-right">
                 <ProfileMap
-                  locations={profileData.travel_stats?.locations || []}
+                  userId={profileData.user_id}
                   isFollowing={isFollowing}
                   isOwner={!isForeignProfile}
                 />
@@ -39,6 +39,8 @@ export default function ReportsPage({ isForeignProfile = false }) {
                             key={item.id}
                             mainImage={item.main_image}
                             sideImage={item.side_image}
+                            mainImageMedia={item.images?.main_image}
+                            sideImageMedia={item.images?.side_image}
                             destination={item.title}
                             description={truncateText(item.description, 200)}
                             startDate={parseDate(item.start_date)}
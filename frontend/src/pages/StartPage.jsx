@@ -4,6 +4,7 @@ import TravelCard from '../components/TravelCard';
 import './Reports-page.css';
 import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { useReportEvents } from '../hooks/useReportEvents';
 
 function parseDate(dateString) {
     const date = new Date(dateString);
@@ -20,37 +21,75 @@ const truncateText = (text, maxLength) => {
     return text;
 };
 
+const API_URL = 'http://192.168.0.78:8000/report/reports_card';
+
+// Объединяет свежую первую страницу с уже загруженными карточками без дублей
+const mergeReports = (fresh, loaded) => {
+    const seen = new Set(fresh.map((item) => item.id));
+    return [...fresh, ...loaded.filter((item) => !seen.has(item.id))];
+};
+
 export default function ReportsPage() {
     const [reports, setReports] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const navigate = useNavigate();
 
+    const fetchPage = async (cursor) => {
+        const token = localStorage.getItem('access_token');
+        if (!token) {
+            navigate('/login');
+            return null;
+        }
+
+        const url = cursor ? `${API_URL}?cursor=${encodeURIComponent(cursor)}` : API_URL;
+        const response = await fetch(url, {
+            headers: {
+                'Authorization': `Bearer ${token}`
+            }
+        });
+
+        if (response.status === 401) {
+            localStorage.removeItem('access_token');
+            navigate('/login');
+            return null;
+        }
+
+        if (!response.ok) throw new Error('Ошибка загрузки данных');
+
+        return response.json();
+    };
+
+    const loadMore = async () => {
+        if (!nextCursor || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const data = await fetchPage(nextCursor);
+            if (!data) return;
+            setReports((prev) => mergeReports(prev, data.reports || []));
+            setNextCursor(data.next_cursor);
+        } catch (error) {
+            setError(error.message);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     useEffect(() => {
+        let firstLoad = true;
+
         const fetchData = async () => {
             try {
-                const token = localStorage.getItem('access_token');
-                if (!token) {
-                    navigate('/login');
-                    return;
-                }
-
-                const response = await fetch('http://192.168.0.78:8000/report/reports_card', {
-                    headers: {
-                        'Authorization': `Bearer ${token}`
-                    }
-                });
+                const data = await fetchPage(null);
+                if (!data) return;
 
-                if (response.status === 401) {
-                    localStorage.removeItem('access_token');
-                    navigate('/login');
-                    return;
+                setReports((prev) => mergeReports(data.reports || [], prev));
+                if (firstLoad) {
+                    setNextCursor(data.next_cursor);
+                    firstLoad = false;
                 }
-
-                if (!response.ok) throw new Error('Ошибка загрузки данных');
-                
-                const data = await response.json();
-                setReports(data.reports || []);
             } catch (error) {
                 setError(error.message);
                 setReports([]);
@@ -60,10 +99,14 @@ export default function ReportsPage() {
         };
 
         fetchData();
-        const intervalId = setInterval(fetchData, 5000);
-        return () => clearInterval(intervalId);
     }, [navigate]);
 
+    useReportEvents((type, data) => {
+        if (type === 'report_created') {
+            setReports((prev) => mergeReports([data.report], prev));
+        }
+    });
+
     if (loading) return <div>Загрузка...</div>;
     if (error) return <div>Ошибка: {error}</div>;
 
@@ -78,6 +121,8 @@ export default function ReportsPage() {
                             key={item.id}
                             mainImage={item.main_image}
                             sideImage={item.side_image}
+                            mainImageMedia={item.images?.main_image}
+                            sideImageMedia={item.images?.side_image}
                             destination={item.title}
                             description={truncateText(item.description, 200)}
                             startDate={parseDate(item.start_date)}
@@ -90,6 +135,11 @@ export default function ReportsPage() {
                         />
                     ))}
                 </div>
+                {nextCursor && (
+                    <button className="load-more-button" onClick={loadMore} disabled={loadingMore}>
+                        {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+                    </button>
+                )}
             </div>
         </>
     );
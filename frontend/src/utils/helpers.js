@@ -9,4 +9,24 @@ export const parseDate = (dateString) => {
   export const truncateText = (text, maxLength) => {
     if (!text) return '';
     return text.length > maxLength ? text.slice(0, maxLength) + '...' : text;
-  };
\ No newline at end of file
+  };
+
+  // Загруженные файлы раздает бэкенд, а не dev-сервер Vite
+  const MEDIA_BASE_URL = 'http://192.168.0.78:8000';
+
+  export const mediaUrl = (path) => {
+    if (!path || !path.startsWith('/uploads/')) return path;
+    return `${MEDIA_BASE_URL}${path}`;
+  };
+
+  // Строка srcset из вариантов изображения, построенных на сервере
+  export const buildSrcSet = (variants) => {
+    if (!Array.isArray(variants) || variants.length === 0) return undefined;
+    return variants.map((variant) => `${mediaUrl(variant.url)} ${variant.width}w`).join(', ');
+  };
+
+  // Размытое превью, видимое под изображением, пока оно загружается
+  export const placeholderStyle = (placeholder) => {
+    if (!placeholder) return undefined;
+    return { backgroundImage: `url(${placeholder})`, backgroundSize: 'cover' };
+  };